@@ -1,19 +1,41 @@
 from __future__ import annotations
 
+import atexit
 import os
 import shutil
 from typing import Optional
 
-import eventlet
+import click
+import sqlalchemy as sa
 from dotenv import load_dotenv
-from eventlet import wsgi
 from flask import Flask, render_template
 from flask_login import LoginManager
-from flask_migrate import Migrate
-from flask_session import Session
-
-from app.models import db, register_db_utils
-from app.routes import auth, home, project
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from app import (
+    assets,
+    compression,
+    events,
+    jobs,
+    metrics,
+    passwords,
+    ratelimit,
+    sessions,
+)
+from app.cache import SQLiteVersionStore, deploy_id, fragment_cache, versions
+from app.database import configure_sqlite
+from app.models import (
+    db,
+    register_db_utils,
+    register_import_utils,
+    register_maintenance_utils,
+    taken_names,
+    user_cache,
+)
+from app.recent import recent_projects
+from app.routes import auth, home
+from app.routes import metrics as metrics_routes
+from app.routes import project
 
 __all__: list[str] = []
 
@@ -36,36 +58,123 @@ def get_env(name: str) -> Optional[str | int]:
 
 
 def setup_session(app: Flask) -> None:
-    """Server side sessions setup."""
-    session_path = os.path.join(app.instance_path, "sessions")
-    app.config["SESSION_FILE_DIR"] = session_path
-    app.config["SESSION_TYPE"] = "filesystem"
+    """
+    Server side sessions setup.
+
+    SESSION_BACKEND selects the store: filesystem (default), memory, sqlite or redis.
+    """
     app.config["SESSION_COOKIE_SECURE"] = False
     app.config["SESSION_COOKIE_HTTPONLY"] = True
 
-    Session(app)
+    backend = str(get_env("SESSION_BACKEND") or "filesystem")
+
+    if backend == "filesystem":
+        session_path = os.path.join(app.instance_path, "sessions")
+        app.config["SESSION_FILE_DIR"] = session_path
+        app.config["SESSION_TYPE"] = "filesystem"
+
+        from flask_session import Session
+
+        Session(app)
 
-    if get_flag("CLEAN_SESSION") and os.path.exists(session_path):
-        shutil.rmtree(session_path)
-        os.makedirs(session_path)
+        if get_flag("CLEAN_SESSION") and os.path.exists(session_path):
+            shutil.rmtree(session_path)
+            os.makedirs(session_path)
+        return
+
+    app.config["SESSION_MEMORY_SIZE"] = int(get_env("SESSION_MEMORY_SIZE") or 10000)
+    app.config["SESSION_SWEEP_INTERVAL"] = int(get_env("SESSION_SWEEP_INTERVAL") or 60)
+    app.config["SESSION_REDIS_URL"] = get_env("SESSION_REDIS_URL")
+
+    app.session_interface = sessions.create_session_interface(app, backend)
+
+    if get_flag("CLEAN_SESSION"):
+        app.session_interface.store.clear()
 
 
 def setup_database(app: Flask) -> None:
-    """Database connection setup."""
-    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{app.instance_path}/app.sqlite3"
+    """
+    Database connection setup.
+
+    DATABASE_PROFILE=production enables WAL mode and connection pooling,
+    DATABASE_READ_POOL adds a pool of read-only connections, DATABASE_READ_URI
+    a replica database. Either is used by GET requests of views marked
+    with read_replica, except for users who committed changes in the last
+    DATABASE_READ_YOUR_WRITES_SECONDS.
+    """
+    database_path = os.path.join(app.instance_path, "app.sqlite3")
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{database_path}"
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = app.debug
 
+    if get_env("DATABASE_PROFILE") == "production":
+        configure_sqlite(
+            {
+                "journal_mode": "WAL",
+                "synchronous": "NORMAL",
+                "busy_timeout": int(get_env("DATABASE_BUSY_TIMEOUT") or 5000),
+                "cache_size": -int(get_env("DATABASE_CACHE_SIZE_KB") or 20000),
+                "mmap_size": int(get_env("DATABASE_MMAP_SIZE") or 268435456),
+                "temp_store": "MEMORY",
+            }
+        )
+
+        # Connections are kept open between requests (SQLite default is NullPool).
+        # Unlimited overflow means a green thread never blocks the hub waiting
+        # for a connection, pool_size only limits connections kept idle.
+        engine_options = {
+            "poolclass": sa.pool.QueuePool,
+            "pool_size": int(get_env("DATABASE_POOL_SIZE") or 10),
+            "max_overflow": -1,
+            "connect_args": {"check_same_thread": False},
+        }
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options
+
+        if get_flag("DATABASE_READ_POOL"):
+            app.extensions["read_engine"] = sa.create_engine(
+                f"sqlite:///file:{database_path}?mode=ro&uri=true", **engine_options
+            )
+
+    read_uri = get_env("DATABASE_READ_URI")
+    if read_uri:
+        # Pool options are SQLite specific
+        read_options = app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+        app.extensions["read_engine"] = sa.create_engine(
+            str(read_uri),
+            **(read_options if str(read_uri).startswith("sqlite") else {}),
+        )
+
+    read_your_writes = get_env("DATABASE_READ_YOUR_WRITES_SECONDS")
+    app.config["DATABASE_READ_YOUR_WRITES_SECONDS"] = (
+        5 if read_your_writes is None else int(read_your_writes)
+    )
+
     if app.debug:
         register_db_utils(app)
+    register_import_utils(app)
+    register_maintenance_utils(app)
 
     db.init_app(app)
 
-    migrate = Migrate()
-    migrate.init_app(app, db)
+    # Migrations are needed only by "flask db" commands. Flask CLI imports
+    # Flask-Migrate anyway, other entry points (WSGI servers) skip it.
+    if click.get_current_context(silent=True) is not None:
+        from flask_migrate import Migrate
+
+        migrate = Migrate()
+        migrate.init_app(app, db)
 
 
 def setup_auth(app: Flask) -> None:
     """User authentication and authorization setup."""
+    method = get_env("PASSWORD_HASH_METHOD")
+    passwords.configure(method=str(method) if method is not None else None)
+
+    user_cache.configure(
+        maxsize=int(get_env("USER_CACHE_SIZE") or 1024),
+        ttl=int(get_env("USER_CACHE_TTL") or 300),
+    )
+    taken_names.configure(ttl=int(get_env("TAKEN_NAMES_TTL") or 300))
+
     login_manager = LoginManager()
     login_manager.init_app(app)
     auth.register_login_manager(login_manager)
@@ -73,16 +182,259 @@ def setup_auth(app: Flask) -> None:
     app.register_blueprint(auth.bp)
 
 
+def setup_rate_limits(app: Flask) -> None:
+    """
+    Rate limits setup.
+
+    Limits are "count/seconds" token buckets, RATE_LIMIT_BACKEND selects
+    the bucket store: memory (per worker process, default), sqlite or redis.
+    Disabled with RATE_LIMITS=false.
+
+    Behind reverse proxies TRUSTED_PROXIES is their number, the client
+    address is then taken from X-Forwarded-For as set by the proxies.
+    """
+    trusted_proxies = int(get_env("TRUSTED_PROXIES") or 0)
+    if trusted_proxies:
+        app.wsgi_app = ProxyFix(  # type: ignore[method-assign]
+            app.wsgi_app, x_for=trusted_proxies
+        )
+
+    limits = {
+        "login_ip": str(get_env("RATE_LIMIT_LOGIN_IP") or "20/60"),
+        "login_account": str(get_env("RATE_LIMIT_LOGIN_ACCOUNT") or "5/60"),
+        "register_ip": str(get_env("RATE_LIMIT_REGISTER_IP") or "5/600"),
+        "available_ip": str(get_env("RATE_LIMIT_AVAILABLE_IP") or "60/60"),
+    }
+    parsed = {name: ratelimit.Limit.parse(limit) for name, limit in limits.items()}
+    # Buckets untouched for that long are full again
+    ttl = max(limit.seconds for limit in parsed.values())
+
+    backend = str(get_env("RATE_LIMIT_BACKEND") or "memory")
+    store: ratelimit.BucketStore
+    if backend == "memory":
+        store = ratelimit.MemoryBucketStore(ttl=ttl)
+    elif backend == "sqlite":
+        path = os.path.join(app.instance_path, "ratelimit.sqlite3")
+        store = ratelimit.SQLiteBucketStore(path, ttl=ttl)
+    elif backend == "redis":
+        store = ratelimit.RedisBucketStore(
+            str(get_env("RATE_LIMIT_REDIS_URL")), ttl=ttl
+        )
+    else:
+        raise ValueError(f"Unknown rate limit backend: {backend}")
+
+    ratelimit.limiter.configure(
+        store=store,
+        limits=parsed,
+        enabled=get_flag("RATE_LIMITS") if "RATE_LIMITS" in os.environ else True,
+    )
+
+
+def setup_cache(app: Flask) -> None:
+    """
+    Cache setup for rendered fragments and recent projects.
+
+    VERSIONS_BACKEND selects where versions of cached content are kept:
+    sqlite (default, shared by worker processes) or memory (per process,
+    fragments changed by another worker are served stale for at most
+    VERSION_TTL seconds, so use it only with a single worker).
+    Recent projects changed by another worker are served stale for at most
+    RECENT_PROJECTS_TTL seconds.
+    """
+    backend = str(get_env("VERSIONS_BACKEND") or "sqlite")
+    if backend == "sqlite":
+        store: Optional[SQLiteVersionStore] = SQLiteVersionStore(
+            os.path.join(app.instance_path, "versions.sqlite3")
+        )
+    elif backend == "memory":
+        store = None
+    else:
+        raise ValueError(f"Unknown versions backend: {backend}")
+    versions.configure(ttl=int(get_env("VERSION_TTL") or 60), store=store)
+    fragment_cache.configure(
+        maxsize=int(get_env("FRAGMENT_CACHE_SIZE") or 10000),
+        ttl=int(get_env("FRAGMENT_CACHE_TTL") or 300),
+    )
+    recent_projects.configure(
+        maxsize=int(get_env("RECENT_PROJECTS_CACHE_SIZE") or 10000),
+        ttl=int(get_env("RECENT_PROJECTS_TTL") or 300),
+        flush_interval=int(get_env("RECENT_PROJECTS_FLUSH_INTERVAL") or 5),
+    )
+    atexit.register(recent_projects.flush, app)
+
+
+def events_fanout(app: Flask, workers: int) -> events.Fanout:
+    """
+    Create the fan-out backend selected by EVENTS_BACKEND.
+
+    Without EVENTS_BACKEND it is local for a single worker process,
+    otherwise sqlite, so events reach subscribers of every worker.
+    """
+    backend = str(get_env("EVENTS_BACKEND") or ("sqlite" if workers > 1 else "local"))
+    if backend == "local":
+        return events.LocalFanout()
+    if backend == "sqlite":
+        return events.SQLiteFanout(os.path.join(app.instance_path, "events.sqlite3"))
+    if backend == "redis":
+        return events.RedisFanout(str(get_env("EVENTS_REDIS_URL")))
+    raise ValueError(f"Unknown events backend: {backend}")
+
+
+def setup_events(app: Flask) -> None:
+    """
+    Real-time project updates setup.
+
+    EVENTS_BACKEND selects the fan-out between workers: local (a single
+    worker process), sqlite (workers on one host) or redis (any number
+    of hosts). The default depends on WORKERS, see events_fanout.
+    """
+    events.broker.configure(
+        fanout=events_fanout(app, int(get_env("WORKERS") or 1)),
+        queue_size=int(get_env("EVENTS_QUEUE_SIZE") or 100),
+    )
+    app.config["EVENTS_HEARTBEAT"] = int(get_env("EVENTS_HEARTBEAT") or 15)
+
+
+def setup_jobs(app: Flask) -> None:
+    """
+    Background jobs setup.
+
+    JOBS_BACKEND selects where jobs run: inline (default, in the worker
+    process after the response was sent) or sqlite (durable queue,
+    executed by "flask jobs-worker" processes).
+    """
+    backend = str(get_env("JOBS_BACKEND") or "inline")
+    if backend == "inline":
+        jobs.jobs.configure(queue=None)
+    elif backend == "sqlite":
+        path = os.path.join(app.instance_path, "jobs.sqlite3")
+        jobs.jobs.configure(queue=jobs.SQLiteJobQueue(path))
+    else:
+        raise ValueError(f"Unknown jobs backend: {backend}")
+
+    app.config["JOBS_WORKER_THREADS"] = int(get_env("JOBS_WORKER_THREADS") or 10)
+    processes = get_env("JOBS_WORKER_PROCESSES")
+    app.config["JOBS_WORKER_PROCESSES"] = 1 if processes is None else int(processes)
+    app.config["JOBS_POLL_INTERVAL"] = float(get_env("JOBS_POLL_INTERVAL") or 0.5)
+    app.config["JOBS_LEASE"] = int(get_env("JOBS_LEASE") or 300)
+    app.config["JOBS_RETRY_BASE"] = int(get_env("JOBS_RETRY_BASE") or 5)
+    app.config["JOBS_RETRY_LIMIT"] = int(get_env("JOBS_RETRY_LIMIT") or 600)
+
+    jobs.register_job_utils(app)
+
+
+def setup_rendering(app: Flask) -> None:
+    """
+    Page rendering setup.
+
+    STREAM_PROJECTS_LIST streams the whole projects list on the browser page
+    instead of rendering its first page into a buffer. DEPLOY_ID identifies
+    the release in ETags of cached pages, by default it is a hash of the
+    application code, templates and the asset manifest.
+    """
+    app.config["STREAM_PROJECTS_LIST"] = get_flag("STREAM_PROJECTS_LIST")
+
+    manifest_path = None
+    if app.static_folder is not None:
+        manifest_path = os.path.join(
+            app.static_folder, assets.BUILD_DIR, assets.MANIFEST_NAME
+        )
+    app.config["DEPLOY_ID"] = str(
+        get_env("DEPLOY_ID") or deploy_id(app.root_path, manifest_path)
+    )
+
+
+def setup_instrumentation(app: Flask) -> None:
+    """
+    Per-request SQL and timing instrumentation setup.
+
+    Enabled unless INSTRUMENTATION is false. Statements slower than
+    SLOW_QUERY_MS are logged. Outside of debug mode Server-Timing headers
+    are off unless SERVER_TIMING is true and /metrics needs METRICS_TOKEN.
+    """
+    if "INSTRUMENTATION" in os.environ and not get_flag("INSTRUMENTATION"):
+        return
+
+    slow_query_ms = get_env("SLOW_QUERY_MS")
+    app.config["SLOW_QUERY_MS"] = (
+        int(slow_query_ms) if slow_query_ms is not None else 100
+    )
+    app.config["SERVER_TIMING"] = (
+        get_flag("SERVER_TIMING") if "SERVER_TIMING" in os.environ else app.debug
+    )
+    app.config["METRICS_TOKEN"] = get_env("METRICS_TOKEN")
+
+    metrics.register_instrumentation(app)
+    app.register_blueprint(metrics_routes.bp)
+
+
+def setup_assets(app: Flask) -> None:
+    """
+    Asset pipeline setup.
+
+    Assets built with the assets-build command are used unless ASSETS_MANIFEST
+    is false, by default only outside of debug mode.
+    """
+    if "ASSETS_MANIFEST" in os.environ:
+        use_manifest = get_flag("ASSETS_MANIFEST")
+    else:
+        use_manifest = not app.debug
+
+    assets.register_assets(app, use_manifest)
+
+
+def setup_compression(app: Flask) -> None:
+    """
+    Response compression setup.
+
+    Enabled unless COMPRESSION is false. Responses smaller than
+    COMPRESSION_MIN_SIZE bytes are sent as they are. Brotli is preferred
+    if the brotli package is installed, COMPRESSION_BROTLI forces it on or off.
+    """
+    if "COMPRESSION" in os.environ and not get_flag("COMPRESSION"):
+        return
+
+    app.wsgi_app = compression.CompressionMiddleware(  # type: ignore[method-assign]
+        app.wsgi_app,
+        min_size=int(get_env("COMPRESSION_MIN_SIZE") or 1024),
+        gzip_level=int(get_env("COMPRESSION_GZIP_LEVEL") or 6),
+        brotli_quality=int(get_env("COMPRESSION_BROTLI_QUALITY") or 4),
+        brotli=(
+            get_flag("COMPRESSION_BROTLI")
+            if "COMPRESSION_BROTLI" in os.environ
+            else None
+        ),
+    )
+
+
 def setup_blueprints(app: Flask) -> None:
     """Register all remaining blueprints."""
     app.register_blueprint(home.bp)
     app.register_blueprint(project.bp)
 
 
+def warm_up(app: Flask) -> None:
+    """
+    Initialize lazily loaded state before serving requests.
+
+    Called in the pre-fork master, so workers share the result
+    instead of each paying for it on their first requests.
+    """
+    sa.orm.configure_mappers()
+
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+    # Imported on first use, threads are started only by the workers
+    from eventlet import tpool  # noqa: F401
+
+
 def create_app() -> Flask:
     """Flask application factory function."""
+    instance_path = get_env("INSTANCE_PATH")
     app = Flask(
         __name__,
+        instance_path=str(instance_path) if instance_path else None,
         instance_relative_config=True,
         template_folder="./templates",
         static_folder="./static",
@@ -96,26 +448,78 @@ def create_app() -> Flask:
     setup_session(app)
     setup_database(app)
     setup_auth(app)
+    setup_rate_limits(app)
+    setup_cache(app)
+    setup_events(app)
+    setup_jobs(app)
+    setup_rendering(app)
+    setup_instrumentation(app)
+    setup_assets(app)
+    setup_compression(app)
     setup_blueprints(app)
 
     @app.cli.command("run-eventlet")
-    def run_eventlet() -> None:
+    @click.option(
+        "--workers",
+        type=int,
+        default=lambda: get_env("WORKERS") or 1,
+        help="Number of pre-forked worker processes.",
+    )
+    def run_eventlet(workers: int) -> None:
         """Application startup definition."""
-        address = get_env("ADDRESS")
-        port = get_env("PORT")
+        from app import server
+
+        keepalive_timeout = get_env("KEEPALIVE_TIMEOUT")
+        config = server.ServerConfig(
+            address=str(get_env("ADDRESS")),
+            port=int(get_env("PORT") or 8090),
+            workers=workers,
+            max_size=int(get_env("WSGI_MAX_SIZE") or 10000),
+            backlog=int(get_env("SOCKET_BACKLOG") or 2048),
+            keepalive=get_flag("KEEPALIVE") if "KEEPALIVE" in os.environ else True,
+            max_requests=int(get_env("MAX_REQUESTS") or 0),
+            graceful_timeout=int(get_env("GRACEFUL_TIMEOUT") or 30),
+            write_buffer_size=int(get_env("WSGI_WRITE_BUFFER_SIZE") or 16384),
+            minimum_chunk_size=int(get_env("WSGI_MINIMUM_CHUNK_SIZE") or 4096),
+            keepalive_timeout=(
+                int(keepalive_timeout) if keepalive_timeout is not None else 75
+            ),
+            tcp_nodelay=(
+                get_flag("TCP_NODELAY") if "TCP_NODELAY" in os.environ else True
+            ),
+        )
+
+        # Keep password hashing from blocking the hub
+        passwords.configure(executor="tpool")
+        # Idle event streams wait on green queues
+        events.broker.configure(green=True)
+        if (
+            workers > 1
+            and not get_env("EVENTS_BACKEND")
+            and isinstance(events.broker.fanout, events.LocalFanout)
+        ):
+            # --workers given without WORKERS, events must reach all workers
+            events.broker.configure(fanout=events_fanout(app, workers))
 
         if app.debug:
             print("[INFO] Starting eventlet in debug mode...")
+            import eventlet
+            from eventlet import wsgi
             from werkzeug._reloader import run_with_reloader
 
             def run_server() -> None:
-                eventlet_socket = eventlet.listen((address, port))
-                wsgi.server(eventlet_socket, app, debug=True)
+                eventlet_socket = eventlet.listen(
+                    (config.address, config.port), backlog=config.backlog
+                )
+                wsgi.server(
+                    eventlet_socket,
+                    app,
+                    **{**server.worker_server_kwargs(config), "debug": True},
+                )
 
             run_with_reloader(run_server)
         else:
-            print("[INFO] Starting eventlet...")
-            eventlet_socket = eventlet.listen((address, port))
-            wsgi.server(eventlet_socket, app, debug=False)
+            warm_up(app)
+            server.run(app, config)
 
     return app
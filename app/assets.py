@@ -0,0 +1,291 @@
+"""
+Static asset pipeline.
+
+The assets-build command minifies every file under the static folder,
+writes it with a content hash in its name to static/build and precompresses
+it with gzip (and brotli, if the brotli package is installed). A manifest
+maps original file names to fingerprinted ones.
+
+Building on a live deploy is safe: files are written next to the previous
+ones (under new names if the content changed) and the manifest is replaced
+atomically. Files of the last KEEP_GENERATIONS builds are kept, so pages
+rendered by workers still using an older manifest keep working.
+
+When the manifest exists, url_for('static', filename=...) points to the
+fingerprinted file, which is served with immutable Cache-Control and
+a precompressed variant picked by Accept-Encoding. Nothing is compressed
+while handling requests.
+"""
+
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import tempfile
+from typing import Any, Callable, Optional
+
+import click
+from flask import Flask, Response, request, send_from_directory
+
+BUILD_DIR = "build"
+MANIFEST_NAME = "manifest.json"
+# Manifests of the last builds, the newest first
+GENERATIONS_NAME = "generations.json"
+KEEP_GENERATIONS = 3
+
+# Fingerprinted files never change, they can be cached for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Compressed variants are kept only for text files and only if smaller
+COMPRESSIBLE = (".css", ".js", ".svg", ".json", ".txt", ".html")
+MIN_COMPRESS_SIZE = 256
+
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+def minify_css(source: str) -> str:
+    source = re.sub(r"/\*.*?\*/", "", source, flags=re.DOTALL)
+    source = re.sub(r"\s+", " ", source)
+    # Spaces around ":" are kept, "a :hover" and "a:hover" differ
+    source = re.sub(r"\s*([{};,>])\s*", r"\1", source)
+    return source.replace(";}", "}").strip()
+
+
+def minify_js(source: str) -> str:
+    try:
+        import rjsmin
+    except ImportError:
+        # Without a JS parser only comment lines and indentation are safe to drop,
+        # none of the scripts use multiline template literals
+        source = re.sub(r"^\s*/\*.*?\*/\s*$", "", source, flags=re.DOTALL | re.M)
+        lines = (line.strip() for line in source.splitlines())
+        return "\n".join(line for line in lines if line and not line.startswith("//"))
+
+    minified: str = rjsmin.jsmin(source)
+    return minified
+
+
+def minify_svg(source: str) -> str:
+    source = re.sub(r"<!--.*?-->", "", source, flags=re.DOTALL)
+    return re.sub(r">\s+<", "><", source).strip()
+
+
+MINIFIERS: dict[str, Callable[[str], str]] = {
+    ".css": minify_css,
+    ".js": minify_js,
+    ".svg": minify_svg,
+}
+
+
+def fingerprint(name: str, content: bytes) -> str:
+    """Add content hash to the file name, e.g. css/base.css -> css/base.1a2b3c4d.css."""
+    root, ext = posixpath.splitext(name)
+    return f"{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+
+def rewrite_css_urls(source: str, name: str, manifest: dict[str, str]) -> str:
+    """Point relative url() references of CSS file to fingerprinted files."""
+    directory = posixpath.dirname(name)
+
+    def replace(match: re.Match[str]) -> str:
+        url = match.group(2)
+        if re.match(r"^([a-z]+:|/|#)", url):
+            return match.group(0)
+
+        target = posixpath.normpath(posixpath.join(directory, url))
+        if target not in manifest:
+            return match.group(0)
+
+        return f"url({posixpath.relpath(manifest[target], directory)})"
+
+    return CSS_URL.sub(replace, source)
+
+
+def compress(path: str, content: bytes) -> None:
+    """Write .gz (and .br) variants next to the file, if they are smaller."""
+    variants = {".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        variants[".br"] = brotli.compress(content, quality=11)
+
+    for suffix, compressed in variants.items():
+        if len(compressed) < len(content):
+            write_atomic(path + suffix, compressed)
+
+
+def write_atomic(path: str, content: bytes) -> None:
+    """Write file so that readers see either the old or the complete new file."""
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(content)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def prune(build_folder: str, generations: list[dict[str, str]]) -> None:
+    """Remove built files (and their variants) not used by any kept generation."""
+    used = {MANIFEST_NAME, GENERATIONS_NAME}
+    for manifest in generations:
+        for name in manifest.values():
+            used.update(name + suffix for suffix in ("", ".gz", ".br"))
+
+    for root, _, files in os.walk(build_folder):
+        for filename in files:
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, build_folder).replace(os.sep, "/")
+            if name not in used:
+                os.unlink(path)
+
+
+def build(static_folder: str) -> dict[str, str]:
+    """Build fingerprinted and compressed assets. Returns the manifest."""
+    build_folder = os.path.join(static_folder, BUILD_DIR)
+
+    names = []
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != build_folder]
+        for filename in files:
+            path = os.path.relpath(os.path.join(root, filename), static_folder)
+            names.append(path.replace(os.sep, "/"))
+
+    # CSS references other files, it has to be fingerprinted after them
+    names.sort(key=lambda name: (name.endswith(".css"), name))
+
+    manifest: dict[str, str] = {}
+    for name in names:
+        with open(os.path.join(static_folder, name), "rb") as file:
+            content = file.read()
+
+        ext = posixpath.splitext(name)[1]
+        if ext in MINIFIERS:
+            source = MINIFIERS[ext](content.decode("utf-8"))
+            if ext == ".css":
+                source = rewrite_css_urls(source, name, manifest)
+            content = source.encode("utf-8")
+
+        manifest[name] = fingerprint(name, content)
+
+        # Same name means same content, files of earlier builds are reused
+        path = os.path.join(build_folder, manifest[name])
+        if not os.path.exists(path):
+            # Variants first, an existing file always has its variants
+            if ext in COMPRESSIBLE and len(content) >= MIN_COMPRESS_SIZE:
+                compress(path, content)
+            write_atomic(path, content)
+
+    generations = [manifest, *load_generations(static_folder)][:KEEP_GENERATIONS]
+    write_atomic(
+        os.path.join(build_folder, GENERATIONS_NAME),
+        json.dumps(generations, sort_keys=True).encode(),
+    )
+    # Workers started from now on use the new files
+    write_atomic(
+        os.path.join(build_folder, MANIFEST_NAME),
+        json.dumps(manifest, indent=2, sort_keys=True).encode(),
+    )
+    prune(build_folder, generations)
+
+    return manifest
+
+
+def load_manifest(static_folder: str) -> Optional[dict[str, str]]:
+    path = os.path.join(static_folder, BUILD_DIR, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        manifest: dict[str, str] = json.load(file)
+    return manifest
+
+
+def load_generations(static_folder: str) -> list[dict[str, str]]:
+    """Manifests of the kept builds, the newest first."""
+    path = os.path.join(static_folder, BUILD_DIR, GENERATIONS_NAME)
+    if not os.path.exists(path):
+        # Built before generations were recorded
+        manifest = load_manifest(static_folder)
+        return [manifest] if manifest is not None else []
+    with open(path) as file:
+        generations: list[dict[str, str]] = json.load(file)
+    return generations
+
+
+def register_assets(app: Flask, use_manifest: bool) -> None:
+    """Register assets-build command and, if built, serve fingerprinted assets."""
+
+    @app.cli.command("assets-build")
+    def assets_build() -> None:
+        """Minify, fingerprint and precompress static files."""
+        assert app.static_folder is not None
+        manifest = build(app.static_folder)
+        click.echo(f"Built {len(manifest)} assets.")
+
+    manifest = load_manifest(app.static_folder) if app.static_folder else None
+    if not use_manifest or manifest is None:
+        return
+
+    build_folder = os.path.join(str(app.static_folder), BUILD_DIR)
+    # Pages cached or rendered with an older manifest refer to its files
+    built = {
+        name
+        for generation in load_generations(str(app.static_folder))
+        for name in generation.values()
+    }
+
+    @app.url_defaults
+    def fingerprinted_url(endpoint: str, values: dict[str, Any]) -> None:
+        filename = values.get("filename")
+        if endpoint == "static" and filename in manifest:
+            values["filename"] = f"{BUILD_DIR}/{manifest[filename]}"
+
+    static_view = app.view_functions["static"]
+
+    def static(filename: str) -> Response:
+        prefix = BUILD_DIR + "/"
+        if not filename.startswith(prefix) or filename[len(prefix) :] not in built:
+            response: Response = static_view(filename=filename)
+            return response
+
+        name = filename[len(prefix) :]
+        response = send_precompressed(build_folder, name)
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions["static"] = static
+
+
+def send_precompressed(folder: str, name: str) -> Response:
+    """Send the best precompressed variant of the file accepted by the client."""
+    mimetype = mimetypes.guess_type(name)[0]
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if request.accept_encodings[encoding] > 0 and os.path.exists(
+            os.path.join(folder, name + suffix)
+        ):
+            response = send_from_directory(folder, name + suffix, mimetype=mimetype)
+            break
+    else:
+        encoding = None
+        response = send_from_directory(folder, name)
+
+    if encoding is not None:
+        response.content_encoding = encoding
+    response.vary.add("Accept-Encoding")
+    return response
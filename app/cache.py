@@ -0,0 +1,355 @@
+"""
+In-process caches.
+
+Caches are local to a worker process. Anything stored here has
+to be safe to serve stale for at most the configured TTL.
+Version counters, which keys of cached content include, can be shared
+by worker processes (SQLiteVersionStore), so no worker serves stale content.
+"""
+
+
+from __future__ import annotations
+
+import hashlib
+import itertools
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, Iterable, Optional, TypeVar
+
+from flask import Flask, current_app, render_template
+from markupsafe import Markup
+
+from app.database import SQLiteConnections
+
+KT = TypeVar("KT", bound=Hashable)
+VT = TypeVar("VT")
+
+
+class TTLCache(Generic[KT, VT]):
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0) -> None:
+        """Create thread safe LRU cache, entries expire after ttl seconds."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._data: OrderedDict[KT, tuple[float, VT]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(
+        self, maxsize: Optional[int] = None, ttl: Optional[float] = None
+    ) -> None:
+        """Change cache limits. Drops all the entries."""
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            self._data.clear()
+
+    def get(self, key: KT) -> Optional[VT]:
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: KT, value: VT) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: KT) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def sweep(self) -> int:
+        """Remove expired entries. Returns the number of removed entries."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (expires, _) in self._data.items() if expires < now]
+            for key in expired:
+                del self._data[key]
+            return len(expired)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Get cache size and hit/miss counters."""
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class SQLiteVersionStore:
+    def __init__(self, path: str) -> None:
+        """Keep version counters in a separate SQLite database, shared by workers."""
+        self.path = path
+        self.connections = SQLiteConnections(
+            path,
+            [
+                "CREATE TABLE IF NOT EXISTS version ("
+                "key TEXT PRIMARY KEY, version INTEGER NOT NULL, "
+                "modified REAL NOT NULL) WITHOUT ROWID"
+            ],
+        )
+
+    def get(self, key: str) -> tuple[int, float]:
+        connection = self.connections.get()
+        query = "SELECT version, modified FROM version WHERE key = ?"
+        row = connection.execute(query, (key,)).fetchone()
+        if row is None:
+            connection.execute(
+                "INSERT OR IGNORE INTO version (key, version, modified) VALUES (?, ?, ?)",
+                (key, initial_version(), time.time()),
+            )
+            row = connection.execute(query, (key,)).fetchone()
+        return int(row[0]), float(row[1])
+
+    def bump(self, key: str) -> None:
+        self.connections.get().execute(
+            "INSERT INTO version (key, version, modified) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE "
+            "SET version = version + 1, modified = excluded.modified",
+            (key, initial_version(), time.time()),
+        )
+
+
+def initial_version() -> int:
+    """
+    Random first version of a counter.
+
+    Versions of the same key in different databases (or after the store
+    was deleted) are unlikely to be equal, so are ETags built from them.
+    """
+    return int.from_bytes(os.urandom(4), "big") << 20
+
+
+def store_key(key: tuple[str, int]) -> str:
+    kind, id = key
+    return f"{kind}:{id}"
+
+
+class VersionRegistry:
+    def __init__(self, maxsize: int = 100000, ttl: float = 60.0) -> None:
+        """
+        Keep version counters of cached content (e.g. a user's project list).
+
+        By default counters are kept in the process. A key without a known
+        version gets a new, never used one, so forgetting a counter (eviction,
+        expiration, restart) causes only cache misses, never stale hits.
+        Counters expire after ttl, which bounds staleness of content changed
+        by another worker process.
+
+        With a store, counters are shared by all worker processes and content
+        changed by one of them is never served stale by another.
+        """
+        self._versions: TTLCache[Hashable, tuple[int, float]] = TTLCache(maxsize, ttl)
+        # Random start makes versions of different processes unlikely to overlap
+        self._counter = itertools.count(initial_version())
+        self._lock = threading.Lock()
+        self._store: Optional[SQLiteVersionStore] = None
+
+    def configure(
+        self,
+        maxsize: Optional[int] = None,
+        ttl: Optional[float] = None,
+        store: Optional[SQLiteVersionStore] = None,
+    ) -> None:
+        self._versions.configure(maxsize=maxsize, ttl=ttl)
+        self._store = store
+
+    def get(self, key: tuple[str, int]) -> tuple[int, float]:
+        """Get version and last modification unix timestamp."""
+        if self._store is not None:
+            return self._store.get(store_key(key))
+
+        with self._lock:
+            entry = self._versions.get(key)
+            if entry is None:
+                entry = (next(self._counter), time.time())
+                self._versions.set(key, entry)
+            return entry
+
+    def bump(self, key: tuple[str, int]) -> None:
+        if self._store is not None:
+            self._store.bump(store_key(key))
+            return
+
+        with self._lock:
+            self._versions.set(key, (next(self._counter), time.time()))
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.01) -> None:
+        """Create set of strings with no false negatives, error_rate false positives."""
+        self.capacity = max(capacity, 1)
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(round(self.size / self.capacity * math.log(2)), 1)
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str) -> Iterable[int]:
+        # Double hashing, k positions derived from two 64-bit hashes
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], "little")
+        b = int.from_bytes(digest[8:], "little") | 1
+        return ((a + i * b) % self.size for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        """Check whether key might have been added."""
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class MembershipFilter:
+    def __init__(
+        self,
+        loader: Callable[[], Iterable[str]],
+        ttl: float = 300.0,
+        error_rate: float = 0.01,
+    ) -> None:
+        """
+        Keep Bloom filter of keys from the database to answer "surely absent".
+
+        The filter is rebuilt with the loader after ttl seconds (or when it is
+        over capacity), so keys added by another worker process are missed
+        for at most ttl. A key reported as present has to be checked in the
+        database.
+
+        Rebuilds run on a separate thread, one at a time, in the application
+        context of the request which found the filter expired. Until the first
+        build is done every key might be present.
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self.error_rate = error_rate
+
+        self._filter: Optional[BloomFilter] = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+        # Keys added while a rebuild is running, the loader may miss them
+        self._added: Optional[list[str]] = None
+
+    def configure(self, ttl: Optional[float] = None) -> None:
+        if ttl is not None:
+            self.ttl = ttl
+        self.clear()
+
+    def might_contain(self, key: str) -> bool:
+        bloom = self._filter
+        if bloom is None or self._expires < time.monotonic():
+            self._start_rebuild()
+        return bloom is None or key in bloom
+
+    def add(self, key: str) -> None:
+        """Add key created by this process, without waiting for a rebuild."""
+        with self._lock:
+            if self._added is not None:
+                self._added.append(key)
+            if self._filter is not None:
+                self._filter.add(key)
+                if self._filter.count > self._filter.capacity:
+                    self._expires = 0.0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._filter = None
+
+    def _start_rebuild(self) -> None:
+        with self._lock:
+            if self._added is not None:
+                return
+            self._added = []
+
+        app = current_app._get_current_object()  # type: ignore
+        threading.Thread(
+            target=self._rebuild, args=(app,), name="membership-filter", daemon=True
+        ).start()
+
+    def _rebuild(self, app: Flask) -> None:
+        try:
+            with app.app_context():
+                keys = list(self.loader())
+        except Exception:
+            app.logger.exception("Failed to rebuild membership filter.")
+            with self._lock:
+                self._added = None
+            return
+
+        # Headroom for keys added until the next rebuild
+        bloom = BloomFilter(max(2 * len(keys), 1024), self.error_rate)
+        for key in keys:
+            bloom.add(key)
+
+        with self._lock:
+            for key in self._added or ():
+                bloom.add(key)
+            self._added = None
+            self._filter = bloom
+            self._expires = time.monotonic() + self.ttl
+
+
+versions = VersionRegistry()
+
+# Rendered template fragments, keys have to include versions of the content
+fragment_cache: TTLCache[Hashable, Markup] = TTLCache(maxsize=10000, ttl=300)
+
+
+def render_fragment(
+    key: Hashable, template_name: str, context: Callable[[], dict[str, Any]]
+) -> Markup:
+    """
+    Render template fragment or get it from the cache.
+
+    Context is a function, so loading data can be skipped on cache hit.
+    """
+    fragment = fragment_cache.get(key)
+    if fragment is None:
+        fragment = Markup(render_template(template_name, **context()))
+        fragment_cache.set(key, fragment)
+    return fragment
+
+
+def deploy_id(package_folder: str, manifest_path: Optional[str] = None) -> str:
+    """
+    Hash of the deployed code, templates and asset manifest.
+
+    Included in validators of cached pages, so a release never answers
+    with 304 to a page rendered by the previous one.
+    """
+    digest = hashlib.sha1()
+    paths: list[str] = []
+    for root, dirs, files in os.walk(package_folder):
+        dirs[:] = [d for d in dirs if d not in ("__pycache__", "static")]
+        paths.extend(os.path.join(root, name) for name in files)
+    if manifest_path is not None:
+        paths.append(manifest_path)
+
+    for path in sorted(paths):
+        if os.path.exists(path):
+            digest.update(os.path.relpath(path, package_folder).encode())
+            with open(path, "rb") as file:
+                digest.update(file.read())
+    return digest.hexdigest()[:16]
@@ -0,0 +1,202 @@
+"""
+Response compression.
+
+WSGI middleware compressing dynamic HTML and JSON responses with brotli
+(if the brotli package is installed) or gzip, whichever the client prefers
+in Accept-Encoding. Left untouched are:
+
+- responses smaller than min_size, compression would not pay off,
+- event streams, compressor buffering would delay events,
+- responses with Content-Encoding, e.g. precompressed assets (see app.assets),
+- partial content (206 or Content-Range), a range is of the identity body,
+- HEAD requests and responses without body.
+
+Compressed responses drop Accept-Ranges, ranges of the encoded body
+are not served.
+
+Responses of known length are compressed at once. Streamed responses
+(without Content-Length) are compressed chunk by chunk, every chunk is
+flushed, so the client gets the streamed parts as soon as without compression.
+"""
+
+
+from __future__ import annotations
+
+import zlib
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, Optional
+
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+from werkzeug.wsgi import ClosingIterator
+
+if TYPE_CHECKING:
+    from _typeshed.wsgi import StartResponse, WSGIApplication, WSGIEnvironment
+
+# Media types of dynamic responses
+COMPRESSIBLE_TYPES = (
+    "text/html",
+    "text/plain",
+    "text/css",
+    "text/javascript",
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+)
+
+NO_BODY_STATUSES = ("204", "304")
+
+
+class Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int) -> None:
+        """Create incremental compressor of a single response."""
+        self.encoding = encoding
+        if encoding == "br":
+            import brotli
+
+            compressor = brotli.Compressor(quality=brotli_quality)
+            self._process: Callable[[bytes], bytes] = compressor.process
+            self._flush: Callable[[], bytes] = compressor.flush
+            self._finish: Callable[[], bytes] = compressor.finish
+        else:
+            # wbits 31 writes gzip header and trailer
+            compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+            self._process = compressor.compress
+            self._flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = compressor.flush
+
+    def compress(self, data: bytes) -> bytes:
+        return self._process(data) + self._finish()
+
+    def compress_chunk(self, data: bytes) -> bytes:
+        """Compress the chunk, the output decompresses to all data so far."""
+        return self._process(data) + self._flush()
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+def unsupported_write(data: bytes) -> None:
+    raise RuntimeError("Compressed responses do not support write().")
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: WSGIApplication,
+        min_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        brotli: Optional[bool] = None,
+    ) -> None:
+        """
+        Wrap WSGI application.
+
+        Brotli is used if the brotli package is installed, unless brotli is False.
+        With brotli True, a missing package is an error.
+        """
+        if brotli is not False:
+            try:
+                import brotli as brotli_module  # noqa: F401
+            except ImportError as exc:
+                if brotli:
+                    raise RuntimeError(
+                        "Brotli compression requires brotli package."
+                    ) from exc
+                brotli = False
+            else:
+                brotli = True
+
+        self.app = app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        # Preferred first, used when the client accepts both equally
+        self.encodings = ["br", "gzip"] if brotli else ["gzip"]
+
+    def negotiate(self, environ: WSGIEnvironment) -> Optional[str]:
+        accept = parse_accept_header(environ.get("HTTP_ACCEPT_ENCODING"))
+        encoding: Optional[str] = accept.best_match(self.encodings)
+        return encoding
+
+    def __call__(
+        self, environ: WSGIEnvironment, start_response: StartResponse
+    ) -> Iterable[bytes]:
+        encoding = self.negotiate(environ)
+        if encoding is None or environ["REQUEST_METHOD"] == "HEAD":
+            return self.app(environ, start_response)
+
+        # Status and headers of the response. Calling start_response is deferred
+        # until the application returns (Flask calls it before returning).
+        captured: list[Any] = []
+        returned = False
+
+        def capture(
+            status: str, headers: list[tuple[str, str]], exc_info: Any = None
+        ) -> Callable[[bytes], Any]:
+            if returned:
+                # Started lazily, passed through uncompressed
+                return start_response(status, headers, exc_info)
+            captured[:] = [status, headers, exc_info]
+            return unsupported_write
+
+        result = self.app(environ, capture)
+        returned = True
+        if not captured:
+            return result
+
+        status, headers, exc_info = captured
+        response_headers = Headers(headers)
+
+        if not self.compressible(status, response_headers):
+            start_response(status, headers, exc_info)
+            return result
+
+        vary = {
+            value.strip().lower()
+            for value in response_headers.get("Vary", "").split(",")
+        }
+        if "accept-encoding" not in vary:
+            response_headers.add("Vary", "Accept-Encoding")
+        length = response_headers.get("Content-Length", type=int)
+        if length is not None and length < self.min_size:
+            start_response(status, response_headers.to_wsgi_list(), exc_info)
+            return result
+
+        compressor = Compressor(encoding, self.gzip_level, self.brotli_quality)
+        response_headers["Content-Encoding"] = encoding
+        del response_headers["Accept-Ranges"]
+        # Compressed response is a different representation
+        etag = response_headers.get("ETag")
+        if etag is not None and not etag.startswith("W/"):
+            response_headers["ETag"] = f"W/{etag}"
+
+        if length is not None:
+            body = compressor.compress(b"".join(result))
+            response_headers["Content-Length"] = str(len(body))
+            start_response(status, response_headers.to_wsgi_list(), exc_info)
+            # Closing the result runs its callbacks after the response was sent
+            return ClosingIterator([body], getattr(result, "close", None))
+
+        del response_headers["Content-Length"]
+        start_response(status, response_headers.to_wsgi_list(), exc_info)
+        return ClosingIterator(
+            self.stream(compressor, result), getattr(result, "close", None)
+        )
+
+    def compressible(self, status: str, headers: Headers) -> bool:
+        if status[:3] in NO_BODY_STATUSES or "Content-Encoding" in headers:
+            return False
+        if status[:3] == "206" or "Content-Range" in headers:
+            return False
+        if "no-transform" in headers.get("Cache-Control", ""):
+            return False
+        media_type = headers.get("Content-Type", "").split(";")[0].strip().lower()
+        return media_type in COMPRESSIBLE_TYPES
+
+    def stream(
+        self, compressor: Compressor, result: Iterable[bytes]
+    ) -> Iterator[bytes]:
+        for data in result:
+            if data:
+                yield compressor.compress_chunk(data)
+        yield compressor.finish()
@@ -0,0 +1,180 @@
+"""
+Database engine and session customization.
+
+- SQLite connections are tuned with pragmas set on connect (see configure_sqlite).
+- Reads done while handling GET/HEAD requests of views marked with
+  read_replica (or of blueprints passed to use_read_replica) can be served
+  by a separate read engine - read-only connections or a replica database.
+  Once the session flushes any change, it sticks to the primary engine.
+- After a request commits changes, the user's following requests read from
+  the primary for a few seconds, so they see their writes even if the replica
+  lags behind (read-your-writes).
+- Standalone SQLite databases (sessions, rate limits, jobs) use per-thread
+  connections of SQLiteConnections, reopened after fork.
+"""
+
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Any, Callable, Optional, Sequence, TypeVar, Union
+
+import sqlalchemy as sa
+from flask import Blueprint, current_app, has_request_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import orm
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+READ_METHODS = ("GET", "HEAD")
+
+# Key of the flask session holding the time until which reads go to the primary
+PRIMARY_UNTIL_KEY = "_read_primary_until"
+
+# Names of blueprints whose views read from the replica
+_replica_blueprints: set[str] = set()
+
+# Pragmas executed on every new SQLite connection
+_sqlite_pragmas: dict[str, Union[str, int]] = {}
+
+
+def configure_sqlite(pragmas: dict[str, Union[str, int]]) -> None:
+    """Set pragmas for new SQLite connections."""
+    _sqlite_pragmas.clear()
+    _sqlite_pragmas.update(pragmas)
+
+
+@sa.event.listens_for(sa.engine.Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+
+    for name, value in _sqlite_pragmas.items():
+        try:
+            dbapi_connection.execute(f"PRAGMA {name}={value}")
+        except sqlite3.OperationalError:
+            # Read-only connections cannot change journal mode,
+            # they use the one set by the writer
+            if name != "journal_mode":
+                raise
+
+
+class SQLiteConnections:
+    def __init__(self, path: str, schema: Sequence[str] = ()) -> None:
+        """
+        Manage per-thread autocommit connections to a standalone WAL mode database.
+
+        Schema statements are executed right away. SQLite connections must
+        not be used across fork(), a connection opened by another process
+        (e.g. the pre-fork master) is replaced by a new one.
+        """
+        self.path = path
+        self._local = threading.local()
+        # Inherited connections are never used, nor closed (closing could
+        # checkpoint or remove the WAL file of the other process)
+        self._inherited: list[sqlite3.Connection] = []
+
+        # Short-lived connection, nothing is left open to be inherited
+        with closing(self.connect()) as connection:
+            for statement in schema:
+                connection.execute(statement)
+
+    def connect(self) -> sqlite3.Connection:
+        # Autocommit mode, every statement is a separate transaction
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def get(self) -> sqlite3.Connection:
+        """Get connection for the current thread of the current process."""
+        connection: Optional[sqlite3.Connection] = getattr(
+            self._local, "connection", None
+        )
+        if connection is not None and self._local.pid != os.getpid():
+            self._inherited.append(connection)
+            connection = None
+        if connection is None:
+            connection = self.connect()
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+
+def read_replica(view: F) -> F:
+    """Let GET/HEAD requests of the view read from the replica."""
+    view.read_replica = True  # type: ignore
+    return view
+
+
+def use_read_replica(blueprint: Blueprint) -> None:
+    """Let GET/HEAD requests of all views of the blueprint read from the replica."""
+    _replica_blueprints.add(blueprint.name)
+
+
+def reads_from_replica() -> bool:
+    """Check if the current request may read from the replica."""
+    if request.method not in READ_METHODS or request.endpoint is None:
+        return False
+
+    view = current_app.view_functions.get(request.endpoint)
+    if not (
+        getattr(view, "read_replica", False) or request.blueprint in _replica_blueprints
+    ):
+        return False
+
+    # The user committed changes recently, the replica may not have them yet
+    return bool(session.get(PRIMARY_UNTIL_KEY, 0) < time.time())
+
+
+class RoutingSession(SignallingSession):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """Create session routing reads to the read engine, see get_bind."""
+        super().__init__(*args, **kwargs)
+        self.use_primary = False
+        self.wrote = False
+        self._use_replica: Optional[bool] = None
+
+    def get_bind(self, mapper: Any = None, clause: Any = None) -> Any:
+        if self._flushing:
+            self.use_primary = True
+            self.wrote = True
+
+        read_engine: Optional[sa.engine.Engine] = self.app.extensions.get("read_engine")
+        if read_engine is not None and not self.use_primary and has_request_context():
+            # Decided once per request, the session is removed at its end
+            if self._use_replica is None:
+                self._use_replica = reads_from_replica()
+            if self._use_replica:
+                return read_engine
+
+        return super().get_bind(mapper, clause)
+
+
+@sa.event.listens_for(RoutingSession, "after_commit")
+def read_your_writes(db_session: RoutingSession) -> None:
+    if not db_session.wrote:
+        return
+    db_session.wrote = False
+
+    window: float = db_session.app.config.get("DATABASE_READ_YOUR_WRITES_SECONDS", 0)
+    if (
+        window > 0
+        and "read_engine" in db_session.app.extensions
+        and has_request_context()
+    ):
+        session[PRIMARY_UNTIL_KEY] = time.time() + window
+
+
+@sa.event.listens_for(RoutingSession, "after_rollback")
+def discard_writes(db_session: RoutingSession) -> None:
+    db_session.wrote = False
+
+
+class Database(SQLAlchemy):
+    def create_session(self, options: dict[str, Any]) -> orm.sessionmaker:
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
@@ -0,0 +1,393 @@
+"""
+Real-time project updates.
+
+Committed changes of a project (its name and description, participants)
+are published as small JSON deltas to the project's channel. Clients
+follow a channel with a Server-Sent Events stream, see the project.events view.
+
+The broker keeps subscriptions of the current worker process. Publishing
+goes through a fan-out backend: "local" delivers only to the current
+process, "sqlite" delivers to subscribers in every worker on the host
+through a shared SQLite log, "redis" delivers to subscribers in every
+worker (and host) through Redis pub/sub.
+
+Under eventlet server (see configure(green=True)) subscriptions wait on
+green queues, an idle stream costs a green thread and a queue, not an OS thread.
+"""
+
+
+from __future__ import annotations
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import sqlalchemy as sa
+from flask import current_app
+
+from app.database import SQLiteConnections
+from app.models import Project, User, db
+
+Event = Dict[str, Any]
+Deliver = Callable[[str, Event], None]
+
+
+class Subscription:
+    def __init__(self, channel: str, events: Any) -> None:
+        """Create subscription to channel receiving events through a queue."""
+        self.channel = channel
+        # Bounded queue, a subscriber not keeping up is dropped
+        self.events = events
+        self.overflowed = False
+        self.closed = False
+
+    def put(self, event: Optional[Event]) -> bool:
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            return False
+        return True
+
+    def get(self, timeout: float) -> Optional[Event]:
+        """Wait for the next event. Returns None on timeout or when closed."""
+        if self.closed:
+            return None
+        try:
+            event: Optional[Event] = self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if event is None:
+            self.closed = True
+        return event
+
+
+# Base class for fan-out backends delivering published events to workers
+class Fanout:
+    def start(self, deliver: Deliver) -> None:
+        """Start delivering events published by any worker."""
+        raise NotImplementedError
+
+    def publish(self, channel: str, event: Event) -> None:
+        raise NotImplementedError
+
+
+class LocalFanout(Fanout):
+    def __init__(self) -> None:
+        """Create backend delivering only to subscribers of the current process."""
+        self._deliver: Optional[Deliver] = None
+
+    def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    def publish(self, channel: str, event: Event) -> None:
+        if self._deliver is not None:
+            self._deliver(channel, event)
+
+
+class RedisFanout(Fanout):
+    def __init__(
+        self, url: str, prefix: str = "events:", poll_interval: float = 0.05
+    ) -> None:
+        """
+        Create backend delivering events through Redis pub/sub.
+
+        Requires redis package. Under eventlet the listener is a green thread
+        polling the connection, otherwise a daemon thread blocking on it.
+        """
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("Redis events backend requires redis package.") from exc
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.poll_interval = poll_interval
+
+    def start(self, deliver: Deliver) -> None:
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(self.prefix + "*")
+
+        def listen() -> None:
+            while True:
+                try:
+                    message = pubsub.get_message(timeout=0 if broker.green else 1)
+                except Exception:
+                    # Connection lost, redis-py reconnects on the next call
+                    _sleep(1)
+                    continue
+
+                if message is None:
+                    if broker.green:
+                        _sleep(self.poll_interval)
+                    continue
+
+                channel = message["channel"].decode()[len(self.prefix) :]
+                deliver(channel, json.loads(message["data"]))
+
+        _spawn(listen)
+
+    def publish(self, channel: str, event: Event) -> None:
+        self.client.publish(self.prefix + channel, json.dumps(event))
+
+
+class SQLiteFanout(Fanout):
+    def __init__(
+        self, path: str, poll_interval: float = 0.1, retention: float = 60
+    ) -> None:
+        """
+        Create backend delivering events through a log in a SQLite database.
+
+        Events are appended to the log, every worker polls it for events
+        after the last one it has seen, so all workers on the host share it.
+        Events older than retention seconds are removed by publishers.
+        """
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._next_sweep = time.monotonic() + retention
+        self.connections = SQLiteConnections(
+            path,
+            [
+                # AUTOINCREMENT, ids of swept events are never reused
+                "CREATE TABLE IF NOT EXISTS event ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, "
+                "data TEXT NOT NULL, created REAL NOT NULL)"
+            ],
+        )
+
+    def start(self, deliver: Deliver) -> None:
+        # Events published before this worker started are not delivered
+        row = self.connections.get().execute("SELECT MAX(id) FROM event").fetchone()
+        last_id = row[0] or 0
+
+        def listen() -> None:
+            nonlocal last_id
+            while True:
+                try:
+                    rows = (
+                        self.connections.get()
+                        .execute(
+                            "SELECT id, channel, data FROM event WHERE id > ? "
+                            "ORDER BY id",
+                            (last_id,),
+                        )
+                        .fetchall()
+                    )
+                except sqlite3.Error:
+                    # Database locked for longer than the busy timeout
+                    rows = []
+
+                for event_id, channel, data in rows:
+                    last_id = event_id
+                    deliver(channel, json.loads(data))
+                _sleep(self.poll_interval)
+
+        _spawn(listen)
+
+    def publish(self, channel: str, event: Event) -> None:
+        self.connections.get().execute(
+            "INSERT INTO event (channel, data, created) VALUES (?, ?, ?)",
+            (channel, json.dumps(event), time.time()),
+        )
+        self._maybe_sweep()
+
+    def _maybe_sweep(self) -> None:
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.retention
+            self.connections.get().execute(
+                "DELETE FROM event WHERE created < ?", (time.time() - self.retention,)
+            )
+
+
+def _spawn(function: Callable[[], None]) -> None:
+    if broker.green:
+        import eventlet
+
+        eventlet.spawn(function)
+    else:
+        threading.Thread(target=function, daemon=True).start()
+
+
+def _sleep(seconds: float) -> None:
+    if broker.green:
+        import eventlet
+
+        eventlet.sleep(seconds)
+    else:
+        time.sleep(seconds)
+
+
+class EventBroker:
+    def __init__(self, queue_size: int = 100) -> None:
+        """Create broker with local fan-out, configured in setup_events."""
+        self.queue_size = queue_size
+        self.fanout: Fanout = LocalFanout()
+        self.green = False
+
+        self._channels: dict[str, set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._started = False
+        self.delivered = 0
+        self.dropped = 0
+
+    def configure(
+        self,
+        fanout: Optional[Fanout] = None,
+        queue_size: Optional[int] = None,
+        green: Optional[bool] = None,
+    ) -> None:
+        """
+        Set fan-out backend, size of subscription queues and queue type.
+
+        Green queues should be used only when running under eventlet hub.
+        """
+        if fanout is not None:
+            self.fanout = fanout
+            self._started = False
+        if queue_size is not None:
+            self.queue_size = queue_size
+        if green is not None:
+            self.green = green
+
+    def subscribe(self, channel: str) -> Subscription:
+        self._start()
+        if self.green:
+            # Imported only when running under eventlet server
+            from eventlet.queue import LightQueue
+
+            events: Any = LightQueue(self.queue_size)
+        else:
+            events = queue.Queue(self.queue_size)
+
+        subscription = Subscription(channel, events)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._channels.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._channels[subscription.channel]
+
+    def publish(self, channel: str, event: Event) -> None:
+        self._start()
+        self.fanout.publish(channel, event)
+
+    def deliver(self, channel: str, event: Event) -> None:
+        """Put event to queues of the channel's subscribers in this process."""
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+            self.delivered += 1
+
+        for subscription in subscriptions:
+            if not subscription.put(event):
+                subscription.overflowed = True
+                self.unsubscribe(subscription)
+                with self._lock:
+                    self.dropped += 1
+
+    def close(self) -> None:
+        """End all subscriptions, e.g. before a graceful shutdown."""
+        with self._lock:
+            subscriptions = [s for group in self._channels.values() for s in group]
+            self._channels.clear()
+        for subscription in subscriptions:
+            subscription.closed = True
+            subscription.put(None)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "subscribers": sum(len(group) for group in self._channels.values()),
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+            }
+
+    def _start(self) -> None:
+        # Started lazily, pre-forked workers start their own listeners
+        if not self._started:
+            self._started = True
+            self.fanout.start(self.deliver)
+
+
+broker = EventBroker()
+
+
+def project_channel(project_id: int) -> str:
+    return f"project:{project_id}"
+
+
+def user_delta(user: User) -> dict[str, Any]:
+    return {"id": user.id, "username": user.username}
+
+
+# Events are published only after the change is committed,
+# subscribers reading the project must see the new state.
+@sa.event.listens_for(Project.participants, "append")
+def participant_added(project: Project, user: User, initiator: Any) -> None:
+    db.session.info.setdefault("participant_changes", []).append(
+        ("participant_added", project, user)
+    )
+
+
+@sa.event.listens_for(Project.participants, "remove")
+def participant_removed(project: Project, user: User, initiator: Any) -> None:
+    db.session.info.setdefault("participant_changes", []).append(
+        ("participant_removed", project, user)
+    )
+
+
+@sa.event.listens_for(sa.orm.Session, "after_flush")
+def collect_project_events(session: sa.orm.Session, flush_context: Any) -> None:
+    events = session.info.setdefault("project_events", [])
+
+    # Primary keys of new objects are known only after the flush
+    for kind, project, user in session.info.pop("participant_changes", []):
+        events.append((project.id, {"type": kind, "user": user_delta(user)}))
+
+    for project in session.dirty:
+        if not isinstance(project, Project):
+            continue
+        state = sa.inspect(project)
+        changes = {
+            name: getattr(project, name)
+            for name in ("name", "description")
+            if state.attrs[name].history.has_changes()
+        }
+        if changes:
+            events.append((project.id, {"type": "project_updated", **changes}))
+
+    for project in session.deleted:
+        if isinstance(project, Project):
+            events.append((project.id, {"type": "project_deleted"}))
+
+
+@sa.event.listens_for(sa.orm.Session, "after_commit")
+def publish_project_events(session: sa.orm.Session) -> None:
+    events = session.info.pop("project_events", [])
+    # Bulk inserts carry no usernames, clients reload the participants
+    events.extend(
+        (project_id, {"type": "participants_changed"})
+        for project_id in session.info.pop("bulk_participants", ())
+    )
+
+    try:
+        for project_id, event in events:
+            broker.publish(project_channel(project_id), event)
+    except Exception:
+        # The change is committed already, clients get it on the next page load
+        current_app.logger.exception("Failed to publish project events.")
+
+
+@sa.event.listens_for(sa.orm.Session, "after_rollback")
+def discard_project_events(session: sa.orm.Session) -> None:
+    session.info.pop("participant_changes", None)
+    session.info.pop("project_events", None)
+    session.info.pop("bulk_participants", None)
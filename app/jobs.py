@@ -0,0 +1,490 @@
+"""
+Background jobs.
+
+Side effects of requests which the response does not depend on (e.g.
+writing recent project visits) are enqueued as jobs, the request returns
+without waiting for them. Jobs are registered by name with the job
+decorator, their arguments have to be JSON serializable.
+
+The "inline" backend runs jobs in the worker process which enqueued them,
+after the response was sent (not durable, a crash loses them). The "sqlite"
+backend stores jobs in a separate SQLite database, executed by worker
+processes started with "flask jobs-worker":
+
+- jobs run on a pool of threads, jobs registered with process=True
+  (CPU bound, holding the GIL) in a pool of processes,
+- a job is leased by the worker, jobs of a crashed worker are picked up
+  again once the lease expires, so a job can run more than once,
+- failed jobs are retried with exponential backoff, after max_attempts
+  they are kept as failed, see "flask jobs-retry".
+"""
+
+
+from __future__ import annotations
+
+import json
+import math
+import multiprocessing
+import random
+import signal
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, TypeVar
+
+import click
+from flask import Flask, after_this_request, current_app, g, has_request_context
+
+from app.database import SQLiteConnections
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+F = TypeVar("F", bound=Callable[..., None])
+
+Payload = Dict[str, Any]
+
+# Upper bounds (seconds) of job latency histogram buckets,
+# latency is the time from enqueueing to the end of the job
+LATENCY_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 600.0, 3600.0)
+
+
+@dataclass(frozen=True)
+class JobType:
+    name: str
+    function: Callable[..., None]
+    max_attempts: int
+    # Run in the process pool of the jobs worker instead of a thread
+    process: bool
+
+
+@dataclass
+class Job:
+    id: int
+    name: str
+    payload: Payload
+    # Including the current one
+    attempts: int
+    max_attempts: int
+    enqueued_at: float
+
+
+_job_types: dict[str, JobType] = {}
+
+
+def job(
+    name: Optional[str] = None, max_attempts: int = 5, process: bool = False
+) -> Callable[[F], F]:
+    """Register function as a job, called with keyword arguments of enqueue."""
+
+    def decorator(function: F) -> F:
+        job_name = name or function.__name__
+        _job_types[job_name] = JobType(job_name, function, max_attempts, process)
+        return function
+
+    return decorator
+
+
+def run_job(app: Flask, name: str, payload: Payload) -> None:
+    """Run the job function in application context."""
+    with app.app_context():
+        _job_types[name].function(**payload)
+
+
+def retry_delay(attempts: int, base: float, limit: float) -> float:
+    """Exponential backoff with jitter, delays of concurrent failures spread out."""
+    delay = min(base * 2 ** (attempts - 1), limit)
+    return delay * random.uniform(0.5, 1.0)
+
+
+class SQLiteJobQueue:
+    def __init__(self, path: str) -> None:
+        """
+        Create durable queue in a separate SQLite database.
+
+        Jobs are ordered by run_at. A claimed job gets run_at of its lease expiry,
+        so once the lease expires it is claimed again, no separate lock is kept.
+        """
+        self.path = path
+        self.connections = SQLiteConnections(
+            path,
+            [
+                "CREATE TABLE IF NOT EXISTS job ("
+                "id INTEGER PRIMARY KEY, name TEXT NOT NULL, payload TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, "
+                "enqueued_at REAL NOT NULL, run_at REAL NOT NULL, "
+                "failed_at REAL, error TEXT)",
+                "CREATE INDEX IF NOT EXISTS ix_job_run_at ON job (run_at) "
+                "WHERE failed_at IS NULL",
+                # Finished jobs by outcome and latency bucket, for /metrics
+                "CREATE TABLE IF NOT EXISTS job_stats ("
+                "name TEXT NOT NULL, outcome TEXT NOT NULL, bucket INTEGER NOT NULL, "
+                "count INTEGER NOT NULL, latency_sum REAL NOT NULL, "
+                "PRIMARY KEY (name, outcome, bucket))",
+            ],
+        )
+
+    def push(self, job_type: JobType, payload: Payload) -> None:
+        now = time.time()
+        self.connections.get().execute(
+            "INSERT INTO job (name, payload, max_attempts, enqueued_at, run_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (job_type.name, json.dumps(payload), job_type.max_attempts, now, now),
+        )
+
+    def claim(self, lease: float) -> Optional[Job]:
+        """Take the next due job for lease seconds."""
+        connection = self.connections.get()
+        now = time.time()
+
+        # Write lock is taken right away, a job is claimed by a single worker
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT id, name, payload, attempts, max_attempts, enqueued_at "
+                "FROM job WHERE failed_at IS NULL AND run_at <= ? "
+                "ORDER BY run_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE job SET attempts = attempts + 1, run_at = ? WHERE id = ?",
+                    (now + lease, row[0]),
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        if row is None:
+            return None
+        id, name, payload, attempts, max_attempts, enqueued_at = row
+        return Job(
+            id, name, json.loads(payload), attempts + 1, max_attempts, enqueued_at
+        )
+
+    def complete(self, job: Job) -> None:
+        self._finish(job, "completed", "DELETE FROM job WHERE id = ?", (job.id,))
+
+    def retry(self, job: Job, delay: float, error: str) -> None:
+        self._finish(
+            job,
+            "retried",
+            "UPDATE job SET run_at = ?, error = ? WHERE id = ?",
+            (time.time() + delay, error, job.id),
+        )
+
+    def fail(self, job: Job, error: str) -> None:
+        self._finish(
+            job,
+            "failed",
+            "UPDATE job SET failed_at = ?, error = ? WHERE id = ?",
+            (time.time(), error, job.id),
+        )
+
+    def _finish(
+        self, job: Job, outcome: str, statement: str, parameters: tuple[Any, ...]
+    ) -> None:
+        connection = self.connections.get()
+        latency = time.time() - job.enqueued_at
+        bucket = next(
+            (i for i, bound in enumerate(LATENCY_BUCKETS) if latency <= bound),
+            len(LATENCY_BUCKETS),
+        )
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(statement, parameters)
+            connection.execute(
+                "INSERT INTO job_stats (name, outcome, bucket, count, latency_sum) "
+                "VALUES (?, ?, ?, 1, ?) ON CONFLICT (name, outcome, bucket) "
+                "DO UPDATE SET count = count + 1, "
+                "latency_sum = latency_sum + excluded.latency_sum",
+                (job.name, outcome, bucket, latency),
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def requeue_failed(self) -> int:
+        """Schedule failed jobs again with their attempts reset. Returns the count."""
+        cursor = self.connections.get().execute(
+            "UPDATE job SET failed_at = NULL, attempts = 0, run_at = ? "
+            "WHERE failed_at IS NOT NULL",
+            (time.time(),),
+        )
+        return cursor.rowcount
+
+    def stats(self) -> dict[str, Any]:
+        """Queue depth, failed jobs and finished jobs by name and outcome."""
+        connection = self.connections.get()
+        depth, oldest = connection.execute(
+            "SELECT COUNT(*), MIN(enqueued_at) FROM job WHERE failed_at IS NULL"
+        ).fetchone()
+        (failed,) = connection.execute(
+            "SELECT COUNT(*) FROM job WHERE failed_at IS NOT NULL"
+        ).fetchone()
+        finished = connection.execute(
+            "SELECT name, outcome, bucket, count, latency_sum FROM job_stats "
+            "ORDER BY name, outcome, bucket"
+        ).fetchall()
+        return {
+            "depth": depth,
+            "oldest_age": time.time() - oldest if oldest is not None else 0.0,
+            "failed": failed,
+            "finished": finished,
+        }
+
+
+class JobManager:
+    def __init__(self) -> None:
+        """Create manager running jobs inline until a queue is configured."""
+        self.queue: Optional[SQLiteJobQueue] = None
+
+    def configure(self, queue: Optional[SQLiteJobQueue]) -> None:
+        """Set durable queue, None runs jobs inline."""
+        self.queue = queue
+
+    def enqueue(self, name: str, **payload: Any) -> None:
+        """
+        Enqueue job, call it once the change it depends on is committed.
+
+        Failing to enqueue is logged, the request does not fail with it.
+        """
+        job_type = _job_types[name]
+
+        if self.queue is not None:
+            try:
+                self.queue.push(job_type, payload)
+            except sqlite3.Error:
+                current_app.logger.exception("Failed to enqueue %s job.", name)
+            return
+
+        app = current_app._get_current_object()  # type: ignore
+        if not has_request_context():
+            self._run_inline(app, name, payload)
+            return
+
+        # Run after the response was sent, like writing behind recent projects
+        if "inline_jobs" not in g:
+            g.inline_jobs = []
+
+            @after_this_request
+            def run_after_response(response: Any) -> Any:
+                pending = g.pop("inline_jobs")
+
+                def run_pending() -> None:
+                    for name, payload in pending:
+                        self._run_inline(app, name, payload)
+
+                response.call_on_close(run_pending)
+                return response
+
+        g.inline_jobs.append((name, payload))
+
+    def _run_inline(self, app: Flask, name: str, payload: Payload) -> None:
+        try:
+            run_job(app, name, payload)
+        except Exception:
+            app.logger.exception("Job %s failed.", name)
+
+
+jobs = JobManager()
+enqueue = jobs.enqueue
+
+
+# Application of the process pool workers, created by _init_process
+_process_app: Optional[Flask] = None
+
+
+def _init_process() -> None:
+    global _process_app
+    from app import create_app
+
+    # Interrupting the worker stops the pool, running jobs are finished
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _process_app = create_app()
+
+
+def _run_in_process(name: str, payload: Payload) -> None:
+    assert _process_app is not None
+    run_job(_process_app, name, payload)
+
+
+class Worker:
+    def __init__(
+        self,
+        app: Flask,
+        queue: SQLiteJobQueue,
+        threads: int = 10,
+        processes: int = 1,
+        poll_interval: float = 0.5,
+        lease: float = 300,
+        retry_base: float = 5,
+        retry_limit: float = 600,
+    ) -> None:
+        """
+        Create worker claiming due jobs and running them on threads or processes.
+
+        Stops claiming on SIGTERM/SIGINT and waits for running jobs
+        at most graceful_timeout seconds.
+        """
+        self.app = app
+        self.queue = queue
+        self.threads = threads
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.retry_base = retry_base
+        self.retry_limit = retry_limit
+
+        self.stopping = threading.Event()
+        # Started on the first process job, spawned processes import the app
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def run(self, graceful_timeout: float = 30) -> None:
+        def stop(*args: Any) -> None:
+            self.stopping.set()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        # Jobs block on the database and network, sqlite3 and most clients
+        # release the GIL while waiting, so they overlap on native threads.
+        # Daemon threads are not joined at exit, unlike the executor's ones.
+        slots = threading.BoundedSemaphore(self.threads)
+        running: list[threading.Thread] = []
+        while not self.stopping.is_set():
+            if not slots.acquire(timeout=self.poll_interval):
+                continue
+
+            job = self.queue.claim(self.lease)
+            if job is None:
+                slots.release()
+                self.stopping.wait(self.poll_interval)
+                continue
+
+            thread = threading.Thread(
+                target=self._execute_in_slot,
+                args=(job, slots),
+                name=f"job-{job.id}",
+                daemon=True,
+            )
+            thread.start()
+            running = [thread for thread in running if thread.is_alive()]
+            running.append(thread)
+
+        # Jobs still running after the timeout are abandoned, they are
+        # claimed again once their lease expires
+        deadline = time.monotonic() + graceful_timeout
+        for thread in running:
+            thread.join(max(deadline - time.monotonic(), 0))
+        abandoned = sum(thread.is_alive() for thread in running)
+        if abandoned:
+            self.app.logger.warning("Stopping with %d jobs running.", abandoned)
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            if abandoned:
+                # Pool processes are joined at exit, stop the busy ones
+                for process in multiprocessing.active_children():
+                    process.terminate()
+
+    def _execute_in_slot(self, job: Job, slots: threading.BoundedSemaphore) -> None:
+        try:
+            self.execute(job)
+        finally:
+            slots.release()
+
+    def execute(self, job: Job) -> None:
+        """Run the claimed job and record its outcome."""
+        try:
+            job_type = _job_types[job.name]
+            if job_type.process and self.processes > 0:
+                self._run_in_pool(job)
+            else:
+                run_job(self.app, job.name, job.payload)
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+            if job.attempts >= job.max_attempts or job.name not in _job_types:
+                self.app.logger.exception("Job %s %d failed.", job.name, job.id)
+                self.queue.fail(job, error)
+            else:
+                self.app.logger.warning(
+                    "Job %s %d failed (attempt %d), retrying: %s",
+                    job.name,
+                    job.id,
+                    job.attempts,
+                    error,
+                )
+                delay = retry_delay(job.attempts, self.retry_base, self.retry_limit)
+                self.queue.retry(job, delay, error)
+        else:
+            self.queue.complete(job)
+
+    def _run_in_pool(self, job: Job) -> None:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with self._executor_lock:
+            if self._executor is None:
+                # Spawned, not forked, processes do not inherit the threads
+                # and open database connections
+                self._executor = ProcessPoolExecutor(
+                    self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_process,
+                )
+        self._executor.submit(_run_in_process, job.name, job.payload).result()
+
+
+def register_job_utils(app: Flask) -> None:
+    """Jobs worker and queue maintenance commands."""
+
+    def get_queue() -> SQLiteJobQueue:
+        if jobs.queue is None:
+            raise click.UsageError("Jobs are run inline, set JOBS_BACKEND=sqlite.")
+        return jobs.queue
+
+    @app.cli.command("jobs-worker")
+    @click.option(
+        "--threads",
+        type=int,
+        default=lambda: app.config["JOBS_WORKER_THREADS"],
+        help="Jobs run concurrently on threads.",
+    )
+    @click.option(
+        "--processes",
+        type=int,
+        default=lambda: app.config["JOBS_WORKER_PROCESSES"],
+        help="Processes for process jobs, 0 runs them on threads.",
+    )
+    def jobs_worker(threads: int, processes: int) -> None:
+        """Run jobs of the queue until interrupted."""
+        worker = Worker(
+            app,
+            get_queue(),
+            threads=threads,
+            processes=processes,
+            poll_interval=app.config["JOBS_POLL_INTERVAL"],
+            lease=app.config["JOBS_LEASE"],
+            retry_base=app.config["JOBS_RETRY_BASE"],
+            retry_limit=app.config["JOBS_RETRY_LIMIT"],
+        )
+        click.echo(f"[INFO] Starting jobs worker with {threads} threads...")
+        worker.run()
+
+    @app.cli.command("jobs-status")
+    def jobs_status() -> None:
+        """Show queue depth and failed jobs."""
+        stats = get_queue().stats()
+        click.echo(f"Queued: {stats['depth']}, failed: {stats['failed']}")
+        if stats["depth"]:
+            click.echo(f"Oldest queued {math.ceil(stats['oldest_age'])} s ago.")
+
+    @app.cli.command("jobs-retry")
+    def jobs_retry() -> None:
+        """Queue failed jobs again."""
+        click.echo(f"Queued {get_queue().requeue_failed()} failed jobs again.")
@@ -0,0 +1,306 @@
+"""
+Per-request instrumentation.
+
+Every request records the number of SQL statements, time spent in the
+database, in template rendering and in total. The numbers are sent back
+in a Server-Timing header and aggregated per endpoint for the Prometheus
+/metrics endpoint. Statements slower than the configured threshold
+are logged at the end of the request.
+
+Metrics are local to a worker process and labelled with its pid. With
+pre-forked workers each scrape sees only the worker which handled it, so
+per-worker series show gaps; totals across workers need every worker
+scraped (or a multiprocess collector). Job metrics are read from the jobs
+queue, shared by all processes and not labelled.
+"""
+
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Iterator, Optional
+
+import sqlalchemy as sa
+from flask import (
+    Flask,
+    before_render_template,
+    g,
+    has_request_context,
+    request,
+    request_finished,
+    request_started,
+    template_rendered,
+)
+
+from app.cache import TTLCache, fragment_cache
+from app.events import broker
+from app.jobs import LATENCY_BUCKETS, jobs
+from app.models import user_cache
+
+if TYPE_CHECKING:
+    from flask import Response
+
+# Upper bounds (seconds) of request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Caches reported by /metrics, by name
+CACHES: dict[str, TTLCache[Any, Any]] = {
+    "fragment": fragment_cache,
+    "user": user_cache,
+}
+
+
+# Measurements of the request being handled, kept in flask.g
+@dataclass
+class RequestStats:
+    slow_query_ms: float
+    start: float = field(default_factory=time.perf_counter)
+    statements: int = 0
+    db_time: float = 0.0
+    render_time: float = 0.0
+    # (duration, statement) of statements over the slow query threshold
+    slow_queries: list[tuple[float, str]] = field(default_factory=list)
+
+    # Nested render start times, fragments can be rendered inside a template
+    _render_starts: list[float] = field(default_factory=list)
+
+
+# Totals of all requests handled by an endpoint
+@dataclass
+class EndpointStats:
+    requests: int = 0
+    statements: int = 0
+    db_time: float = 0.0
+    render_time: float = 0.0
+    duration: float = 0.0
+    buckets: list[int] = field(default_factory=lambda: [0] * len(DURATION_BUCKETS))
+    statuses: dict[int, int] = field(default_factory=lambda: defaultdict(int))
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        """Collect totals of finished requests by endpoint."""
+        self._endpoints: dict[str, EndpointStats] = defaultdict(EndpointStats)
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint: str, status: int, stats: RequestStats) -> float:
+        """Add finished request to the endpoint totals. Returns its duration."""
+        duration = time.perf_counter() - stats.start
+        with self._lock:
+            totals = self._endpoints[endpoint]
+            totals.requests += 1
+            totals.statements += stats.statements
+            totals.db_time += stats.db_time
+            totals.render_time += stats.render_time
+            totals.duration += duration
+            totals.statuses[status] += 1
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    totals.buckets[i] += 1
+        return duration
+
+    def clear(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+
+    def render(self) -> str:
+        """Render metrics in Prometheus text exposition format."""
+        worker = f'worker="{os.getpid()}"'
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = list(_render_endpoints(endpoints, worker))
+        lines.extend(_render_caches(worker))
+        lines.extend(_render_events(worker))
+        lines.extend(_render_jobs())
+        return "\n".join(lines) + "\n"
+
+
+def _render_endpoints(
+    endpoints: list[tuple[str, EndpointStats]], worker: str
+) -> Iterator[str]:
+    yield "# HELP scribbly_requests_total Handled requests."
+    yield "# TYPE scribbly_requests_total counter"
+    for endpoint, totals in endpoints:
+        for status, count in sorted(totals.statuses.items()):
+            labels = f'endpoint="{endpoint}",status="{status}",{worker}'
+            yield f"scribbly_requests_total{{{labels}}} {count}"
+
+    counters = (
+        ("sql_statements_total", "SQL statements executed.", "statements"),
+        ("db_seconds_total", "Time spent executing SQL statements.", "db_time"),
+        ("render_seconds_total", "Time spent rendering templates.", "render_time"),
+    )
+    for name, description, attribute in counters:
+        yield f"# HELP scribbly_{name} {description}"
+        yield f"# TYPE scribbly_{name} counter"
+        for endpoint, totals in endpoints:
+            value = getattr(totals, attribute)
+            yield f'scribbly_{name}{{endpoint="{endpoint}",{worker}}} {value}'
+
+    yield "# HELP scribbly_request_duration_seconds Request handling time."
+    yield "# TYPE scribbly_request_duration_seconds histogram"
+    for endpoint, totals in endpoints:
+        name = "scribbly_request_duration_seconds"
+        labels = f'endpoint="{endpoint}",{worker}'
+        for bound, count in zip(DURATION_BUCKETS, totals.buckets):
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {totals.requests}'
+        yield f"{name}_sum{{{labels}}} {totals.duration}"
+        yield f"{name}_count{{{labels}}} {totals.requests}"
+
+
+def _render_caches(worker: str) -> Iterator[str]:
+    stats = {name: cache.stats() for name, cache in sorted(CACHES.items())}
+    for key, kind in (("hits", "counter"), ("misses", "counter"), ("size", "gauge")):
+        name = f"scribbly_cache_{key}" + ("_total" if kind == "counter" else "")
+        yield f"# TYPE {name} {kind}"
+        for cache, values in stats.items():
+            yield f'{name}{{cache="{cache}",{worker}}} {values[key]}'
+
+
+def _render_events(worker: str) -> Iterator[str]:
+    stats = broker.stats()
+    yield "# HELP scribbly_event_subscribers Open project event streams."
+    yield "# TYPE scribbly_event_subscribers gauge"
+    yield f"scribbly_event_subscribers{{{worker}}} {stats['subscribers']}"
+    yield "# HELP scribbly_events_delivered_total Events delivered to the worker."
+    yield "# TYPE scribbly_events_delivered_total counter"
+    yield f"scribbly_events_delivered_total{{{worker}}} {stats['delivered']}"
+    yield "# HELP scribbly_event_streams_dropped_total Streams dropped as too slow."
+    yield "# TYPE scribbly_event_streams_dropped_total counter"
+    yield f"scribbly_event_streams_dropped_total{{{worker}}} {stats['dropped']}"
+
+
+def _render_jobs() -> Iterator[str]:
+    if jobs.queue is None:
+        return
+    stats = jobs.queue.stats()
+    yield "# HELP scribbly_jobs_queued Jobs waiting or running."
+    yield "# TYPE scribbly_jobs_queued gauge"
+    yield f"scribbly_jobs_queued {stats['depth']}"
+    yield "# HELP scribbly_jobs_oldest_queued_seconds Age of the oldest queued job."
+    yield "# TYPE scribbly_jobs_oldest_queued_seconds gauge"
+    yield f"scribbly_jobs_oldest_queued_seconds {stats['oldest_age']}"
+    yield "# HELP scribbly_jobs_failed Jobs failed after all attempts."
+    yield "# TYPE scribbly_jobs_failed gauge"
+    yield f"scribbly_jobs_failed {stats['failed']}"
+
+    # (job, outcome) -> count of finished jobs by latency bucket, latency sum
+    totals: dict[tuple[str, str], tuple[list[int], float]] = {}
+    for name, outcome, bucket, count, latency_sum in stats["finished"]:
+        counts, total = totals.setdefault(
+            (name, outcome), ([0] * (len(LATENCY_BUCKETS) + 1), 0.0)
+        )
+        counts[bucket] += count
+        totals[(name, outcome)] = (counts, total + latency_sum)
+
+    name = "scribbly_job_latency_seconds"
+    yield f"# HELP {name} Time from enqueueing to the end of a job attempt."
+    yield f"# TYPE {name} histogram"
+    for (job, outcome), (counts, total) in sorted(totals.items()):
+        labels = f'job="{job}",outcome="{outcome}"'
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {sum(counts)}'
+        yield f"{name}_sum{{{labels}}} {total}"
+        yield f"{name}_count{{{labels}}} {sum(counts)}"
+
+
+registry = MetricsRegistry()
+
+
+def current_stats() -> Optional[RequestStats]:
+    if not has_request_context():
+        return None
+    stats: Optional[RequestStats] = g.get("request_stats")
+    return stats
+
+
+def _before_cursor_execute(conn: Any, *args: Any) -> None:
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+    duration = time.perf_counter() - conn.info["query_start"].pop()
+
+    stats = current_stats()
+    if stats is None:
+        return
+
+    stats.statements += 1
+    stats.db_time += duration
+    if duration * 1000 >= stats.slow_query_ms:
+        stats.slow_queries.append((duration, statement))
+
+
+def _handle_error(context: Any) -> None:
+    # Failed statement does not reach after_cursor_execute
+    starts = context.connection.info.get("query_start") if context.connection else None
+    if starts:
+        starts.pop()
+
+
+def _before_render_template(app: Flask, **extra: Any) -> None:
+    stats = current_stats()
+    if stats is not None:
+        stats._render_starts.append(time.perf_counter())
+
+
+def _template_rendered(app: Flask, **extra: Any) -> None:
+    stats = current_stats()
+    if stats is not None and stats._render_starts:
+        start = stats._render_starts.pop()
+        # Count only the outermost render, nested ones are already included
+        if not stats._render_starts:
+            stats.render_time += time.perf_counter() - start
+
+
+def _request_started(app: Flask, **extra: Any) -> None:
+    g.request_stats = RequestStats(slow_query_ms=app.config["SLOW_QUERY_MS"])
+
+
+def _request_finished(app: Flask, response: Response, **extra: Any) -> None:
+    stats = current_stats()
+    if stats is None:
+        return
+
+    endpoint = request.endpoint or "none"
+    duration = registry.observe(endpoint, response.status_code, stats)
+
+    if app.config["SERVER_TIMING"]:
+        response.headers["Server-Timing"] = ", ".join(
+            (
+                f'db;dur={stats.db_time * 1000:.2f};desc="{stats.statements} queries"',
+                f"render;dur={stats.render_time * 1000:.2f}",
+                f"total;dur={duration * 1000:.2f}",
+            )
+        )
+
+    for query_duration, statement in stats.slow_queries:
+        app.logger.warning(
+            "Slow query (%.1f ms) in %s %s: %s",
+            query_duration * 1000,
+            request.method,
+            request.path,
+            " ".join(statement.split()),
+        )
+
+
+def register_instrumentation(app: Flask) -> None:
+    """Connect request, template and SQL hooks. Expects SLOW_QUERY_MS and SERVER_TIMING."""
+    engine = sa.engine.Engine
+    if not sa.event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        sa.event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        sa.event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        sa.event.listen(engine, "handle_error", _handle_error)
+
+    request_started.connect(_request_started, app)
+    request_finished.connect(_request_finished, app)
+    before_render_template.connect(_before_render_template, app)
+    template_rendered.connect(_template_rendered, app)
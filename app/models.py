@@ -9,23 +9,56 @@ responsible for given functionality.
 
 from __future__ import annotations
 
-from base64 import urlsafe_b64encode
-from typing import Optional
-from uuid import uuid4
-
+import csv
+import itertools
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import datetime
+from typing import Any, Iterator, Optional, Sequence, TypeVar
+
+import click
+import sqlalchemy as sa
 from flask import Flask
 from flask_login import UserMixin
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql import func
-from werkzeug.security import check_password_hash, generate_password_hash
 
-db = SQLAlchemy()
+from app.cache import MembershipFilter, TTLCache, versions
+from app.database import Database
+from app.passwords import hash_password, needs_rehash, verify_password
+
+db = Database()
+
+# (user id, version) -> (email, username), shared by all requests handled by
+# the process. The version of ("user", id) is bumped on every change of the user,
+# so a change made through another worker process is not served stale.
+user_cache: TTLCache[tuple[int, int], tuple[str, str]] = TTLCache()
+
+
+def load_taken_names() -> Iterator[str]:
+    for email, username in db.session.query(User.email, User.username).yield_per(
+        SQL_CHUNK_SIZE
+    ):
+        yield f"email:{email}"
+        yield f"username:{username}"
 
+
+# Emails and usernames of all users, most availability checks end here
+taken_names = MembershipFilter(load_taken_names)
+
+# Primary key index serves lookups by user_id, project_id has a separate index
 association_user_project = db.Table(
     "user_project",
-    db.Column("user_id", db.Integer(), db.ForeignKey("user.id")),
-    db.Column("project_id", db.String(), db.ForeignKey("project.id")),
+    db.Column("user_id", db.Integer(), db.ForeignKey("user.id"), primary_key=True),
+    db.Column(
+        "project_id",
+        db.Integer(),
+        db.ForeignKey("project.id"),
+        primary_key=True,
+        index=True,
+    ),
 )
 
 
@@ -50,10 +83,17 @@ class User(db.Model, UserMixin):  # type: ignore
         user = cls(
             email=email,
             username=username,
-            password=generate_password_hash(password, method="sha256"),
+            password=hash_password(password),
         )
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except sa.exc.IntegrityError:
+            # Email or username taken since the form was validated
+            db.session.rollback()
+            raise
+        taken_names.add(f"email:{email}")
+        taken_names.add(f"username:{username}")
 
         return user
 
@@ -62,19 +102,77 @@ class User(db.Model, UserMixin):  # type: ignore
         return cls.query.filter_by(email=email).first()
 
     @classmethod
-    def get_by_id(cls, id: str) -> Optional[User]:
+    def get_by_id(cls, id: int) -> Optional[User]:
         return cls.query.get(id)
 
     @classmethod
-    def is_email_available(cls, email: str) -> bool:
-        return cls.get_by_email(email) is None
+    def get_identity(cls, id: int) -> Optional[UserIdentity]:
+        """Get lightweight user identity, hitting the database only on cache miss."""
+        key = (id, versions.get(("user", id))[0])
+        cached = user_cache.get(key)
+
+        if cached is None:
+            user = cls.get_by_id(id)
+            if user is None:
+                return None
+            cached = (user.email, user.username)
+            user_cache.set(key, cached)
+
+        email, username = cached
+        return UserIdentity(id, email, username)
 
     @classmethod
-    def is_username_available(cls, username: str) -> bool:
-        return cls.query.filter_by(username=username).first() is None
+    def find_taken(
+        cls,
+        email: Optional[str],
+        username: Optional[str],
+        exclude_id: Optional[int] = None,
+        prefilter: bool = False,
+    ) -> tuple[bool, bool]:
+        """
+        Check if email and username are used by any user (other than exclude_id).
+
+        Values are checked in a single query. With prefilter, values surely
+        not taken according to taken_names are not queried. The filter misses
+        users added by other workers until it is rebuilt, so use it only
+        for hints, never to decide whether a user can be saved.
+        """
+        if prefilter:
+            if email is not None and not taken_names.might_contain(f"email:{email}"):
+                email = None
+            if username is not None and not taken_names.might_contain(
+                f"username:{username}"
+            ):
+                username = None
+
+        conditions = []
+        if email is not None:
+            conditions.append(cls.email == email)
+        if username is not None:
+            conditions.append(cls.username == username)
+        if not conditions:
+            return False, False
+
+        query = db.session.query(cls.email, cls.username).filter(sa.or_(*conditions))
+        if exclude_id is not None:
+            query = query.filter(cls.id != exclude_id)
+        rows = query.limit(2).all()
+
+        return (
+            email is not None and any(row.email == email for row in rows),
+            username is not None and any(row.username == username for row in rows),
+        )
 
     def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password, password)
+        if not verify_password(self.password, password):
+            return False
+
+        # Upgrade hashes created with outdated method or cost
+        if needs_rehash(self.password):
+            self.password = hash_password(password)
+            db.session.commit()
+
+        return True
 
     def update(
         self,
@@ -87,27 +185,133 @@ class User(db.Model, UserMixin):  # type: ignore
         if username is not None:
             self.username = username
         if password is not None:
-            self.password = generate_password_hash(password, method="sha256")
+            self.password = hash_password(password)
 
         if any([email, username, password]):
-            db.session.commit()
+            try:
+                db.session.commit()
+            except sa.exc.IntegrityError:
+                db.session.rollback()
+                raise
+            # Drops cached identity and pages showing the user in every worker
+            versions.bump(("user", self.id))
+            taken_names.add(f"email:{self.email}")
+            taken_names.add(f"username:{self.username}")
+
+
+class UserIdentity(UserMixin):
+    def __init__(self, id: int, email: str, username: str) -> None:
+        """
+        Create cacheable snapshot of a User, used as Flask-Login current_user.
+
+        Only id, email and username are kept. Any other attribute is read from
+        the ORM User, which is loaded from the database on first access.
+        """
+        self.id = id
+        self.email = email
+        self.username = username
+        self._user: Optional[User] = None
+
+    @property
+    def user(self) -> User:
+        """ORM User this identity refers to."""
+        if self._user is None:
+            user = User.get_by_id(self.id)
+            if user is None:
+                raise LookupError(f"User {self.id} no longer exists.")
+            self._user = user
+        return self._user
+
+    def __getattr__(self, name: str) -> Any:
+        """Get attribute missing from the snapshot from the ORM User."""
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def update(
+        self,
+        email: Optional[str] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+    ) -> None:
+        self.user.update(email=email, username=username, password=password)
+        self.email = self.user.email
+        self.username = self.user.username
 
 
-def generate_key() -> str:
-    """Generate random url safe string."""
-    return urlsafe_b64encode(uuid4().bytes).decode("utf-8").rstrip("=")
+# Crockford's base32 in lowercase, slugs sort in the order of their values
+SLUG_ALPHABET = "0123456789abcdefghjkmnpqrstvwxyz"
+SLUG_LENGTH = 26
+
+
+class SlugGenerator:
+    COUNTER_BITS = 48
+
+    def __init__(self) -> None:
+        """
+        Create generator of time-ordered slugs with ULID layout (26 characters).
+
+        48 bits of unix time in milliseconds, 32 bits of process id and 48 bits
+        of a per-process counter starting at a random value. Slugs of one process
+        differ in the counter, slugs of processes running at the same time differ
+        in the process id, so they are unique without a database lookup.
+        """
+        self._counter = secrets.randbits(self.COUNTER_BITS)
+        self._lock = threading.Lock()
+
+    def __call__(self) -> str:
+        with self._lock:
+            self._counter = (self._counter + 1) % (1 << self.COUNTER_BITS)
+            counter = self._counter
+
+        value = (time.time_ns() // 1_000_000) << 80
+        # Read on every call, pre-forked workers share the generator state
+        value |= (os.getpid() & 0xFFFFFFFF) << self.COUNTER_BITS
+        value |= counter
+
+        chars = []
+        for _ in range(SLUG_LENGTH):
+            chars.append(SLUG_ALPHABET[value & 31])
+            value >>= 5
+        return "".join(reversed(chars))
+
+
+generate_slug = SlugGenerator()
+
+
+# Keeps the number of bound parameters below SQLite limit
+SQL_CHUNK_SIZE = 500
+
+T = TypeVar("T")
+
+
+def chunked(items: Sequence[T], size: int) -> Iterator[Sequence[T]]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
 
 
 class Project(db.Model):  # type: ignore
     __tablename__ = "project"
-
-    id = db.Column(db.String(22), primary_key=True, default=generate_key)
+    # Ids of deleted projects are never reused, caches and stores refer to them
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    # Integer key is used internally, slug in public URLs
+    id = db.Column(db.Integer, primary_key=True)
+    slug = db.Column(
+        db.String(SLUG_LENGTH),
+        nullable=False,
+        unique=True,
+        index=True,
+        default=generate_slug,
+    )
     name = db.Column(db.String(255), unique=False, nullable=False)
     description = db.Column(db.String(2048), nullable=True)
     created_at = db.Column(db.DateTime(), server_default=func.now())
 
     # Relations with User
-    owner_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    owner_id = db.Column(
+        db.Integer, db.ForeignKey("user.id"), nullable=False, index=True
+    )
     owner = db.relationship("User", back_populates="owned_projects")
 
     participants = db.relationship(
@@ -115,34 +319,383 @@ class Project(db.Model):  # type: ignore
     )
 
     @classmethod
-    def add(
-        cls, name: str, description: Optional[str], owner: User
-    ) -> Optional[Project]:
-        """
-        Add new project and map it to existing user.
-
-        This method can theoretically fail, since Project class uses UUID4 as primary_key.
-        """
+    def add(cls, name: str, description: Optional[str], owner: User) -> Project:
+        """Add new project and map it to existing user."""
         project = cls(name=name, description=description, owner_id=owner.id)
         # Make sure owner is also a participant in the project
         project.participants.append(owner)
 
         db.session.add(project)
-        try:
+        db.session.commit()
+        return project
+
+    @classmethod
+    def add_many(
+        cls,
+        projects: Sequence[tuple[str, Optional[str], int]],
+        commit: bool = True,
+    ) -> list[tuple[int, str]]:
+        """
+        Add (name, description, owner_id) projects in a single transaction.
+
+        Owners are added as participants. Returns (id, slug) of the new projects,
+        in the order of the input.
+        """
+        slugs = [generate_slug() for _ in projects]
+
+        ids: dict[str, int] = {}
+        if projects:
+            db.session.execute(
+                sa.insert(cls.__table__),
+                [
+                    {
+                        "slug": slug,
+                        "name": name,
+                        "description": description,
+                        "owner_id": owner_id,
+                    }
+                    for slug, (name, description, owner_id) in zip(slugs, projects)
+                ],
+            )
+            # Ids assigned by the database are read back by the unique slugs
+            for chunk in chunked(slugs, SQL_CHUNK_SIZE):
+                found = db.session.query(cls.slug, cls.id).filter(cls.slug.in_(chunk))
+                ids.update({slug: id for slug, id in found})
+
+        keys = [(ids[slug], slug) for slug in slugs]
+        cls.add_participants(
+            [(id, owner_id) for (id, _), (_, _, owner_id) in zip(keys, projects)],
+            commit=commit,
+        )
+
+        return keys
+
+    @classmethod
+    def add_participants(
+        cls, memberships: Sequence[tuple[int, int]], commit: bool = True
+    ) -> None:
+        """Add (project_id, user_id) memberships in a single transaction, skipping existing ones."""
+        if memberships:
+            db.session.execute(
+                sa.insert(association_user_project).prefix_with("OR IGNORE"),
+                [
+                    {"project_id": project_id, "user_id": user_id}
+                    for project_id, user_id in memberships
+                ],
+            )
+
+        # Bulk inserts bypass relationship events, mark changes explicitly
+        changed = db.session.info.setdefault("changed_versions", set())
+        for project_id, user_id in memberships:
+            changed.add(("user", user_id))
+            changed.add(("project", project_id))
+        db.session.info.setdefault("bulk_participants", set()).update(
+            project_id for project_id, _ in memberships
+        )
+
+        if commit:
             db.session.commit()
-        except IntegrityError:
-            db.session.rollback()
 
-            # Second attempt to generate key
-            project.id = generate_key()
-            db.session.add(project)
-            try:
-                db.session.commit()
-            except IntegrityError:
-                db.session.rollback()
-                return None
+    @classmethod
+    def get_for_participant(cls, slug: str, user_id: int) -> Optional[Project]:
+        """Get project by its slug only if the user participates in it, in a single query."""
+        is_participant = sa.exists().where(
+            association_user_project.c.user_id == user_id,
+            association_user_project.c.project_id == cls.id,
+        )
+        return cls.query.filter(cls.slug == slug, is_participant).first()
 
-        return project
+    @classmethod
+    def get_participants_page(
+        cls, project_id: int, page: int, page_size: int
+    ) -> tuple[list[tuple[int, str]], bool]:
+        """
+        Get a page of (id, username) of project participants, ordered by username.
+
+        Returns the participants and a flag telling if there is a next page.
+        """
+        # Fetch one extra row to find out if there is a next page
+        rows = (
+            db.session.query(User.id, User.username)
+            .join(
+                association_user_project, association_user_project.c.user_id == User.id
+            )
+            .filter(association_user_project.c.project_id == project_id)
+            .order_by(User.username)
+            .offset((page - 1) * page_size)
+            .limit(page_size + 1)
+            .all()
+        )
+        participants = [(id, username) for id, username in rows]
+        return participants[:page_size], len(participants) > page_size
+
+
+# Versions of cached content are bumped only after the change is committed,
+# otherwise a concurrent request could cache old content under the new version.
+@sa.event.listens_for(Project.participants, "append")
+@sa.event.listens_for(Project.participants, "remove")
+def membership_changed(project: Project, user: User, initiator: Any) -> None:
+    db.session.info.setdefault("changed_memberships", []).append((project, user))
+
+
+@sa.event.listens_for(sa.orm.Session, "after_flush")
+def collect_changed_versions(session: sa.orm.Session, flush_context: Any) -> None:
+    # Primary keys of new objects are known only after the flush
+    changed = session.info.setdefault("changed_versions", set())
+    for project, user in session.info.pop("changed_memberships", []):
+        changed.add(("user", user.id))
+        changed.add(("project", project.id))
+
+
+@sa.event.listens_for(sa.orm.Session, "after_commit")
+def bump_changed_versions(session: sa.orm.Session) -> None:
+    for key in session.info.pop("changed_versions", ()):
+        versions.bump(key)
+
+
+@sa.event.listens_for(sa.orm.Session, "after_rollback")
+def discard_changed_versions(session: sa.orm.Session) -> None:
+    session.info.pop("changed_memberships", None)
+    session.info.pop("changed_versions", None)
+
+
+# Project visited by a user, written behind by app.recent
+class RecentProject(db.Model):  # type: ignore
+    __tablename__ = "recent_project"
+    __table_args__ = (
+        db.Index("ix_recent_project_user_id_visited_at", "user_id", "visited_at"),
+    )
+
+    user_id = db.Column(db.Integer(), db.ForeignKey("user.id"), primary_key=True)
+    project_id = db.Column(db.Integer(), db.ForeignKey("project.id"), primary_key=True)
+    visited_at = db.Column(db.DateTime(), nullable=False)
+
+    @classmethod
+    def load(cls, user_id: int, limit: int) -> list[tuple[int, datetime]]:
+        """
+        Get (project_id, visited_at) of projects recently visited by the user.
+
+        Projects the user no longer has access to are skipped.
+        """
+        rows = (
+            db.session.query(cls.project_id, cls.visited_at)
+            .join(
+                association_user_project,
+                sa.and_(
+                    association_user_project.c.user_id == cls.user_id,
+                    association_user_project.c.project_id == cls.project_id,
+                ),
+            )
+            .filter(cls.user_id == user_id)
+            .order_by(cls.visited_at.desc())
+            .limit(limit)
+        )
+        return [(project_id, visited_at) for project_id, visited_at in rows]
+
+    @classmethod
+    def save(cls, visits: Sequence[tuple[int, int, datetime]], keep: int) -> None:
+        """Upsert (user_id, project_id, visited_at) visits and drop all but keep latest per user."""
+        if not visits:
+            return
+
+        db.session.execute(
+            sa.insert(cls.__table__).prefix_with("OR REPLACE"),
+            [
+                {"user_id": user_id, "project_id": project_id, "visited_at": visited_at}
+                for user_id, project_id, visited_at in visits
+            ],
+        )
+
+        latest = (
+            db.session.query(cls.project_id)
+            .filter(cls.user_id == sa.bindparam("user_id"))
+            .order_by(cls.visited_at.desc())
+            .limit(keep)
+        )
+        db.session.execute(
+            sa.delete(cls.__table__).where(
+                cls.user_id == sa.bindparam("user_id"),
+                cls.project_id.not_in(latest.subquery().select()),
+            ),
+            [{"user_id": user_id} for user_id in {visit[0] for visit in visits}],
+        )
+        db.session.commit()
+
+
+# Longest description prefix kept in the summary, enough for truncate(128) in templates
+SUMMARY_DESCRIPTION_LENGTH = 256
+
+
+# Read model of projects a user has access to, as listed by the projects browser.
+#
+# Rows are maintained by triggers on user_project and project (see
+# USER_PROJECT_SUMMARY_DDL), in the same transaction as the change.
+# The table is clustered by (user_id, created_at), a page of the browser
+# is a range scan of the primary key, without lookups in other tables.
+class UserProjectSummary(db.Model):  # type: ignore
+    __tablename__ = "user_project_summary"
+    __table_args__ = (
+        db.Index("ix_user_project_summary_project_id", "project_id", "user_id"),
+        {"sqlite_with_rowid": False},
+    )
+
+    user_id = db.Column(db.Integer(), db.ForeignKey("user.id"), primary_key=True)
+    created_at = db.Column(db.DateTime(), primary_key=True)
+    project_id = db.Column(db.Integer(), db.ForeignKey("project.id"), primary_key=True)
+    slug = db.Column(db.String(SLUG_LENGTH), nullable=False)
+    name = db.Column(db.String(255), nullable=False)
+    description = db.Column(db.String(SUMMARY_DESCRIPTION_LENGTH), nullable=True)
+    is_owner = db.Column(db.Boolean(), nullable=False)
+
+    @classmethod
+    def rebuild(cls) -> int:
+        """Recreate all rows from user_project and project. Returns the row count."""
+        db.session.execute(sa.delete(cls.__table__))
+        result = db.session.execute(sa.text(USER_PROJECT_SUMMARY_REBUILD))
+        db.session.commit()
+        count: int = result.rowcount
+        return count
+
+
+USER_PROJECT_SUMMARY_REBUILD = f"""
+    INSERT INTO user_project_summary
+        (user_id, created_at, project_id, slug, name, description, is_owner)
+    SELECT member.user_id, p.created_at, p.id, p.slug, p.name,
+           substr(p.description, 1, {SUMMARY_DESCRIPTION_LENGTH}),
+           p.owner_id = member.user_id
+    FROM user_project AS member JOIN project AS p ON p.id = member.project_id
+"""
+
+USER_PROJECT_SUMMARY_DDL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS user_project_summary_insert
+    AFTER INSERT ON user_project BEGIN
+        INSERT OR REPLACE INTO user_project_summary
+            (user_id, created_at, project_id, slug, name, description, is_owner)
+        SELECT new.user_id, p.created_at, p.id, p.slug, p.name,
+               substr(p.description, 1, {SUMMARY_DESCRIPTION_LENGTH}),
+               p.owner_id = new.user_id
+        FROM project AS p WHERE p.id = new.project_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_project_summary_delete
+    AFTER DELETE ON user_project BEGIN
+        DELETE FROM user_project_summary
+        WHERE project_id = old.project_id AND user_id = old.user_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS user_project_summary_project_update
+    AFTER UPDATE OF slug, name, description, created_at, owner_id ON project BEGIN
+        UPDATE user_project_summary
+        SET slug = new.slug,
+            name = new.name,
+            description = substr(new.description, 1, {SUMMARY_DESCRIPTION_LENGTH}),
+            created_at = new.created_at,
+            is_owner = user_id = new.owner_id
+        WHERE project_id = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_project_summary_project_delete
+    AFTER DELETE ON project BEGIN
+        DELETE FROM user_project_summary WHERE project_id = old.id;
+    END
+    """,
+]
+
+# Triggers reference three tables, they are created once all tables exist
+for statement in USER_PROJECT_SUMMARY_DDL:
+    sa.event.listen(
+        db.metadata,
+        "after_create",
+        sa.DDL(statement).execute_if(dialect="sqlite"),
+    )
+
+
+# Full-text search index over project name and description.
+# It is an external content FTS5 table (it stores only the index, not the text),
+# kept in sync with the project table by triggers.
+PROJECT_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS project_fts USING fts5(
+        name, description, content='project', content_rowid='rowid'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS project_fts_insert AFTER INSERT ON project BEGIN
+        INSERT INTO project_fts(rowid, name, description)
+        VALUES (new.rowid, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS project_fts_delete AFTER DELETE ON project BEGIN
+        INSERT INTO project_fts(project_fts, rowid, name, description)
+        VALUES ('delete', old.rowid, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS project_fts_update AFTER UPDATE ON project BEGIN
+        INSERT INTO project_fts(project_fts, rowid, name, description)
+        VALUES ('delete', old.rowid, old.name, old.description);
+        INSERT INTO project_fts(rowid, name, description)
+        VALUES (new.rowid, new.name, new.description);
+    END
+    """,
+]
+
+for statement in PROJECT_FTS_DDL:
+    sa.event.listen(
+        Project.__table__,
+        "after_create",
+        sa.DDL(statement).execute_if(dialect="sqlite"),
+    )
+
+sa.event.listen(
+    Project.__table__,
+    "before_drop",
+    sa.DDL("DROP TABLE IF EXISTS project_fts").execute_if(dialect="sqlite"),
+)
+
+
+def hot_lookup_queries() -> dict[str, Any]:
+    """Build queries of hot paths, none of them may scan a whole table."""
+    user = User(id=1)
+    project = Project(id=1, slug="project")
+    return {
+        "User.owned_projects": Project.query.filter(
+            sa.orm.with_parent(user, User.owned_projects)
+        ),
+        "User.projects": Project.query.filter(sa.orm.with_parent(user, User.projects)),
+        "Project.participants": User.query.filter(
+            sa.orm.with_parent(project, Project.participants)
+        ),
+        "UserProjectSummary browser page": UserProjectSummary.query.filter(
+            UserProjectSummary.user_id == user.id
+        )
+        .order_by(
+            UserProjectSummary.created_at.desc(),
+            UserProjectSummary.project_id.desc(),
+        )
+        .limit(50),
+        "Project.get_for_participant": Project.query.filter(
+            Project.slug == project.slug,
+            sa.exists().where(
+                association_user_project.c.user_id == user.id,
+                association_user_project.c.project_id == Project.id,
+            ),
+        ),
+    }
+
+
+def query_plan(query: Any) -> list[str]:
+    """Details of SQLite EXPLAIN QUERY PLAN of the query."""
+    sql = query.statement.compile(
+        dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}
+    )
+    plan = db.session.execute(sa.text(f"EXPLAIN QUERY PLAN {sql}"))
+    return [row.detail for row in plan]
 
 
 def register_db_utils(app: Flask) -> None:
@@ -156,27 +709,26 @@ def register_db_utils(app: Flask) -> None:
             user_b = User.add("email@example.com", "someone", "abcd1234")
             user_c = User.add("someone@somewhere.com", "luigi", "betterthanmario")
 
-            project_a = Project.add("niceOne", "A description.", user_a)
-
-            if project_a is None:
-                raise Exception("Failed to create project_a")
-
-            Project.add("myProject", None, user_a)
-            Project.add("princess", "No need for description.", user_c)
-            Project.add("someProject", "Some description.", user_a)
-            Project.add("someOtherProject", "Description.", user_a)
-            Project.add("anotherProject", "Another description.", user_a)
-            Project.add("yetAnotherProject", None, user_a)
-            project_h = Project.add("andAnotherOne", None, user_b)
-
-            if project_h is None:
-                raise Exception("Failed to create project_h")
-
-            project_a.participants.append(user_b)
-            project_a.participants.append(user_c)
-            project_h.participants.append(user_a)
-
-            db.session.commit()
+            (project_a, _), *_, (project_h, _) = Project.add_many(
+                [
+                    ("niceOne", "A description.", user_a.id),
+                    ("myProject", None, user_a.id),
+                    ("princess", "No need for description.", user_c.id),
+                    ("someProject", "Some description.", user_a.id),
+                    ("someOtherProject", "Description.", user_a.id),
+                    ("anotherProject", "Another description.", user_a.id),
+                    ("yetAnotherProject", None, user_a.id),
+                    ("andAnotherOne", None, user_b.id),
+                ],
+                commit=False,
+            )
+            Project.add_participants(
+                [
+                    (project_a, user_b.id),
+                    (project_a, user_c.id),
+                    (project_h, user_a.id),
+                ]
+            )
 
     @app.cli.command("db-drop")
     def db_drop_data() -> None:
@@ -185,6 +737,125 @@ def register_db_utils(app: Flask) -> None:
             db.drop_all()
             db.create_all()
 
+    @app.cli.command("db-reindex")
+    def db_reindex() -> None:
+        """Rebuild project full-text search index from the project table."""
+        with app.app_context():
+            db.session.execute(
+                sa.text("INSERT INTO project_fts(project_fts) VALUES ('rebuild')")
+            )
+            db.session.commit()
+
+    @app.cli.command("db-check-plans")
+    def db_check_plans() -> None:
+        """Fail if any hot lookup query scans a whole table."""
+        with app.app_context():
+            failed = False
+            for name, query in hot_lookup_queries().items():
+                details = query_plan(query)
+                scans = [detail for detail in details if detail.startswith("SCAN")]
+                print(f"[{'FAIL' if scans else 'OK'}] {name}: {'; '.join(details)}")
+                failed = failed or bool(scans)
+
+            if failed:
+                raise SystemExit(1)
+
     @app.cli.command("db-test")
     def db_test() -> None:
         """Temporary method to test ORM during development."""
+
+
+def read_import_rows(path: str) -> Iterator[dict[str, Any]]:
+    """
+    Stream projects from CSV or JSONL file.
+
+    Each project has name, description, owner (email) and participants (emails).
+    In CSV files participants are separated with semicolons.
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(file):
+                participants = row.get("participants") or ""
+                yield {
+                    "name": row["name"],
+                    "description": row.get("description") or None,
+                    "owner": row["owner"],
+                    "participants": [p for p in participants.split(";") if p],
+                }
+        else:
+            for line in file:
+                if line.strip():
+                    row = json.loads(line)
+                    yield {
+                        "name": row["name"],
+                        "description": row.get("description") or None,
+                        "owner": row["owner"],
+                        "participants": row.get("participants") or [],
+                    }
+
+
+def register_maintenance_utils(app: Flask) -> None:
+    """Consistency repair commands, available in every environment."""
+
+    @app.cli.command("db-rebuild-summary")
+    def db_rebuild_summary() -> None:
+        """Recreate user_project_summary read model from projects and memberships."""
+        with app.app_context():
+            count = UserProjectSummary.rebuild()
+            click.echo(f"Rebuilt {count} project summaries.")
+
+
+def register_import_utils(app: Flask) -> None:
+    """Register data import commands."""
+
+    @app.cli.command("project-import")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--batch-size", default=1000, show_default=True)
+    def project_import(path: str, batch_size: int) -> None:
+        """Import projects from CSV or JSONL file, one transaction per batch."""
+        with app.app_context():
+            user_ids: dict[str, int] = {}
+            imported = 0
+            rows = read_import_rows(path)
+
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+
+                # Resolve all new emails of the batch at once
+                emails = {
+                    email
+                    for row in batch
+                    for email in [row["owner"], *row["participants"]]
+                }
+                for chunk in chunked(list(emails - user_ids.keys()), SQL_CHUNK_SIZE):
+                    found = db.session.query(User.email, User.id).filter(
+                        User.email.in_(chunk)
+                    )
+                    user_ids.update({email: id for email, id in found})
+
+                # (name, description, owner_id) and (index in projects, user_id)
+                projects: list[tuple[str, Optional[str], int]] = []
+                participants: list[tuple[int, int]] = []
+                for row in batch:
+                    owner_id = user_ids.get(row["owner"])
+                    if owner_id is None:
+                        print(f"[WARNING] Skipping {row['name']!r}: unknown owner.")
+                        continue
+
+                    index = len(projects)
+                    projects.append((row["name"], row["description"], owner_id))
+                    participants.extend(
+                        (index, user_ids[email])
+                        for email in row["participants"]
+                        if email in user_ids
+                    )
+
+                keys = Project.add_many(projects, commit=False)
+                Project.add_participants(
+                    [(keys[index][0], user_id) for index, user_id in participants]
+                )
+                imported += len(projects)
+
+            print(f"[INFO] Imported {imported} projects.")
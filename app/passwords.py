@@ -0,0 +1,63 @@
+"""
+Password hashing.
+
+Key derivation is CPU bound. Under eventlet server it would stall the hub
+(and every other connection with it), so it is executed in eventlet's native
+thread pool instead. Pool size is set with EVENTLET_THREADPOOL_SIZE.
+"""
+
+
+from __future__ import annotations
+
+from typing import Any, Callable, Optional, TypeVar
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+T = TypeVar("T")
+
+EXECUTORS = ("inline", "tpool")
+
+# Werkzeug method string, the last part is the number of iterations
+DEFAULT_METHOD = "pbkdf2:sha256:260000"
+
+_method = DEFAULT_METHOD
+_executor = "inline"
+
+
+def configure(method: Optional[str] = None, executor: Optional[str] = None) -> None:
+    """
+    Set hashing method and the way hashing is executed.
+
+    Executor "tpool" should be used only when running under eventlet hub.
+    """
+    global _method, _executor
+
+    if method is not None:
+        _method = method
+
+    if executor is not None:
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown password hashing executor: {executor}")
+        _executor = executor
+
+
+def _execute(func: Callable[..., T], *args: Any) -> T:
+    if _executor == "tpool":
+        # Imported only when running under eventlet server
+        from eventlet import tpool
+
+        return tpool.execute(func, *args)
+    return func(*args)
+
+
+def hash_password(password: str) -> str:
+    return _execute(generate_password_hash, password, _method)
+
+
+def verify_password(password_hash: str, password: str) -> bool:
+    return _execute(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """Check if the hash was created with different method or cost than configured."""
+    return password_hash.split("$", 1)[0] != _method
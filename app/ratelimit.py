@@ -0,0 +1,274 @@
+"""
+Rate limiting with token buckets.
+
+A limit "count/seconds" allows bursts of count requests, refilled evenly
+over seconds. Buckets are kept per limit and key (client IP, account email)
+in a store. The memory store is local to a worker process, so with
+pre-forked workers every worker enforces the limit on its own - the sqlite
+and redis stores share buckets between workers.
+
+Limits are checked before the view runs, so rejected requests cost
+no password hashing or database lookups.
+"""
+
+
+from __future__ import annotations
+
+import functools
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Tuple, TypeVar
+
+from flask import abort, request
+
+from app.cache import TTLCache
+from app.database import SQLiteConnections
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Stored bucket: (tokens left, unix timestamp of the last update)
+Bucket = Tuple[float, float]
+
+
+@dataclass(frozen=True)
+class Limit:
+    count: int
+    seconds: float
+
+    @classmethod
+    def parse(cls, value: str) -> Limit:
+        """Parse "count/seconds", e.g. "10/60"."""
+        count, seconds = value.split("/")
+        return cls(int(count), float(seconds))
+
+    @property
+    def rate(self) -> float:
+        """Tokens refilled per second."""
+        return self.count / self.seconds
+
+
+def refill(bucket: Optional[Bucket], limit: Limit, now: float) -> float:
+    """Get number of tokens in the bucket at time now."""
+    if bucket is None:
+        return float(limit.count)
+    tokens, updated = bucket
+    return min(float(limit.count), tokens + (now - updated) * limit.rate)
+
+
+# Base class for token bucket stores
+class BucketStore:
+    def take(self, key: str, limit: Limit) -> float:
+        """
+        Take a token from the bucket.
+
+        Returns 0 on success, otherwise seconds until a token is available.
+        """
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class MemoryBucketStore(BucketStore):
+    def __init__(self, maxsize: int = 100000, ttl: float = 3600) -> None:
+        """
+        Create in-process store.
+
+        Buckets not used for ttl seconds are full and evicted.
+        """
+        self.cache: TTLCache[str, Bucket] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, limit: Limit) -> float:
+        with self._lock:
+            now = time.monotonic()
+            tokens = refill(self.cache.get(key), limit, now)
+            if tokens >= 1:
+                self.cache.set(key, (tokens - 1, now))
+                return 0.0
+            self.cache.set(key, (tokens, now))
+            return (1 - tokens) / limit.rate
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+
+class SQLiteBucketStore(BucketStore):
+    def __init__(
+        self, path: str, ttl: float = 3600, sweep_interval: float = 60
+    ) -> None:
+        """Create store in a separate SQLite database, shared by workers on a host."""
+        self.path = path
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+        self.connections = SQLiteConnections(
+            path,
+            [
+                "CREATE TABLE IF NOT EXISTS bucket ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            ],
+        )
+
+    def take(self, key: str, limit: Limit) -> float:
+        connection = self.connections.get()
+        now = time.time()
+
+        # Write lock is taken right away, concurrent takes of a bucket are serialized
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT tokens, updated FROM bucket WHERE key = ?", (key,)
+            ).fetchone()
+            tokens = refill(row, limit, now)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / limit.rate
+            connection.execute(
+                "INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens - 1 if wait == 0 else tokens, now),
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        self._maybe_sweep()
+        return wait
+
+    def _maybe_sweep(self) -> None:
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            self.connections.get().execute(
+                "DELETE FROM bucket WHERE updated < ?", (time.time() - self.ttl,)
+            )
+
+    def clear(self) -> None:
+        self.connections.get().execute("DELETE FROM bucket")
+
+
+# Atomic take: KEYS[1] bucket, ARGV count, rate, now, ttl.
+# Returns seconds to wait as a string (Redis truncates Lua numbers to integers).
+REDIS_TAKE_SCRIPT = """
+local count = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = count
+if bucket[1] then
+    tokens = math.min(count, tonumber(bucket[1]) + (now - tonumber(bucket[2])) * rate)
+end
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return tostring(wait)
+"""
+
+
+class RedisBucketStore(BucketStore):
+    def __init__(
+        self, url: str, ttl: float = 3600, key_prefix: str = "bucket:"
+    ) -> None:
+        """
+        Create store in a Redis protocol server, shared by all workers.
+
+        Requires redis package.
+        """
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError(
+                "Redis rate limit backend requires redis package."
+            ) from exc
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+        self._take = self.client.register_script(REDIS_TAKE_SCRIPT)
+
+    def take(self, key: str, limit: Limit) -> float:
+        wait = self._take(
+            keys=[self.key_prefix + key],
+            args=[limit.count, limit.rate, time.time(), int(self.ttl)],
+        )
+        return float(wait)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=self.key_prefix + "*"):
+            self.client.delete(key)
+
+
+class RateLimiter:
+    def __init__(self) -> None:
+        """Create limiter with in-process store and no limits until configured."""
+        self.store: BucketStore = MemoryBucketStore()
+        self.limits: dict[str, Limit] = {}
+        self.enabled = True
+
+    def configure(
+        self,
+        store: Optional[BucketStore] = None,
+        limits: Optional[dict[str, Limit]] = None,
+        enabled: Optional[bool] = None,
+    ) -> None:
+        if store is not None:
+            self.store = store
+        if limits is not None:
+            self.limits = limits
+        if enabled is not None:
+            self.enabled = enabled
+
+    def check(self, name: str, key: str) -> None:
+        """Take a token from the bucket of the key, abort with 429 if it is empty."""
+        limit = self.limits.get(name)
+        if not self.enabled or limit is None:
+            return
+
+        wait = self.store.take(f"{name}:{key}", limit)
+        if wait > 0:
+            abort(429, retry_after=math.ceil(wait))
+
+
+limiter = RateLimiter()
+
+
+def client_ip() -> str:
+    return request.remote_addr or "unknown"
+
+
+def form_email() -> Optional[str]:
+    """Email address of the submitted form, normalized."""
+    email = request.form.get("email-address", "")
+    return email.strip().lower() or None
+
+
+def rate_limit(
+    *rules: tuple[str, Callable[[], Optional[str]]],
+    methods: tuple[str, ...] = ("POST",),
+) -> Callable[[F], F]:
+    """
+    Limit requests to the view with (limit name, key function) rules.
+
+    Rules are checked in order, a rejected request does not take tokens
+    of the following rules. Rules with None key are skipped.
+    """
+
+    def decorator(view: F) -> F:
+        @functools.wraps(view)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if request.method in methods:
+                for name, key_function in rules:
+                    key = key_function()
+                    if key is not None:
+                        limiter.check(name, key)
+            return view(*args, **kwargs)
+
+        return wrapper  # type: ignore
+
+    return decorator
@@ -0,0 +1,153 @@
+"""
+Projects recently visited by users.
+
+Recent project ids of a user are kept in a bounded deque in an in-process
+cache. Visits update only the cache and are written behind to the
+recent_project table in batches by the save_recent_projects job, enqueued
+after the response was sent, every flush interval from the eventlet worker
+loop and when the worker stops.
+The table is read only on cache miss, so other worker processes see
+a visit after at most the cache TTL.
+
+Only projects the user had access to are stored. When a membership is
+removed, the user's entry is dropped and reloaded (validated) from the table.
+"""
+
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Optional
+
+import sqlalchemy as sa
+from flask import Flask
+
+from app.cache import TTLCache
+from app.jobs import enqueue, job
+from app.models import Project, RecentProject, User, db
+
+
+class RecentProjectsStore:
+    def __init__(
+        self,
+        size: int = 5,
+        maxsize: int = 10000,
+        ttl: float = 300,
+        flush_interval: float = 5,
+    ) -> None:
+        """
+        Keep size recent projects of at most maxsize users for ttl seconds.
+
+        Pending visits are flushed at most once every flush_interval seconds.
+        """
+        self.size = size
+        self.flush_interval = flush_interval
+
+        self._cache: TTLCache[int, Deque[int]] = TTLCache(maxsize=maxsize, ttl=ttl)
+        # (user_id, project_id) -> visited_at, not yet written to the table
+        self._pending: dict[tuple[int, int], datetime] = {}
+        self._lock = threading.Lock()
+        self._next_flush = time.monotonic() + flush_interval
+
+    def configure(
+        self,
+        maxsize: Optional[int] = None,
+        ttl: Optional[float] = None,
+        flush_interval: Optional[float] = None,
+    ) -> None:
+        self._cache.configure(maxsize=maxsize, ttl=ttl)
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+            self._next_flush = time.monotonic() + flush_interval
+
+    def get(self, user_id: int) -> list[int]:
+        """Get ids of projects recently visited by the user, the latest first."""
+        return list(self._get_deque(user_id))
+
+    def visit(self, user_id: int, project_id: int) -> None:
+        """Move project to the front. Caller has to check the user's access."""
+        with self._lock:
+            self._pending[(user_id, project_id)] = datetime.utcnow()
+
+        recent = deque(self._get_deque(user_id), maxlen=self.size)
+        if project_id in recent:
+            recent.remove(project_id)
+        recent.appendleft(project_id)
+        self._cache.set(user_id, recent)
+
+    def forget(self, user_id: int) -> None:
+        """Drop cached entry of the user, it is reloaded from the table on next use."""
+        with self._lock:
+            for key in [key for key in self._pending if key[0] == user_id]:
+                del self._pending[key]
+        self._cache.invalidate(user_id)
+
+    def maybe_flush(self, app: Flask) -> None:
+        """Flush pending visits if flush_interval elapsed since the last flush."""
+        now = time.monotonic()
+        if not self._pending or now < self._next_flush:
+            return
+        self._next_flush = now + self.flush_interval
+        self.flush(app)
+
+    def flush(self, app: Flask) -> None:
+        """Enqueue job writing pending visits to the recent_project table."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        visits = [
+            (user_id, project_id, visited_at.isoformat())
+            for (user_id, project_id), visited_at in pending.items()
+        ]
+        with app.app_context():
+            enqueue("save_recent_projects", visits=visits, keep=self.size)
+
+    def _get_deque(self, user_id: int) -> Deque[int]:
+        recent = self._cache.get(user_id)
+        if recent is None:
+            visits = dict(RecentProject.load(user_id, self.size))
+            # Visits not written yet are newer than the stored ones
+            with self._lock:
+                for (pending_user_id, project_id), visited_at in self._pending.items():
+                    if pending_user_id == user_id:
+                        visits[project_id] = visited_at
+            ordered = sorted(visits, key=lambda key: visits[key], reverse=True)
+            recent = deque(ordered, maxlen=self.size)
+            self._cache.set(user_id, recent)
+        return recent
+
+
+recent_projects = RecentProjectsStore()
+
+
+@job(max_attempts=3)
+def save_recent_projects(visits: list[tuple[int, int, str]], keep: int) -> None:
+    """Write (user_id, project_id, visited_at in ISO format) visits."""
+    RecentProject.save(
+        [
+            (user_id, project_id, datetime.fromisoformat(visited_at))
+            for user_id, project_id, visited_at in visits
+        ],
+        keep=keep,
+    )
+
+
+@sa.event.listens_for(Project.participants, "remove")
+def membership_removed(project: Project, user: User, initiator: Any) -> None:
+    db.session.info.setdefault("removed_memberships", set()).add(user.id)
+
+
+@sa.event.listens_for(sa.orm.Session, "after_commit")
+def forget_removed_memberships(session: sa.orm.Session) -> None:
+    for user_id in session.info.pop("removed_memberships", ()):
+        recent_projects.forget(user_id)
+
+
+@sa.event.listens_for(sa.orm.Session, "after_rollback")
+def discard_removed_memberships(session: sa.orm.Session) -> None:
+    session.info.pop("removed_memberships", None)
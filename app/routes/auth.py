@@ -7,6 +7,7 @@ from flask import (
     Blueprint,
     Flask,
     g,
+    jsonify,
     redirect,
     render_template,
     request,
@@ -24,7 +25,9 @@ from flask_wtf import FlaskForm
 from wtforms.fields import BooleanField, EmailField, PasswordField, StringField
 from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError
 
-from app.models import User
+from app.database import read_replica
+from app.models import User, UserIdentity
+from app.ratelimit import client_ip, form_email, rate_limit
 
 if TYPE_CHECKING:
     from werkzeug.wrappers import Response
@@ -53,10 +56,16 @@ CONFIRM_VALIDATORS = [
 ]
 
 
+def strip_whitespace(value: Optional[str]) -> Optional[str]:
+    """Strip submitted value, the stored and checked values are the same."""
+    return value.strip() if value is not None else None
+
+
 class LoginForm(FlaskForm):
     email = EmailField(
         "Email",
         validators=EMAIL_VALIDATORS,
+        filters=[strip_whitespace],
         name="email-address",
     )
     password = PasswordField(
@@ -66,6 +75,9 @@ class LoginForm(FlaskForm):
     )
     remember_me = BooleanField("Remember me", name="remember me")
 
+    # User matching the credentials, set by successful validation
+    user: Optional[User] = None
+
     def validate(self) -> bool:
         """In addition to standard validation, check if user exists."""
         if not super().validate():
@@ -78,13 +90,34 @@ class LoginForm(FlaskForm):
             self.password.errors.append(msg)
             return False
 
+        self.user = user
         return True
 
 
+def check_taken(
+    form: RegisterForm | ProfileForm, exclude_id: Optional[int] = None
+) -> bool:
+    """
+    Add errors to email and username fields used by another user.
+
+    Always queries the database. Returns True if neither is taken.
+    """
+    email_taken, username_taken = User.find_taken(
+        form.email.data, form.username.data, exclude_id=exclude_id
+    )
+    if email_taken:
+        form.email.errors.append("Email address already taken.")
+    if username_taken:
+        form.username.errors.append("Username already taken.")
+
+    return not (email_taken or username_taken)
+
+
 class RegisterForm(FlaskForm):
     email = EmailField(
         "Email",
         validators=EMAIL_VALIDATORS,
+        filters=[strip_whitespace],
         name="email-address",
     )
     username = StringField(
@@ -108,21 +141,14 @@ class RegisterForm(FlaskForm):
         if not super().validate():
             return False
 
-        if not User.is_email_available(self.email.data):
-            self.email.errors.append("Email address already taken.")
-            return False
-
-        if not User.is_username_available(self.username.data):
-            self.username.errors.append("Username already taken.")
-            return False
-
-        return True
+        return check_taken(self)
 
 
 class ProfileForm(FlaskForm):
     email = EmailField(
         "Email",
         validators=EMAIL_VALIDATORS,
+        filters=[strip_whitespace],
         name="email-address",
     )
     username = StringField(
@@ -133,7 +159,6 @@ class ProfileForm(FlaskForm):
 
     def validate(self) -> bool:
         """In addition to standard validation, check if email and/or username are taken."""
-        print("VALIDATING!")
         if not super().validate():
             return False
 
@@ -141,32 +166,22 @@ class ProfileForm(FlaskForm):
             return False
 
         # Look for different user with the same username or email
-        user = User.query.filter(
-            User.id != current_user.id,
-            sa.or_(
-                User.username == self.username.data,
-                User.email == self.email.data,
-            ),
-        ).first()
-
-        if user is not None:
-            if user.email == current_user.email:
-                self.email.errors.append("Email address already taken.")
-            if user.username == current_user.username:
-                self.username.errors.append("Username already taken.")
-            return False
-
-        return True
+        return check_taken(self, exclude_id=current_user.id)
 
 
 def register_login_manager(login_manager: LoginManager) -> None:
     """Register Flask-Login handlers."""
 
     @login_manager.user_loader
-    def load_user(user_id: str) -> Optional[User]:
-        """Verify if user is logged in. Runs after every page load."""
-        if user_id is not None:
-            return User.query.get(user_id)
+    def load_user(user_id: str) -> Optional[UserIdentity]:
+        """
+        Verify if user is logged in. Runs after every page load.
+
+        Flask-Login keeps the result for the rest of the request,
+        across requests it is served from the user cache.
+        """
+        if user_id is not None and user_id.isdigit():
+            return User.get_identity(int(user_id))
         return None
 
     @login_manager.unauthorized_handler
@@ -184,15 +199,14 @@ bp = Blueprint(
 
 
 @bp.route("/login", methods=["GET", "POST"])
+@rate_limit(("login_ip", client_ip), ("login_account", form_email))
 def login() -> Response | str:
     if current_user.is_authenticated:
         return redirect(url_for("home.home"))
 
     form = LoginForm()
     if form.validate_on_submit():
-
-        user = User.get_by_email(form.email.data)
-        login_user(user, remember=form.remember_me.data)
+        login_user(form.user, remember=form.remember_me.data)
         return redirect(url_for("home.home"))
 
     return render_template("auth/login.html", login_form=form)
@@ -206,24 +220,51 @@ def logout() -> Response:
 
 
 @bp.route("/register", methods=["GET", "POST"])
+@rate_limit(("register_ip", client_ip))
 def register() -> Response | str:
     if current_user.is_authenticated:
         return redirect(url_for("home.home"))
 
     form = RegisterForm()
     if form.validate_on_submit():
-        User.add(
-            email=form.email.data.strip(),
-            username=form.username.data,
-            password=form.password.data,
-        )
-
-        session["login_message"] = ["Registration successful!", "Please log in."]
-        return redirect(url_for("auth.login"))
+        try:
+            User.add(
+                email=form.email.data,
+                username=form.username.data,
+                password=form.password.data,
+            )
+        except sa.exc.IntegrityError:
+            # Registered by a concurrent request after validation
+            check_taken(form)
+        else:
+            session["login_message"] = ["Registration successful!", "Please log in."]
+            return redirect(url_for("auth.login"))
 
     return render_template("auth/register.html", register_form=form)
 
 
+@bp.route("/available")
+@read_replica
+@rate_limit(("available_ip", client_ip), methods=("GET",))
+def available() -> Response:
+    """
+    Check if email and/or username can be used for registration.
+
+    Used by client-side validation, submitted forms are checked again.
+    """
+    email = request.args.get("email") or None
+    username = request.args.get("username") or None
+
+    email_taken, username_taken = User.find_taken(email, username, prefilter=True)
+
+    result = {}
+    if email is not None:
+        result["email"] = not email_taken
+    if username is not None:
+        result["username"] = not username_taken
+    return jsonify(result)
+
+
 @bp.route("/profile", methods=["GET", "POST"])
 @login_required
 def profile() -> str:
@@ -231,10 +272,13 @@ def profile() -> str:
     form = ProfileForm()
 
     if form.validate_on_submit():
-        current_user.update(
-            email=form.email.data,
-            username=form.username.data,
-        )
+        try:
+            current_user.update(
+                email=form.email.data,
+                username=form.username.data,
+            )
+        except sa.exc.IntegrityError:
+            check_taken(form, exclude_id=current_user.id)
 
     form.email.data = current_user.email
     form.username.data = current_user.username
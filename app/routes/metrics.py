@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import hmac
+
+from flask import Blueprint, Response, abort, current_app, request
+
+from app.metrics import registry
+
+bp = Blueprint(
+    name="metrics",
+    import_name=__name__,
+)
+
+
+@bp.route("/metrics")
+def metrics() -> Response:
+    token = current_app.config.get("METRICS_TOKEN")
+    if token:
+        authorization = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(authorization, f"Bearer {token}"):
+            abort(401)
+    elif not current_app.debug:
+        # Without a token metrics are only served in debug mode
+        abort(404)
+
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
@@ -1,98 +1,254 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import re
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Iterable, Iterator
+
+import sqlalchemy as sa
 from flask import (
     Blueprint,
     Response,
-    make_response,
+    abort,
+    current_app,
+    jsonify,
     redirect,
     render_template,
     request,
+    stream_template,
     url_for,
 )
 from flask_login import current_user, login_required
 from flask_wtf import FlaskForm
+from jinja2.filters import do_truncate
+from markupsafe import Markup
 from wtforms.fields import StringField
 from wtforms.validators import Length
 
-from app.models import Project
+from app.cache import render_fragment, versions
+from app.database import use_read_replica
+from app.events import Event, Subscription, broker, project_channel
+from app.models import Project, UserProjectSummary
+from app.recent import recent_projects
+
+if TYPE_CHECKING:
+    from werkzeug.wrappers import Response as BaseResponse
 
 bp = Blueprint(
     name="project",
     import_name=__name__,
 )
+use_read_replica(bp)
+
+
+PROJECTS_PAGE_SIZE = 50
+PARTICIPANTS_PAGE_SIZE = 100
 
+# Streamed pages are sent in chunks of at least STREAM_BUFFER_SIZE characters
+PROJECTS_STREAM_BATCH_SIZE = 200
+STREAM_BUFFER_SIZE = 16384
+STREAM_FLUSH = "<!-- flush -->"
 
-RECENT_PROJECTS_QUEUE_SIZE = 5
+# Clients reconnect to closed event streams after that many milliseconds
+EVENTS_RETRY_MS = 5000
 
 
-def get_recent_projects_cookie_name() -> str:
+def get_recent_projects(
+    user_id: int, recent_projects_ids: list[int]
+) -> list[UserProjectSummary]:
     """
-    Generate recent projects cookie name for current_user.
+    Get summaries of recent projects by their ids, in the order of recent_projects_ids.
 
-    Requires request context to get current_user.
+    Ids come from the recent projects store, which keeps only projects
+    the user has access to, so a keyed lookup is enough.
     """
-    return f"recent-{current_user.username}"
+    if not recent_projects_ids:
+        return []
+
+    projects = UserProjectSummary.query.filter(
+        UserProjectSummary.project_id.in_(recent_projects_ids),
+        UserProjectSummary.user_id == user_id,
+    ).all()
 
+    order = {project_id: index for index, project_id in enumerate(recent_projects_ids)}
+    return sorted(projects, key=lambda project: order[project.project_id])
 
-def get_recent_projects_ids(cookie_name: str) -> list[str]:
+
+def build_match_expression(search: str) -> str:
     """
-    Get and parse a cookie with a list of projects recently visited by current_user.
+    Translate user input into FTS5 MATCH expression.
 
-    Requires request context to get a cookie.
+    Every word is quoted (so FTS5 operators in the input are treated as text)
+    and matched as a prefix, e.g. 'my proj' -> '"my"* "proj"*'.
     """
-    cookie = request.cookies.get(cookie_name)
-    cookie_parsed = cookie.split(",")[:RECENT_PROJECTS_QUEUE_SIZE] if cookie else []
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", search))
+
+
+def projects_query(search: str) -> Any:
+    """
+    Build query of summaries of projects current_user has access to, matching the search string.
+
+    Projects are ordered from the newest, in the order of the summary primary key.
+    Requires request context to get current_user.
+    """
+    query = UserProjectSummary.query.filter(
+        UserProjectSummary.user_id == current_user.id
+    )
+
+    match = build_match_expression(search)
+    if match:
+        query = query.filter(
+            sa.text(
+                "user_project_summary.project_id IN "
+                "(SELECT rowid FROM project_fts WHERE project_fts MATCH :match)"
+            ).bindparams(match=match)
+        )
 
-    return cookie_parsed
+    return query.order_by(
+        UserProjectSummary.created_at.desc(), UserProjectSummary.project_id.desc()
+    )
 
 
-def get_recent_projects(recent_projects_ids: list[str]) -> list[Project]:
+def search_projects(search: str, page: int) -> tuple[list[UserProjectSummary], bool]:
     """
-    Get all the recent projects current_user has access to.
+    Get a page of projects current_user has access to, matching the search string.
 
+    Returns the projects and a flag telling if there is a next page.
     Requires request context to get current_user.
     """
-    return [
-        project
-        for recent_id in recent_projects_ids
-        for project in current_user.projects
-        if project.id == recent_id
-    ]
+    # Fetch one extra row to find out if there is a next page
+    projects = (
+        projects_query(search)
+        .offset((page - 1) * PROJECTS_PAGE_SIZE)
+        .limit(PROJECTS_PAGE_SIZE + 1)
+        .all()
+    )
+
+    return projects[:PROJECTS_PAGE_SIZE], len(projects) > PROJECTS_PAGE_SIZE
 
 
-def rotate_recent_projects_ids(
-    recent_projects: list[str], project_id: str
-) -> list[str]:
+def buffered_stream(chunks: Iterable[str], size: int) -> Iterator[str]:
     """
-    Add project_id to the list of projects recently visited by current_user.
+    Join small chunks of a streamed template into chunks of at least size characters.
 
-    If project_id is already in the list, move it up the list.
+    Everything buffered is sent right away when a chunk contains STREAM_FLUSH.
     """
-    if project_id not in recent_projects:
-        if len(recent_projects) >= RECENT_PROJECTS_QUEUE_SIZE:
-            del recent_projects[-1]
-    else:
-        recent_projects.remove(project_id)
+    buffer: list[str] = []
+    buffered = 0
+    for chunk in chunks:
+        flush = STREAM_FLUSH in chunk
+        if flush:
+            chunk = chunk.replace(STREAM_FLUSH, "")
 
-    recent_projects.insert(0, project_id)
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if flush or buffered >= size:
+            yield "".join(buffer)
+            buffer.clear()
+            buffered = 0
 
-    return recent_projects
+    if buffer:
+        yield "".join(buffer)
+
+
+def conditional_response(validators: tuple[Any, ...], last_modified: float) -> Response:
+    """
+    Create empty response with ETag and Last-Modified headers.
+
+    If the client has an up to date copy, the response is a 304.
+    Otherwise the body has to be set by the caller.
+    """
+    response = Response()
+    # Pages rendered by a different release differ even if the data does not
+    validators = (current_app.config["DEPLOY_ID"], *validators)
+    response.set_etag(hashlib.sha1(repr(validators).encode()).hexdigest())
+    response.last_modified = datetime.fromtimestamp(last_modified, timezone.utc)
+    # Pages are user specific and have to be revalidated on every use
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.make_conditional(request)
+    return response
 
 
 @bp.route("/projects")
 @login_required
-def browser() -> str:
-
-    # Get recent projects (make sure current_user has access to them)
-    cookie_name = get_recent_projects_cookie_name()
-    recent_ids = get_recent_projects_ids(cookie_name)
-    recent_projects = get_recent_projects(recent_ids)
-
-    return render_template(
-        "project/browser.html",
-        recent_projects=recent_projects,
-        owned_projects=current_user.owned_projects,
-        projects=current_user.projects,
+def browser() -> Response:
+    recent_ids = recent_projects.get(current_user.id)
+
+    # Page changes only when user's projects or memberships change
+    version, last_modified = versions.get(("user", current_user.id))
+    response = conditional_response(
+        (current_user.id, version, recent_ids), last_modified
+    )
+    if response.status_code == 304:
+        return response
+
+    carousel = render_fragment(
+        ("carousel", current_user.id, version, tuple(recent_ids)),
+        "project/_carousel.html",
+        lambda: {"recent_projects": get_recent_projects(current_user.id, recent_ids)},
+    )
+
+    if current_app.config.get("STREAM_PROJECTS_LIST"):
+        # Whole list is streamed from a server-side cursor, header and carousel
+        # are sent before the first project is fetched
+        projects = projects_query("").yield_per(PROJECTS_STREAM_BATCH_SIZE)
+        response.response = buffered_stream(
+            stream_template(
+                "project/browser.html",
+                carousel=carousel,
+                projects=projects,
+                next_page=None,
+                flush=Markup(STREAM_FLUSH),
+            ),
+            STREAM_BUFFER_SIZE,
+        )
+        # Sent with chunked transfer encoding
+        del response.headers["Content-Length"]
+        return response
+
+    def projects_list_context() -> dict[str, Any]:
+        # Only the first page is rendered, the rest is fetched by the browser
+        projects, has_next = search_projects("", 1)
+        return {"projects": projects, "next_page": 2 if has_next else None}
+
+    projects_list = render_fragment(
+        ("projects_list", current_user.id, version),
+        "project/_projects_list.html",
+        projects_list_context,
+    )
+
+    response.set_data(
+        render_template(
+            "project/browser.html", carousel=carousel, projects_list=projects_list
+        )
+    )
+    return response
+
+
+@bp.route("/projects/search")
+@login_required
+def search() -> Response:
+    search = request.args.get("q", "")
+    page = max(request.args.get("page", 1, type=int), 1)
+
+    projects, has_next = search_projects(search, page)
+
+    env = current_app.jinja_env
+    return jsonify(
+        projects=[
+            {
+                "url": url_for("project.project", slug=project.slug),
+                "name": do_truncate(env, project.name, 64, True),
+                "description": do_truncate(env, project.description, 128)
+                if project.description
+                else "",
+                "created_at": str(project.created_at),
+            }
+            for project in projects
+        ],
+        next_page=page + 1 if has_next else None,
     )
 
 
@@ -120,49 +276,129 @@ class CreateProjectForm(FlaskForm):
 
 @bp.route("/create-project", methods=["GET", "POST"])
 @login_required
-def create() -> Response | str:
+def create() -> BaseResponse | str:
 
     form = CreateProjectForm()
     if form.validate_on_submit():
         project = Project.add(
-            name=form.name.data, description=form.description.data, owner=current_user
+            name=form.name.data,
+            description=form.description.data,
+            owner=current_user.user,
         )
 
-        if project is None:
-            return "Failed to create project.", 500
-
-        return redirect(url_for("project.project", project_id=project.id))
+        return redirect(url_for("project.project", slug=project.slug))
 
     return render_template("project/create.html", create_project_form=form)
 
 
-@bp.route("/project/<project_id>")
+@bp.route("/project/<slug>")
 @login_required
-def project(project_id: str) -> Response | str:
-    project = Project.query.get(project_id)
-
-    # Check if it's a project that user has access to
-    if project is not None and current_user in project.participants:
-        response = make_response(
-            render_template(
-                "project/project.html",
-                project=project,
-                participants=project.participants,
-            )
-        )
+def project(slug: str) -> Response | str:
+    # Loads the project only if current_user has access to it
+    project = Project.get_for_participant(slug, current_user.id)
 
-        # Rotate recently visited projects
-        cookie_name = get_recent_projects_cookie_name()
-        recent = get_recent_projects_ids(cookie_name)
-        recent = rotate_recent_projects_ids(recent, project_id)
+    if project is not None:
+        project_id = project.id
+        page = max(request.args.get("participants_page", 1, type=int), 1)
 
-        response.set_cookie(
-            cookie_name,
-            ",".join(recent),
-            httponly=True,
-            samesite="Lax",
+        version, last_modified = versions.get(("project", project_id))
+        response = conditional_response(
+            (current_user.id, project_id, version, page), last_modified
         )
 
+        if response.status_code != 304:
+
+            def participants_context() -> dict[str, Any]:
+                participants, has_next = Project.get_participants_page(
+                    project_id, page, PARTICIPANTS_PAGE_SIZE
+                )
+                return {
+                    "slug": slug,
+                    "participants": participants,
+                    "page": page,
+                    "next_page": page + 1 if has_next else None,
+                }
+
+            participants = render_fragment(
+                ("participants", project_id, version, page),
+                "project/_participants.html",
+                participants_context,
+            )
+            response.set_data(
+                render_template(
+                    "project/project.html",
+                    project=project,
+                    participants=participants,
+                )
+            )
+
+        # Visits are written to the database after the response is sent
+        recent_projects.visit(current_user.id, project_id)
+        app = current_app._get_current_object()  # type: ignore
+        response.call_on_close(lambda: recent_projects.maybe_flush(app))
+
         return response
 
     return render_template("project/project.html")
+
+
+def format_event(event: Event) -> str:
+    """Format event as a Server-Sent Events message."""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def event_stream(
+    subscription: Subscription, user_id: int, heartbeat: float
+) -> Iterator[str]:
+    """
+    Stream events of the subscription until the user loses access to the project.
+
+    Idle streams send a comment every heartbeat seconds, writing to
+    a disconnected client ends the stream.
+    """
+    try:
+        yield f"retry: {EVENTS_RETRY_MS}\n\n"
+        while True:
+            event = subscription.get(timeout=heartbeat)
+            if event is not None:
+                yield format_event(event)
+                removed = event.get("user", {}).get("id") == user_id
+                if removed and event["type"] == "participant_removed":
+                    return
+                if event["type"] == "project_deleted":
+                    return
+            elif subscription.overflowed:
+                # Events were lost, the client has to reload the page
+                yield format_event({"type": "reload"})
+                return
+            elif subscription.closed:
+                return
+            else:
+                yield ": keep-alive\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@bp.route("/project/<slug>/events")
+@login_required
+def events(slug: str) -> Response:
+    """Stream changes of the project as Server-Sent Events."""
+    project = Project.get_for_participant(slug, current_user.id)
+    if project is None:
+        abort(404)
+
+    # The stream does not use request context, the database session
+    # is released as soon as the view returns
+    subscription = broker.subscribe(project_channel(project.id))
+    # Eventlet server buffers small chunks, every event has to be sent right away
+    request.environ["eventlet.minimum_write_chunk_size"] = 0
+    response = Response(
+        event_stream(
+            subscription, current_user.id, current_app.config["EVENTS_HEARTBEAT"]
+        ),
+        mimetype="text/event-stream",
+    )
+    response.cache_control.no_cache = True
+    # Proxies must not buffer the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,330 @@
+"""
+Eventlet WSGI server.
+
+In pre-fork mode the master process opens the listening socket and forks
+worker processes, each running its own eventlet hub and accepting
+connections from the shared socket. The master only supervises workers:
+
+- SIGTERM/SIGINT - stop workers gracefully (drain in-flight requests) and exit,
+- SIGHUP - reload: the master re-executes itself (loading new code and
+  configuration) keeping the listening socket open, starts a new set of
+  workers, then gracefully stops the old ones,
+- a worker that exits (crash or max_requests recycle) is replaced.
+
+Before re-executing, the application is loaded in a subprocess. If that
+fails, the reload is aborted and the current workers keep running.
+"""
+
+
+from __future__ import annotations
+
+import gc
+import os
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import time
+import traceback
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Optional
+
+import eventlet
+from eventlet import greenio, wsgi
+
+from app.events import broker
+from app.recent import recent_projects
+
+# Passed to the re-executed master: inherited listening socket and old workers
+LISTEN_FD_ENV = "SCRIBBLY_LISTEN_FD"
+OLD_WORKERS_ENV = "SCRIBBLY_OLD_WORKERS"
+
+# Open files a worker needs besides its connections
+FILE_LIMIT_RESERVE = 256
+
+if TYPE_CHECKING:
+    from flask import Flask
+
+
+@dataclass
+class ServerConfig:
+    address: str
+    port: int
+    workers: int = 1
+    # Maximum number of concurrent connections handled by a worker,
+    # open event streams count too (sized for 10k idle streams per worker)
+    max_size: int = 10000
+    backlog: int = 2048
+    keepalive: bool = True
+    # Recycle a worker after handling that many requests, 0 disables recycling
+    max_requests: int = 0
+    # Seconds given to a worker to finish in-flight requests on shutdown
+    graceful_timeout: int = 30
+    # Write buffer allocated for every connection (eventlet default is 16 KB),
+    # larger writes bypass it. Dominates memory of idle event streams.
+    write_buffer_size: int = 16384
+    # Smallest write of a streamed response, smaller chunks are buffered
+    minimum_chunk_size: int = 4096
+    # Seconds an idle keep-alive connection is kept open, 0 disables the timeout.
+    # Applies to every socket operation, event stream heartbeats keep streams open.
+    keepalive_timeout: int = 75
+    # Send small writes (streamed chunks, events) without waiting for ACKs
+    tcp_nodelay: bool = True
+
+
+class RequestCounter:
+    def __init__(
+        self, app: Flask, max_requests: int, on_limit: Callable[[], None]
+    ) -> None:
+        """Wrap WSGI application, on_limit is called once it handled max_requests."""
+        self.app = app
+        self.max_requests = max_requests
+        self.on_limit = on_limit
+        self.count = 0
+
+    def __call__(self, environ: dict[str, Any], start_response: Any) -> Iterable[bytes]:
+        self.count += 1
+        if self.count == self.max_requests:
+            self.on_limit()
+        return self.app(environ, start_response)
+
+
+def worker_server_kwargs(config: ServerConfig) -> dict[str, Any]:
+    class Protocol(wsgi.HttpProtocol):
+        wbufsize = config.write_buffer_size
+
+        def setup(self) -> None:
+            if config.tcp_nodelay:
+                try:
+                    self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                except OSError:
+                    # Not a TCP socket
+                    pass
+            super().setup()
+
+    return {
+        "max_size": config.max_size,
+        "keepalive": config.keepalive,
+        "socket_timeout": config.keepalive_timeout or None,
+        "minimum_chunk_size": config.minimum_chunk_size,
+        "protocol": Protocol,
+        "debug": False,
+    }
+
+
+def run_worker(
+    app: Flask, sock: socket.socket, config: ServerConfig, standalone: bool = False
+) -> None:
+    """
+    Worker process main loop. Returns after graceful shutdown.
+
+    A standalone worker (single mode, no master) stops on SIGINT too.
+    Recent project visits are written every flush interval and on shutdown.
+    """
+    running = True
+
+    # Wrapping the socket only in the worker gives each worker its own hub
+    green_sock = greenio.GreenSocket(sock)
+
+    def stop(*args: Any) -> None:
+        nonlocal running
+        running = False
+
+    signal.signal(signal.SIGTERM, stop)
+    if standalone:
+        signal.signal(signal.SIGINT, stop)
+    else:
+        # Master decides what happens on Ctrl+C and reload
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    site: Any = app
+    if config.max_requests > 0 and not standalone:
+        site = RequestCounter(app, config.max_requests, stop)
+
+    server = eventlet.spawn(
+        wsgi.server, green_sock, site, **worker_server_kwargs(config)
+    )
+
+    while running and not server.dead:
+        eventlet.sleep(1)
+        # Visits are not left pending until the next project view
+        recent_projects.maybe_flush(app)
+
+    # Stop accepting, close idle keep-alive connections and wait for the rest.
+    # Event streams never finish on their own, they are ended first.
+    broker.close()
+    server.kill(SystemExit)
+    with eventlet.Timeout(config.graceful_timeout, False):
+        server.wait()
+    # Workers exit with os._exit, atexit handlers do not run
+    recent_projects.flush(app)
+
+
+def command_line() -> list[str]:
+    """Command line the master was started with."""
+    orig_argv: Optional[list[str]] = getattr(sys, "orig_argv", None)
+    return orig_argv or [sys.executable, *sys.argv]
+
+
+def application_loads() -> bool:
+    """Check that the application, as currently on disk, can be loaded."""
+    result = subprocess.run(
+        [sys.executable, "-c", "from app import create_app; create_app()"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    if result.returncode != 0:
+        print(result.stderr.decode(errors="replace"), file=sys.stderr)
+    return result.returncode == 0
+
+
+def reexec(sock: socket.socket, workers: Iterable[int]) -> None:
+    """Replace the master with a new one, the workers stay its children."""
+    sock.set_inheritable(True)
+    env = dict(
+        os.environ,
+        **{
+            LISTEN_FD_ENV: str(sock.fileno()),
+            OLD_WORKERS_ENV: ",".join(str(pid) for pid in workers),
+        },
+    )
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execve(sys.executable, command_line(), env)
+
+
+def run_prefork(
+    app: Flask,
+    sock: socket.socket,
+    config: ServerConfig,
+    old_workers: Iterable[int] = (),
+) -> None:
+    """
+    Master process main loop.
+
+    Old workers, left by the master before reload, are stopped once
+    the new workers are started.
+    """
+    workers: set[int] = set()
+    running = True
+    reload = False
+
+    def spawn_worker() -> None:
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                run_worker(app, sock, config)
+            except BaseException:
+                traceback.print_exc()
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        workers.add(pid)
+
+    def stop_workers(pids: Iterable[int]) -> None:
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                workers.discard(pid)
+
+    def handle_stop(*args: Any) -> None:
+        nonlocal running
+        running = False
+
+    def handle_reload(*args: Any) -> None:
+        nonlocal reload
+        reload = True
+
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+    signal.signal(signal.SIGHUP, handle_reload)
+
+    # Objects loaded so far are never collected, so the garbage collector
+    # does not touch (and copy) memory pages workers share with the master
+    gc.freeze()
+
+    for _ in range(config.workers):
+        spawn_worker()
+    # Old workers are not replaced when they exit
+    stop_workers(old_workers)
+
+    while running:
+        if reload:
+            reload = False
+            if application_loads():
+                print("[INFO] Reloading...")
+                reexec(sock, workers)
+            print("[ERROR] Application failed to load, reload aborted.")
+
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+
+        if pid in workers:
+            workers.discard(pid)
+            spawn_worker()
+        elif pid == 0:
+            time.sleep(0.5)
+
+    print("[INFO] Stopping workers...")
+    stop_workers(workers)
+
+    deadline = time.monotonic() + config.graceful_timeout
+    while workers and time.monotonic() < deadline:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.1)
+        workers.discard(pid)
+
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    sys.exit(0)
+
+
+def raise_file_limit(needed: int) -> None:
+    """Raise the soft open files limit up to the hard one, workers inherit it."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft >= needed:
+        return
+    limit = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+    if limit < needed:
+        print(f"[WARN] Open files limit {limit} is lower than {needed}.")
+
+
+def run(app: Flask, config: ServerConfig) -> None:
+    """Open the listening socket and start the server in a single or pre-fork mode."""
+    address = (config.address, config.port)
+    # Every connection is a file descriptor, plus databases, logs and the socket
+    raise_file_limit(config.max_size + FILE_LIMIT_RESERVE)
+
+    if config.workers > 1:
+        listen_fd = os.environ.pop(LISTEN_FD_ENV, None)
+        old_workers = [
+            int(pid) for pid in os.environ.pop(OLD_WORKERS_ENV, "").split(",") if pid
+        ]
+        if listen_fd is not None:
+            print(f"[INFO] Reloaded eventlet with {config.workers} workers...")
+            sock = socket.socket(fileno=int(listen_fd))
+            sock.set_inheritable(False)
+        else:
+            print(f"[INFO] Starting eventlet with {config.workers} workers...")
+            # Plain socket, master must not create eventlet hub before forking
+            sock = socket.create_server(address, backlog=config.backlog)
+        run_prefork(app, sock, config, old_workers)
+    else:
+        print("[INFO] Starting eventlet...")
+        sock = socket.create_server(address, backlog=config.backlog)
+        run_worker(app, sock, config, standalone=True)
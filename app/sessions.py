@@ -0,0 +1,271 @@
+"""
+Server side session backends.
+
+Session data is kept in a store and the cookie holds only a random session id.
+Unlike Flask-Session, the store is written only when the session was modified
+or its expiration has to be extended, so read-only requests do not write.
+"""
+
+
+from __future__ import annotations
+
+import os
+import pickle
+import secrets
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from flask import Flask
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from app.cache import TTLCache
+from app.database import SQLiteConnections
+
+if TYPE_CHECKING:
+    from flask import Request, Response
+
+# Stored session: (expiration unix timestamp, session data)
+StoredSession = Tuple[float, Dict[str, Any]]
+
+
+class ServerSideSession(CallbackDict, SessionMixin):  # type: ignore
+    def __init__(
+        self,
+        sid: str,
+        initial: Optional[dict[str, Any]] = None,
+        expires: Optional[float] = None,
+    ) -> None:
+        """Create session with id sid, expires is the unix timestamp of expiration."""
+
+        def on_update(self: ServerSideSession) -> None:
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires = expires
+        self.permanent = True
+        self.modified = False
+
+
+# Base class for session stores
+class SessionStore:
+    def get(self, sid: str) -> Optional[StoredSession]:
+        raise NotImplementedError
+
+    def set(self, sid: str, session: StoredSession, ttl: float) -> None:
+        raise NotImplementedError
+
+    def delete(self, sid: str) -> None:
+        raise NotImplementedError
+
+    def sweep(self) -> None:
+        """Remove expired sessions, if the store does not expire them by itself."""
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        """
+        Create in-process LRU store.
+
+        Fastest option, but sessions are lost on restart
+        and are not shared between worker processes.
+        """
+        self.cache: TTLCache[str, StoredSession] = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, sid: str) -> Optional[StoredSession]:
+        return self.cache.get(sid)
+
+    def set(self, sid: str, session: StoredSession, ttl: float) -> None:
+        self.cache.set(sid, session)
+
+    def delete(self, sid: str) -> None:
+        self.cache.invalidate(sid)
+
+    def sweep(self) -> None:
+        self.cache.sweep()
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+
+class SQLiteSessionStore(SessionStore):
+    def __init__(self, path: str) -> None:
+        """
+        Create store in a separate SQLite database in WAL mode.
+
+        Sessions survive restarts and are shared between worker processes
+        running on the same host.
+        """
+        self.path = path
+        self.connections = SQLiteConnections(
+            path,
+            [
+                "CREATE TABLE IF NOT EXISTS session ("
+                "sid TEXT PRIMARY KEY, data BLOB NOT NULL, expires REAL NOT NULL)"
+            ],
+        )
+
+    def get(self, sid: str) -> Optional[StoredSession]:
+        row = (
+            self.connections.get()
+            .execute(
+                "SELECT data FROM session WHERE sid = ? AND expires > ?",
+                (sid, time.time()),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        session: StoredSession = pickle.loads(row[0])
+        return session
+
+    def set(self, sid: str, session: StoredSession, ttl: float) -> None:
+        self.connections.get().execute(
+            "INSERT OR REPLACE INTO session (sid, data, expires) VALUES (?, ?, ?)",
+            (sid, pickle.dumps(session), session[0]),
+        )
+
+    def delete(self, sid: str) -> None:
+        self.connections.get().execute("DELETE FROM session WHERE sid = ?", (sid,))
+
+    def sweep(self) -> None:
+        self.connections.get().execute(
+            "DELETE FROM session WHERE expires <= ?", (time.time(),)
+        )
+
+    def clear(self) -> None:
+        self.connections.get().execute("DELETE FROM session")
+
+
+class RedisSessionStore(SessionStore):
+    def __init__(self, url: str, key_prefix: str = "session:") -> None:
+        """
+        Create store in a Redis protocol server (Redis, KeyDB, Dragonfly, ...).
+
+        Expiration is handled by the server. Requires redis package.
+        """
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("Redis session backend requires redis package.") from exc
+
+        self.client = redis.Redis.from_url(url)
+        self.key_prefix = key_prefix
+
+    def get(self, sid: str) -> Optional[StoredSession]:
+        value = self.client.get(self.key_prefix + sid)
+        if value is None:
+            return None
+        session: StoredSession = pickle.loads(value)
+        return session
+
+    def set(self, sid: str, session: StoredSession, ttl: float) -> None:
+        self.client.set(self.key_prefix + sid, pickle.dumps(session), ex=int(ttl))
+
+    def delete(self, sid: str) -> None:
+        self.client.delete(self.key_prefix + sid)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=self.key_prefix + "*"):
+            self.client.delete(key)
+
+
+class StoreSessionInterface(SessionInterface):
+    def __init__(
+        self,
+        store: SessionStore,
+        refresh_after: float = 60,
+        sweep_interval: float = 60,
+    ) -> None:
+        """
+        Create session interface working with any SessionStore.
+
+        Unmodified sessions are written back (extending their expiration)
+        only if the last write is older than refresh_after seconds.
+        Expired sessions are swept at most once every sweep_interval seconds.
+        """
+        self.store = store
+        self.refresh_after = refresh_after
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def open_session(self, app: Flask, request: Request) -> ServerSideSession:
+        sid = request.cookies.get(self.get_cookie_name(app))
+
+        if sid:
+            stored = self.store.get(sid)
+            if stored is not None:
+                expires, data = stored
+                return ServerSideSession(sid, data, expires)
+
+        return ServerSideSession(secrets.token_urlsafe(32))
+
+    def save_session(
+        self, app: Flask, session: SessionMixin, response: Response
+    ) -> None:
+        assert isinstance(session, ServerSideSession)
+
+        self._maybe_sweep()
+
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        now = time.time()
+
+        # Skip the write if nothing changed and the session was stored recently
+        if (
+            not session.modified
+            and session.expires is not None
+            and session.expires - now > lifetime - self.refresh_after
+        ):
+            return
+
+        self.store.set(session.sid, (now + lifetime, dict(session)), lifetime)
+
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def _maybe_sweep(self) -> None:
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            self.store.sweep()
+
+
+def create_session_interface(app: Flask, backend: str) -> StoreSessionInterface:
+    """Create session interface for memory, sqlite or redis backend."""
+    lifetime = app.permanent_session_lifetime.total_seconds()
+    sweep_interval = app.config.get("SESSION_SWEEP_INTERVAL", 60)
+
+    store: SessionStore
+    if backend == "memory":
+        maxsize = app.config.get("SESSION_MEMORY_SIZE", 10000)
+        store = MemorySessionStore(maxsize=maxsize, ttl=lifetime)
+    elif backend == "sqlite":
+        store = SQLiteSessionStore(os.path.join(app.instance_path, "sessions.sqlite3"))
+    elif backend == "redis":
+        store = RedisSessionStore(app.config["SESSION_REDIS_URL"])
+    else:
+        raise ValueError(f"Unknown session backend: {backend}")
+
+    return StoreSessionInterface(store, sweep_interval=sweep_interval)
@@ -42,11 +42,15 @@ function getErrors(field) {
       `${name} cannot be longer than ${field.maxLength} characters long.`
     );
 
+  // Message set by availability check
+  if (field.validity.customError) msgs.push(field.validationMessage);
+
   // Unknown validation failed
   if (
     !field.validity.valueMissing &&
     !field.validity.tooShort &&
-    !field.validity.tooLong
+    !field.validity.tooLong &&
+    !field.validity.customError
   )
     msgs.push(`Invalid input.`);
 
@@ -77,6 +81,58 @@ function submitHandler(fields, event) {
   if (!ok) event.preventDefault();
 }
 
+/**
+ * Messages shown when a value is already taken, by availability check name
+ */
+const TAKEN_MESSAGES = {
+  email: "Email address already taken.",
+  username: "Username already taken.",
+};
+
+/**
+ * Check on the server if field value is not taken yet, after the user stops typing
+ * @param {String} url Availability check endpoint
+ * @param {HTMLInputElement} field Input with data-availability attribute
+ */
+function watchAvailability(url, field) {
+  const name = field.dataset.availability;
+  let timeout = null;
+  let pendingRequest = null;
+
+  field.addEventListener("input", () => {
+    clearTimeout(timeout);
+    if (pendingRequest) pendingRequest.abort();
+    field.setCustomValidity("");
+
+    timeout = setTimeout(async () => {
+      // Do not bother the server with values failing other checks
+      if (!field.value || !field.checkValidity()) return;
+
+      pendingRequest = new AbortController();
+      const params = new URLSearchParams({ [name]: field.value });
+
+      try {
+        const response = await fetch(`${url}?${params}`, {
+          signal: pendingRequest.signal,
+        });
+        const data = await response.json();
+
+        const errorsList = field.parentNode.querySelector(".form-errors");
+        if (errorsList) errorsList.replaceChildren();
+
+        if (data[name] === false) {
+          field.setCustomValidity(TAKEN_MESSAGES[name]);
+          if (errorsList) appendError(errorsList, TAKEN_MESSAGES[name]);
+        }
+      } catch (error) {
+        if (error.name !== "AbortError") throw error;
+      } finally {
+        pendingRequest = null;
+      }
+    }, 300);
+  });
+}
+
 /**
  * Attach input event handlers
  */
@@ -88,4 +144,10 @@ forms.forEach((form) => {
     "input:not([id=csrf_token]):not([type=submit]):not([type=hidden])"
   );
   form.addEventListener("submit", (event) => submitHandler(formFields, event));
+
+  const availabilityUrl = form.dataset.availabilityUrl;
+  if (availabilityUrl)
+    form
+      .querySelectorAll("input[data-availability]")
+      .forEach((field) => watchAvailability(availabilityUrl, field));
 });
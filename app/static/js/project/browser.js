@@ -10,25 +10,87 @@ carousel.addEventListener("wheel", (event) => {
 });
 
 /**
- * Filtering projects list on search bar input change.
+ * Server-side search and incremental loading of projects list.
  */
 
 const searchBar = document.querySelector("#projects-list-search-bar");
-const projects = document.querySelectorAll(".projects-list-element");
+const projectsList = document.querySelector(".projects-list");
+const sentinel = document.querySelector("#projects-list-sentinel");
 
-searchBar.addEventListener("input", (event) => {
-  const filterValue = searchBar.value.toLowerCase();
+const searchUrl = projectsList.dataset.searchUrl;
+let nextPage = projectsList.dataset.nextPage || null;
+let searchValue = "";
+let pendingRequest = null;
+let searchTimeout = null;
 
-  projects.forEach((project) => {
-    const projectName = project.children[0].innerText.toLowerCase();
-    if (projectName.includes(filterValue)) {
-      project.classList.remove("hidden");
-    } else {
-      project.classList.add("hidden");
+/**
+ * Create projects list element
+ * @param {Object} project
+ * @returns HTMLAnchorElement
+ */
+function createProjectElement(project) {
+  const element = document.createElement("a");
+  element.classList.add("projects-list-element");
+  element.href = project.url;
+
+  [project.name, project.description, "", project.created_at].forEach(
+    (text) => {
+      const span = document.createElement("span");
+      span.innerText = text;
+      element.appendChild(span);
     }
-  });
+  );
+
+  return element;
+}
+
+/**
+ * Fetch a page of projects matching current search value
+ * @param {Number} page
+ * @param {Boolean} replace Replace list content instead of appending
+ */
+async function loadProjects(page, replace) {
+  if (pendingRequest) pendingRequest.abort();
+  pendingRequest = new AbortController();
+
+  const params = new URLSearchParams({ q: searchValue, page: page });
+
+  try {
+    const response = await fetch(`${searchUrl}?${params}`, {
+      signal: pendingRequest.signal,
+    });
+    const data = await response.json();
+
+    if (replace) projectsList.replaceChildren();
+    data.projects.forEach((project) =>
+      projectsList.appendChild(createProjectElement(project))
+    );
+    if (replace && data.projects.length === 0)
+      projectsList.innerText = "No projects.";
+
+    nextPage = data.next_page;
+  } catch (error) {
+    if (error.name !== "AbortError") throw error;
+  } finally {
+    pendingRequest = null;
+  }
+}
+
+searchBar.addEventListener("input", () => {
+  clearTimeout(searchTimeout);
+  searchTimeout = setTimeout(() => {
+    searchValue = searchBar.value.trim();
+    loadProjects(1, true);
+  }, 200);
+});
+
+const observer = new IntersectionObserver((entries) => {
+  if (entries[0].isIntersecting && nextPage && !pendingRequest)
+    loadProjects(nextPage, false);
 });
 
+observer.observe(sentinel);
+
 /**
  * Wrapping multiline text in carousel cards description.
  * Requires the text to be wrapped with <p> tag.
@@ -0,0 +1,77 @@
+/**
+ * Live project updates.
+ *
+ * Changes of the project are received as small JSON deltas
+ * from the server's event stream and applied to the page in place.
+ */
+
+const content = document.querySelector("#project-content");
+const projectName = document.querySelector("#project-name");
+const projectDescription = document.querySelector("#project-description");
+
+const userId = Number(content.dataset.userId);
+
+/**
+ * Find participant element by user id
+ * @param {Number} id
+ * @returns HTMLLIElement
+ */
+function findParticipant(id) {
+  return document.querySelector(`#project-participants li[data-user-id="${id}"]`);
+}
+
+/**
+ * Insert participant to the list, ordered by username, if it belongs
+ * to the displayed page
+ * @param {Object} user
+ */
+function addParticipant(user) {
+  const list = document.querySelector("#project-participants");
+  if (!list || findParticipant(user.id)) {
+    return;
+  }
+
+  const elements = Array.from(list.children);
+  const next = elements.find((element) => element.innerText > user.username);
+  const beforeFirst = next && next === elements[0];
+
+  if (
+    (!next && list.dataset.lastPage !== "true") ||
+    (beforeFirst && list.dataset.firstPage !== "true")
+  ) {
+    return;
+  }
+
+  const element = document.createElement("li");
+  element.dataset.userId = user.id;
+  element.innerText = user.username;
+  list.insertBefore(element, next || null);
+}
+
+const handlers = {
+  project_updated: (event) => {
+    if ("name" in event) {
+      projectName.innerText = event.name;
+    }
+    if ("description" in event) {
+      projectDescription.innerText = event.description || "";
+    }
+  },
+  participant_added: (event) => addParticipant(event.user),
+  participant_removed: (event) => {
+    if (event.user.id === userId) {
+      window.location.assign(content.dataset.browserUrl);
+      return;
+    }
+    findParticipant(event.user.id)?.remove();
+  },
+  project_deleted: () => window.location.assign(content.dataset.browserUrl),
+  participants_changed: () => window.location.reload(),
+  reload: () => window.location.reload(),
+};
+
+const events = new EventSource(content.dataset.eventsUrl);
+
+Object.entries(handlers).forEach(([type, handler]) => {
+  events.addEventListener(type, (message) => handler(JSON.parse(message.data)));
+});
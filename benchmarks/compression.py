@@ -0,0 +1,219 @@
+"""
+Response compression benchmark.
+
+Starts a run-eventlet server with compression off and on, requests the main
+pages over one keep-alive connection and reports, per page, the bytes on
+the wire (headers and body as sent), server latency percentiles and the
+estimated time to transfer the response over a slow link:
+
+    python -m benchmarks.compression --requests 200 --bandwidth-mbps 10
+
+Latency of the first page is also measured with a new connection per
+request, the price of a connection not kept alive.
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+from urllib.parse import urlencode
+
+from benchmarks.dataset import Scale, seed
+from benchmarks.run import LiveClient, percentile, wait_for_port
+
+
+class WireClient:
+    def __init__(self, address: str, port: int, headers: dict[str, str]) -> None:
+        """Create raw HTTP/1.1 client counting bytes received, without decoding."""
+        self.address = address
+        self.port = port
+        self.headers = headers
+        self.sock: Optional[socket.socket] = None
+        self.buffer = b""
+
+    def connect(self) -> socket.socket:
+        if self.sock is None:
+            self.sock = socket.create_connection((self.address, self.port), timeout=30)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.buffer = b""
+        return self.sock
+
+    def close(self) -> None:
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def read(self, size: int) -> bytes:
+        while len(self.buffer) < size:
+            data = self.connect().recv(65536)
+            if not data:
+                raise ConnectionError("Connection closed by server.")
+            self.buffer += data
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def read_until(self, separator: bytes) -> bytes:
+        while separator not in self.buffer:
+            data = self.connect().recv(65536)
+            if not data:
+                raise ConnectionError("Connection closed by server.")
+            self.buffer += data
+        data, self.buffer = self.buffer.split(separator, 1)
+        return data + separator
+
+    def get(self, path: str) -> tuple[int, int, dict[str, str]]:
+        """Get status, bytes received and response headers."""
+        headers = "".join(f"{k}: {v}\r\n" for k, v in self.headers.items())
+        request = f"GET {path} HTTP/1.1\r\nHost: {self.address}\r\n{headers}\r\n"
+        self.connect().sendall(request.encode())
+
+        head = self.read_until(b"\r\n\r\n")
+        received = len(head)
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split()[1])
+        response_headers = {
+            name.strip().lower(): value.strip()
+            for name, _, value in (line.partition(":") for line in lines[1:] if line)
+        }
+
+        if "content-length" in response_headers:
+            received += len(self.read(int(response_headers["content-length"])))
+        elif response_headers.get("transfer-encoding") == "chunked":
+            while True:
+                size_line = self.read_until(b"\r\n")
+                size = int(size_line.split(b";")[0], 16)
+                received += len(size_line) + len(self.read(size + 2))
+                if size == 0:
+                    break
+
+        if response_headers.get("connection") == "close":
+            self.close()
+        return status, received, response_headers
+
+
+def measure(
+    client: WireClient, path: str, requests: int, keepalive: bool
+) -> tuple[int, list[float], str]:
+    """Get bytes of the last response, latencies and its Content-Encoding."""
+    latencies = []
+    received = 0
+    headers: dict[str, str] = {}
+    for _ in range(requests):
+        if not keepalive:
+            client.close()
+        start = time.perf_counter()
+        status, received, headers = client.get(path)
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            raise RuntimeError(f"GET {path} returned {status}.")
+    return received, latencies, headers.get("content-encoding", "-")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Response compression benchmark.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--projects-per-user", type=int, default=Scale.projects_per_user
+    )
+    parser.add_argument(
+        "--accept-encoding",
+        default="br, gzip",
+        help="Accept-Encoding sent by the client.",
+    )
+    parser.add_argument(
+        "--bandwidth-mbps",
+        type=float,
+        default=10,
+        help="Link bandwidth used to estimate transfer time.",
+    )
+    args = parser.parse_args()
+
+    os.environ["INSTANCE_PATH"] = tempfile.mkdtemp(prefix="scribbly-compression-")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("RATE_LIMITS", "false")
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        dataset = seed(Scale(users=10, projects_per_user=args.projects_per_user))
+
+    email = dataset.emails[0]
+    pages = {
+        "browser": "/projects",
+        "search": "/projects/search?" + urlencode({"q": "project", "page": 1}),
+        "project": f"/project/{dataset.projects[email][0]}",
+        "profile": "/auth/profile",
+    }
+
+    address, port = "127.0.0.1", 18092
+    # Mode -> page -> (bytes, latencies, encoding)
+    results: dict[str, dict[str, tuple[int, list[float], str]]] = {}
+    for mode in ("off", "on"):
+        env = dict(
+            os.environ,
+            FLASK_APP="app",
+            FLASK_DEBUG="0",
+            ADDRESS=address,
+            PORT=str(port),
+            COMPRESSION="true" if mode == "on" else "false",
+        )
+        server = subprocess.Popen(
+            [sys.executable, "-m", "flask", "run-eventlet", "--workers", "1"],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_port(address, port)
+            login = LiveClient(address, port)
+            login.login(email)
+            cookie = "; ".join(f"{k}={v.value}" for k, v in login.cookies.items())
+
+            client = WireClient(
+                address,
+                port,
+                {"Cookie": cookie, "Accept-Encoding": args.accept_encoding},
+            )
+            results[mode] = {}
+            for name, path in pages.items():
+                # Warm up caches, only the measured requests count
+                measure(client, path, 5, keepalive=True)
+                results[mode][name] = measure(
+                    client, path, args.requests, keepalive=True
+                )
+            results[mode]["browser, new connections"] = measure(
+                client, pages["browser"], args.requests, keepalive=False
+            )
+            client.close()
+        finally:
+            server.terminate()
+            server.wait()
+
+    bytes_per_second = args.bandwidth_mbps * 1e6 / 8
+    print(
+        f"{'page':<26}{'mode':<6}{'encoding':>9}{'bytes':>9}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'transfer ms':>13}"
+    )
+    for name in results["off"]:
+        for mode in ("off", "on"):
+            received, latencies, encoding = results[mode][name]
+            print(
+                f"{name:<26}{mode:<6}{encoding:>9}{received:>9}"
+                f"{statistics.median(latencies) * 1000:>9.2f}"
+                f"{percentile(latencies, 0.95) * 1000:>9.2f}"
+                f"{received / bytes_per_second * 1000:>13.2f}"
+            )
+    print(f"(transfer at {args.bandwidth_mbps:g} Mbit/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Synthetic dataset seeded through the application models."""
+
+
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass, field
+
+import sqlalchemy as sa
+
+from app.models import Project, User, db
+from app.passwords import hash_password
+
+PASSWORD = "benchmark-password"
+
+
+@dataclass
+class Scale:
+    users: int = 10
+    projects_per_user: int = 100
+    participants_per_project: int = 3
+
+
+@dataclass
+class Dataset:
+    # Email of every seeded user, all share PASSWORD
+    emails: list[str] = field(default_factory=list)
+    # Slugs of projects each user participates in, by email
+    projects: dict[str, list[str]] = field(default_factory=dict)
+
+
+def seed(scale: Scale, random_seed: int = 0) -> Dataset:
+    """Recreate the database and fill it. Requires application context."""
+    rng = random.Random(random_seed)
+
+    db.drop_all()
+    db.create_all()
+
+    # Hashing is slow on purpose, all users share one hash
+    password = hash_password(PASSWORD)
+    emails = [f"user{i}@example.com" for i in range(scale.users)]
+    db.session.execute(
+        sa.insert(User.__table__),
+        [
+            {"email": email, "username": f"user{i}", "password": password}
+            for i, email in enumerate(emails)
+        ],
+    )
+    user_ids = dict(db.session.query(User.email, User.id))
+    dataset = Dataset(emails=emails, projects={email: [] for email in emails})
+
+    for email in emails:
+        keys = Project.add_many(
+            [
+                (
+                    f"project {i} of {email}",
+                    f"Description of project {i}.",
+                    user_ids[email],
+                )
+                for i in range(scale.projects_per_user)
+            ],
+            commit=False,
+        )
+        dataset.projects[email].extend(slug for _, slug in keys)
+
+        others = [other for other in emails if other != email]
+        memberships = []
+        for project_id, slug in keys:
+            count = min(scale.participants_per_project, len(others))
+            for participant in rng.sample(others, count):
+                memberships.append((project_id, user_ids[participant]))
+                dataset.projects[participant].append(slug)
+        Project.add_participants(memberships)
+
+    return dataset
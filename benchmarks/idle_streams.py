@@ -0,0 +1,234 @@
+"""
+Idle event streams check.
+
+Starts a run-eventlet server with a single worker, opens many project
+event streams (idle Server-Sent Events connections) and reports:
+
+- memory of the worker per open stream,
+- whether every idle stream got its heartbeat on time,
+- latency of regular page requests while the streams are open.
+
+Exits with non-zero status if a stream could not be opened or missed
+its heartbeat:
+
+    python -m benchmarks.idle_streams --connections 10000
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import os
+import resource
+import selectors
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from benchmarks.dataset import Scale, seed
+from benchmarks.run import LiveClient, percentile, wait_for_port
+
+CONNECT_BATCH_SIZE = 500
+
+
+def read_rss_kb(pid: int) -> int:
+    """Get current resident memory of a process (Linux only)."""
+    with open(f"/proc/{pid}/status") as file:
+        for line in file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def raise_file_limit(needed: int) -> None:
+    """Raise the open files limit, the server process inherits it."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        limit = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+        if limit < needed:
+            print(f"[WARN] Open files limit {limit} is lower than {needed}.")
+
+
+class StreamClients:
+    def __init__(self, address: str, port: int, request: bytes) -> None:
+        """Keep idle event stream connections, read with a single selector."""
+        self.address = address
+        self.port = port
+        self.request = request
+        self.selector = selectors.DefaultSelector()
+        # Socket -> received data not yet consumed
+        self.buffers: dict[socket.socket, bytes] = {}
+        self.opened: set[socket.socket] = set()
+        self.heartbeats: set[socket.socket] = set()
+        self.failed = 0
+
+    def open(self, count: int) -> None:
+        for start in range(0, count, CONNECT_BATCH_SIZE):
+            for _ in range(min(CONNECT_BATCH_SIZE, count - start)):
+                try:
+                    sock = socket.create_connection((self.address, self.port))
+                except OSError:
+                    self.failed += 1
+                    continue
+                sock.sendall(self.request)
+                sock.setblocking(False)
+                self.buffers[sock] = b""
+                self.selector.register(sock, selectors.EVENT_READ)
+            # Let the server accept the batch before sending the next one
+            self.poll(0.05)
+
+    def poll(self, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            for key, _ in self.selector.select(timeout=max(remaining, 0)):
+                self.receive(key.fileobj)  # type: ignore
+            if remaining <= 0:
+                return
+
+    def receive(self, sock: socket.socket) -> None:
+        try:
+            data = sock.recv(4096)
+        except OSError:
+            data = b""
+        if not data:
+            self.selector.unregister(sock)
+            sock.close()
+            self.opened.discard(sock)
+            del self.buffers[sock]
+            self.failed += 1
+            return
+
+        self.buffers[sock] += data
+        if sock not in self.opened and b"retry:" in self.buffers[sock]:
+            if not self.buffers[sock].startswith(b"HTTP/1.1 200"):
+                self.failed += 1
+            self.opened.add(sock)
+            self.buffers[sock] = self.buffers[sock].split(b"retry:", 1)[1]
+        if b"keep-alive" in self.buffers[sock]:
+            self.heartbeats.add(sock)
+            self.buffers[sock] = b""
+
+    def close(self) -> None:
+        for sock in list(self.buffers):
+            sock.close()
+        self.selector.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Idle event streams check.")
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument(
+        "--heartbeat", type=int, default=15, help="Stream heartbeat in seconds."
+    )
+    parser.add_argument(
+        "--requests", type=int, default=100, help="Page requests measured."
+    )
+    args = parser.parse_args()
+
+    os.environ["INSTANCE_PATH"] = tempfile.mkdtemp(prefix="scribbly-streams-")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("RATE_LIMITS", "false")
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        dataset = seed(Scale(users=2, projects_per_user=10))
+
+    # Limit is per process, both the client and the server need a descriptor
+    # per stream, plus some spare ones
+    raise_file_limit(args.connections + 256)
+
+    address, port = "127.0.0.1", 18091
+    env = dict(
+        os.environ,
+        FLASK_APP="app",
+        FLASK_DEBUG="0",
+        ADDRESS=address,
+        PORT=str(port),
+        WSGI_MAX_SIZE=str(args.connections + 100),
+        EVENTS_HEARTBEAT=str(args.heartbeat),
+    )
+    server: Optional[subprocess.Popen[bytes]] = subprocess.Popen(
+        [sys.executable, "-m", "flask", "run-eventlet", "--workers", "1"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    clients: Optional[StreamClients] = None
+
+    try:
+        wait_for_port(address, port)
+        assert server is not None
+
+        email = dataset.emails[0]
+        page_client = LiveClient(address, port)
+        page_client.login(email)
+        slug = dataset.projects[email][0]
+        cookie = "; ".join(f"{k}={v.value}" for k, v in page_client.cookies.items())
+        request = (
+            f"GET /project/{slug}/events HTTP/1.1\r\n"
+            f"Host: {address}\r\nCookie: {cookie}\r\n\r\n"
+        ).encode()
+
+        # Warm up code paths before measuring the baseline
+        page_client.get(f"/project/{slug}")
+        rss_before = read_rss_kb(server.pid)
+
+        clients = StreamClients(address, port, request)
+        started = time.perf_counter()
+        clients.open(args.connections)
+        clients.poll(5)
+        open_seconds = time.perf_counter() - started
+        rss_after = read_rss_kb(server.pid)
+
+        # Heartbeats due while the streams were being opened are late,
+        # after one interval every stream has to get a heartbeat on time
+        clients.poll(args.heartbeat)
+        clients.heartbeats.clear()
+        clients.poll(args.heartbeat + 2)
+
+        latencies = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            page_client.get(f"/project/{slug}")
+            latencies.append(time.perf_counter() - start)
+            clients.poll(0)
+    finally:
+        if clients is not None:
+            clients.close()
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    opened = len(clients.opened)
+    per_stream = (rss_after - rss_before) / opened if opened else 0
+    print(f"streams opened:        {opened} / {args.connections}")
+    print(f"open time:             {open_seconds:8.2f} s")
+    print(f"worker memory:         {rss_before} KB -> {rss_after} KB")
+    print(f"memory per stream:     {per_stream:8.2f} KB")
+    print(f"heartbeats received:   {len(clients.heartbeats)} / {opened}")
+    print(
+        "page latency p50/p95:  "
+        f"{statistics.median(latencies) * 1000:.2f} / "
+        f"{percentile(latencies, 0.95) * 1000:.2f} ms"
+    )
+
+    ok = (
+        clients.failed == 0
+        and opened == args.connections
+        and len(clients.heartbeats) == opened
+    )
+    print(f"[{'OK' if ok else 'FAIL'}] {clients.failed} failed streams")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
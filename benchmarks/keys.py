@@ -0,0 +1,190 @@
+"""
+Project key benchmark.
+
+Fills two databases, one with the previous project keys (random 22 char
+strings as primary key, repeated in user_project) and one with the current
+ones (integer primary key, time-ordered slug in a separate unique index),
+and reports the insert rate and the size of every table and index (from
+SQLite dbstat):
+
+    python -m benchmarks.keys --projects 200000 --participants 3
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from base64 import urlsafe_b64encode
+from typing import Callable, List, Tuple
+from uuid import uuid4
+
+from app.models import generate_slug
+
+SCHEMAS = {
+    "string": [
+        "CREATE TABLE project (id VARCHAR(22) NOT NULL PRIMARY KEY, "
+        "name VARCHAR(255) NOT NULL, owner_id INTEGER NOT NULL)",
+        "CREATE INDEX ix_project_owner_id ON project (owner_id)",
+        "CREATE TABLE user_project (user_id INTEGER NOT NULL, "
+        "project_id VARCHAR NOT NULL, PRIMARY KEY (user_id, project_id))",
+        "CREATE INDEX ix_user_project_project_id ON user_project (project_id)",
+    ],
+    "integer": [
+        "CREATE TABLE project (id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, "
+        "slug VARCHAR(26) NOT NULL, name VARCHAR(255) NOT NULL, "
+        "owner_id INTEGER NOT NULL)",
+        "CREATE UNIQUE INDEX ix_project_slug ON project (slug)",
+        "CREATE INDEX ix_project_owner_id ON project (owner_id)",
+        "CREATE TABLE user_project (user_id INTEGER NOT NULL, "
+        "project_id INTEGER NOT NULL, PRIMARY KEY (user_id, project_id))",
+        "CREATE INDEX ix_user_project_project_id ON user_project (project_id)",
+    ],
+}
+
+# Batch is a list of (name, owner_id, participant ids)
+Batch = List[Tuple[str, int, List[int]]]
+
+
+def generate_key() -> str:
+    """Previous project key, random url safe string."""
+    return urlsafe_b64encode(uuid4().bytes).decode("utf-8").rstrip("=")
+
+
+def insert_string_keys(connection: sqlite3.Connection, batch: Batch) -> None:
+    keys = [generate_key() for _ in batch]
+    connection.executemany(
+        "INSERT INTO project (id, name, owner_id) VALUES (?, ?, ?)",
+        [(key, name, owner_id) for key, (name, owner_id, _) in zip(keys, batch)],
+    )
+    connection.executemany(
+        "INSERT INTO user_project (user_id, project_id) VALUES (?, ?)",
+        [(user, key) for key, (_, _, users) in zip(keys, batch) for user in users],
+    )
+
+
+def insert_integer_keys(connection: sqlite3.Connection, batch: Batch) -> None:
+    # Same as Project.add_many, ids are read back by the slugs
+    slugs = [generate_slug() for _ in batch]
+    connection.executemany(
+        "INSERT INTO project (slug, name, owner_id) VALUES (?, ?, ?)",
+        [(slug, name, owner_id) for slug, (name, owner_id, _) in zip(slugs, batch)],
+    )
+    placeholders = ", ".join("?" * len(slugs))
+    ids = dict(
+        connection.execute(
+            f"SELECT slug, id FROM project WHERE slug IN ({placeholders})", slugs
+        )
+    )
+    connection.executemany(
+        "INSERT INTO user_project (user_id, project_id) VALUES (?, ?)",
+        [
+            (user, ids[slug])
+            for slug, (_, _, users) in zip(slugs, batch)
+            for user in users
+        ],
+    )
+
+
+INSERTS: dict[str, Callable[[sqlite3.Connection, Batch], None]] = {
+    "string": insert_string_keys,
+    "integer": insert_integer_keys,
+}
+
+
+def run(
+    schema: str, path: str, batches: list[Batch], measured: int
+) -> tuple[float, dict[str, int]]:
+    """
+    Insert the batches, the last measured ones are timed.
+
+    Returns projects inserted per second and size in bytes by table or index.
+    """
+    connection = sqlite3.connect(path, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    for statement in SCHEMAS[schema]:
+        connection.execute(statement)
+
+    insert = INSERTS[schema]
+    started = 0.0
+    for index, batch in enumerate(batches):
+        if index == len(batches) - measured:
+            started = time.perf_counter()
+        connection.execute("BEGIN")
+        insert(connection, batch)
+        connection.execute("COMMIT")
+    elapsed = time.perf_counter() - started
+
+    sizes = dict(
+        connection.execute(
+            "SELECT name, SUM(pgsize) FROM dbstat GROUP BY name ORDER BY name"
+        )
+    )
+    connection.close()
+    rate = sum(len(batch) for batch in batches[-measured:]) / elapsed
+    return rate, sizes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Project key benchmark.")
+    parser.add_argument("--projects", type=int, default=200000)
+    parser.add_argument("--participants", type=int, default=3)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument(
+        "--batch-size", type=int, default=100, help="Projects per transaction."
+    )
+    parser.add_argument(
+        "--measured",
+        type=float,
+        default=0.1,
+        help="Fraction of the last batches timed, into an already filled table.",
+    )
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    projects = [
+        (
+            f"project {i}",
+            owner_id,
+            [owner_id, *rng.sample(range(1, args.users + 1), args.participants)],
+        )
+        for i, owner_id in enumerate(
+            rng.randint(1, args.users) for _ in range(args.projects)
+        )
+    ]
+    # Owners sampled as participants too are inserted once
+    projects = [(name, owner, sorted(set(users))) for name, owner, users in projects]
+    batches = [
+        projects[start : start + args.batch_size]
+        for start in range(0, len(projects), args.batch_size)
+    ]
+    measured = max(1, int(len(batches) * args.measured))
+
+    directory = tempfile.mkdtemp(prefix="scribbly-keys-")
+    results = {
+        schema: run(schema, os.path.join(directory, f"{schema}.db"), batches, measured)
+        for schema in SCHEMAS
+    }
+
+    names = sorted({name for _, sizes in results.values() for name in sizes})
+    print(f"{'table or index':<32}" + "".join(f"{s:>14}" for s in SCHEMAS))
+    for name in names:
+        print(
+            f"{name:<32}"
+            + "".join(f"{results[s][1].get(name, 0) / 1024:>11.0f} KB" for s in SCHEMAS)
+        )
+    totals = {schema: sum(sizes.values()) for schema, (_, sizes) in results.items()}
+    print(f"{'total':<32}" + "".join(f"{totals[s] / 1024:>11.0f} KB" for s in SCHEMAS))
+    print(
+        f"{'inserts (projects/s)':<32}"
+        + "".join(f"{results[s][0]:>14.0f}" for s in SCHEMAS)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,587 @@
+"""
+Benchmark runner.
+
+Seeds a synthetic dataset and drives blueprint routes either through
+the Flask test client (single process, no network) or against a live
+run-eventlet server. Results are stored as JSON, so runs can be compared:
+
+    python -m benchmarks.run --mode client
+    python -m benchmarks.run --mode live --workers 4 --concurrency 32
+    python -m benchmarks.run --mode client --compare benchmarks/results/<old>.json
+
+Reads under concurrent writes (database profiles compared):
+
+    DATABASE_PROFILE=default python -m benchmarks.run --mode live --workers 4 \
+        --concurrency 16 --write-storm --scenarios browser search project
+    DATABASE_PROFILE=production python -m benchmarks.run --mode live --workers 4 \
+        --concurrency 16 --write-storm --scenarios browser search project
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.cookies import SimpleCookie
+from typing import Any, Callable, Optional
+from urllib.parse import urlencode
+
+import sqlalchemy as sa
+
+if not __package__:
+    # Run as a script (python benchmarks/run.py), import from the repository root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.dataset import PASSWORD, Dataset, Scale, seed
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+CSRF_PATTERN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+
+# Minimal interface shared by test and live clients
+class Client:
+    def get(self, path: str) -> int:
+        raise NotImplementedError
+
+    def post(self, path: str, data: dict[str, str]) -> int:
+        raise NotImplementedError
+
+    def login(self, email: str) -> int:
+        return self.post("/auth/login", {"email-address": email, "password": PASSWORD})
+
+    def close(self) -> None:
+        """Drop the connection after a failed request, the next one reconnects."""
+
+
+class TestClient(Client):
+    def __init__(self, app: Any) -> None:
+        """Create client calling the application in this process."""
+        self.client = app.test_client()
+
+    def get(self, path: str) -> int:
+        # Body is consumed chunk by chunk, so streamed responses are not buffered
+        response = self.client.get(path, buffered=False)
+        for _ in response.response:
+            pass
+        response.close()
+        return int(response.status_code)
+
+    def post(self, path: str, data: dict[str, str]) -> int:
+        return int(self.client.post(path, data=data).status_code)
+
+
+class LiveClient(Client):
+    def __init__(self, address: str, port: int) -> None:
+        """Create keep-alive HTTP client with a cookie jar and CSRF token handling."""
+        self.connection = http.client.HTTPConnection(address, port, timeout=30)
+        self.cookies: SimpleCookie = SimpleCookie()
+        self.csrf_tokens: dict[str, str] = {}
+
+    def request(self, method: str, path: str, body: Optional[str] = None) -> str:
+        headers = {
+            "Cookie": "; ".join(f"{k}={v.value}" for k, v in self.cookies.items())
+        }
+        if body is not None:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        content = response.read().decode()
+
+        for cookie in response.headers.get_all("Set-Cookie") or []:
+            self.cookies.load(cookie)
+
+        self.status = response.status
+        return content
+
+    def get(self, path: str) -> int:
+        self.request("GET", path)
+        return self.status
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def post(self, path: str, data: dict[str, str]) -> int:
+        # CSRF token is stored in the session, so it can be reused
+        if path not in self.csrf_tokens:
+            match = CSRF_PATTERN.search(self.request("GET", path))
+            if match:
+                self.csrf_tokens[path] = match.group(1)
+
+        data = {"csrf_token": self.csrf_tokens.get(path, ""), **data}
+        self.request("POST", path, urlencode(data))
+        return self.status
+
+    def login(self, email: str) -> int:
+        # Token of the anonymous session is not valid after login
+        self.csrf_tokens.clear()
+        return super().login(email)
+
+
+# Scenario: function sending one request using a logged in client
+Scenario = Callable[[Client, str, Dataset, random.Random], int]
+
+
+def scenario_login(
+    client: Client, email: str, dataset: Dataset, rng: random.Random
+) -> int:
+    # Needs a fresh, anonymous client, see run_scenario
+    return client.login(rng.choice(dataset.emails))
+
+
+def scenario_browser(
+    client: Client, email: str, dataset: Dataset, rng: random.Random
+) -> int:
+    return client.get("/projects")
+
+
+def scenario_search(
+    client: Client, email: str, dataset: Dataset, rng: random.Random
+) -> int:
+    query = urlencode({"q": f"project {rng.randrange(100)}", "page": 1})
+    return client.get(f"/projects/search?{query}")
+
+
+def scenario_project(
+    client: Client, email: str, dataset: Dataset, rng: random.Random
+) -> int:
+    return client.get(f"/project/{rng.choice(dataset.projects[email])}")
+
+
+def scenario_create(
+    client: Client, email: str, dataset: Dataset, rng: random.Random
+) -> int:
+    return client.post(
+        "/create-project",
+        {"name": f"benchmark {rng.randrange(10**9)}", "description": "Created."},
+    )
+
+
+SCENARIOS: dict[str, Scenario] = {
+    "login": scenario_login,
+    "browser": scenario_browser,
+    "search": scenario_search,
+    "project": scenario_project,
+    "create": scenario_create,
+}
+
+
+class SQLCounter:
+    def __init__(self) -> None:
+        """Count SQL statements executed in this process from now on."""
+        self.count = 0
+        sa.event.listen(sa.engine.Engine, "before_cursor_execute", self.on_execute)
+
+    def on_execute(self, *args: Any) -> None:
+        self.count += 1
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(
+    latencies: list[float], errors: int, elapsed: float, sql: Optional[int]
+) -> dict[str, Any]:
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "throughput": count / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else None,
+        "p50_ms": percentile(latencies, 0.50) * 1000 if latencies else None,
+        "p95_ms": percentile(latencies, 0.95) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+        "sql_per_request": sql / count if sql is not None and count else None,
+    }
+
+
+def run_scenario(
+    name: str,
+    make_client: Callable[[], Client],
+    dataset: Dataset,
+    requests: int,
+    concurrency: int,
+    sql_counter: Optional[SQLCounter],
+    background: Optional[Scenario] = None,
+) -> dict[str, Any]:
+    """
+    Send requests with concurrency threads, each having its own logged in client.
+
+    Background scenario, if given, runs in additional concurrency threads
+    for as long as the measured scenario. SQL statements are not counted then,
+    its requests and errors are reported separately.
+    """
+    scenario = SCENARIOS[name]
+    latencies: list[float] = []
+    errors = 0
+    background_requests = 0
+    background_errors = 0
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+    done = threading.Event()
+    # Measurement starts once all the clients are logged in
+    ready = threading.Barrier(concurrency * (2 if background else 1) + 1)
+
+    def worker(index: int, measured: Scenario, record: bool) -> None:
+        nonlocal errors, background_requests, background_errors
+        rng = random.Random(index)
+        email = dataset.emails[index % len(dataset.emails)]
+        client = make_client()
+        try:
+            client.login(email)
+        except BaseException:
+            # Do not keep the others waiting for this thread
+            ready.abort()
+            raise
+        ready.wait()
+
+        while not done.is_set():
+            if record:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+            if measured is scenario_login:
+                client = make_client()
+
+            start = time.perf_counter()
+            try:
+                status = measured(client, email, dataset, rng)
+            except (OSError, http.client.HTTPException):
+                # Timeouts and dropped connections are errors, not crashes
+                status = 599
+                client.close()
+            latency = time.perf_counter() - start
+
+            with lock:
+                if record:
+                    latencies.append(latency)
+                    errors += status >= 400
+                else:
+                    background_requests += 1
+                    background_errors += status >= 400
+
+    with ThreadPoolExecutor(max_workers=ready.parties - 1) as pool:
+        futures = [pool.submit(worker, i, scenario, True) for i in range(concurrency)]
+        background_futures = []
+        if background is not None:
+            background_futures = [
+                pool.submit(worker, concurrency + i, background, False)
+                for i in range(concurrency)
+            ]
+
+        # Background threads run until done, even if a measured one failed
+        try:
+            try:
+                ready.wait()
+            except threading.BrokenBarrierError:
+                # Raise the error of the thread which failed to log in
+                for future in futures + background_futures:
+                    if future.done() and future.exception() is not None:
+                        future.result()
+                raise
+            sql_before = sql_counter.count if sql_counter else 0
+            start = time.perf_counter()
+
+            for future in futures:
+                future.result()
+            elapsed = time.perf_counter() - start
+        finally:
+            done.set()
+
+    sql = None
+    if sql_counter is not None and background is None:
+        sql = sql_counter.count - sql_before
+
+    result = summarize(latencies, errors, elapsed, sql)
+    if background is not None:
+        result["background_requests"] = background_requests
+        result["background_errors"] = background_errors
+    return result
+
+
+def measure_request_memory(
+    name: str, make_client: Callable[[], Client], dataset: Dataset, samples: int
+) -> dict[str, Any]:
+    """
+    Peak memory allocated while handling a request, from sequential requests.
+
+    Uses tracemalloc, so only the in-process (client) mode can measure it.
+    """
+    scenario = SCENARIOS[name]
+    rng = random.Random(0)
+    email = dataset.emails[0]
+    client = make_client()
+    client.login(email)
+
+    peaks = []
+    for _ in range(samples):
+        if scenario is scenario_login:
+            client = make_client()
+        tracemalloc.start()
+        scenario(client, email, dataset, rng)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks.append(peak / 1024)
+
+    return {
+        "peak_kb_p50": percentile(peaks, 0.50),
+        "peak_kb_max": max(peaks),
+    }
+
+
+def wait_for_port(address: str, port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((address, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("Server did not start in time.")
+
+
+def read_peak_rss_kb(pid: int) -> int:
+    """Peak resident memory of a process and its children (Linux only)."""
+    total = 0
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as file:
+            pids.extend(int(child) for child in file.read().split())
+    except OSError:
+        pass
+
+    for process in pids:
+        try:
+            with open(f"/proc/{process}/status") as file:
+                for line in file:
+                    if line.startswith("VmHWM:"):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark runner.")
+    parser.add_argument("--mode", choices=("client", "live"), default="client")
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS)
+    )
+    parser.add_argument("--users", type=int, default=Scale.users)
+    parser.add_argument(
+        "--projects-per-user", type=int, default=Scale.projects_per_user
+    )
+    parser.add_argument(
+        "--participants-per-project", type=int, default=Scale.participants_per_project
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1, help="Live server workers.")
+    storm = parser.add_mutually_exclusive_group()
+    storm.add_argument(
+        "--login-storm",
+        action="store_true",
+        help="Run logins in the background while measuring other scenarios.",
+    )
+    storm.add_argument(
+        "--write-storm",
+        action="store_true",
+        help="Create projects in the background while measuring other scenarios.",
+    )
+    parser.add_argument(
+        "--output", help="Result file, by default in benchmarks/results."
+    )
+    parser.add_argument(
+        "--memory-samples",
+        type=int,
+        default=20,
+        help="Requests measured for peak memory per request (client mode only).",
+    )
+    parser.add_argument("--compare", help="Previous result file to compare with.")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.1,
+        help="Allowed p95 latency increase (fraction) when comparing.",
+    )
+    args = parser.parse_args()
+
+    instance_path = tempfile.mkdtemp(prefix="scribbly-benchmark-")
+    os.environ["INSTANCE_PATH"] = instance_path
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    # Benchmark clients share one IP and log in repeatedly
+    os.environ.setdefault("RATE_LIMITS", "false")
+
+    from app import create_app
+
+    app = create_app()
+    app.config["WTF_CSRF_ENABLED"] = args.mode == "live"
+
+    scale = Scale(args.users, args.projects_per_user, args.participants_per_project)
+    with app.app_context():
+        dataset = seed(scale)
+
+    server: Optional[subprocess.Popen[bytes]] = None
+    sql_counter: Optional[SQLCounter] = None
+    address, port = "127.0.0.1", 18090
+
+    if args.mode == "live":
+        env = dict(
+            os.environ,
+            FLASK_APP="app",
+            FLASK_DEBUG="0",
+            ADDRESS=address,
+            PORT=str(port),
+        )
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "flask",
+                "run-eventlet",
+                "--workers",
+                str(args.workers),
+            ],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        wait_for_port(address, port)
+
+        def make_client() -> Client:
+            return LiveClient(address, port)
+
+    else:
+        sql_counter = SQLCounter()
+
+        def make_client() -> Client:
+            return TestClient(app)
+
+    background: Optional[Scenario] = None
+    if args.login_storm:
+        background = scenario_login
+    elif args.write_storm:
+        background = scenario_create
+    results = {}
+    try:
+        for name in args.scenarios:
+            print(f"[INFO] Running {name}...")
+            results[name] = run_scenario(
+                name,
+                make_client,
+                dataset,
+                args.requests,
+                args.concurrency,
+                sql_counter,
+                background if SCENARIOS[name] is not background else None,
+            )
+            if args.mode == "client" and args.memory_samples > 0:
+                results[name].update(
+                    measure_request_memory(
+                        name, make_client, dataset, args.memory_samples
+                    )
+                )
+        if server is not None:
+            peak_rss_kb = read_peak_rss_kb(server.pid)
+        else:
+            peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "mode": args.mode,
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "login_storm": args.login_storm,
+            "write_storm": args.write_storm,
+            "scale": vars(scale),
+            "env": {
+                name: os.environ[name]
+                for name in sorted(os.environ)
+                if name.startswith(("SESSION_", "DATABASE_", "PASSWORD_", "STREAM_"))
+            },
+        },
+        "peak_rss_mb": peak_rss_kb / 1024,
+        "results": results,
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{args.mode}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    print_report(report)
+    print(f"[INFO] Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)
+        if not compare(previous, report, args.max_regression):
+            sys.exit(1)
+
+
+def print_report(report: dict[str, Any]) -> None:
+    print(
+        f"{'scenario':<10} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+        f"{'sql/req':>8} {'peak KB':>9}"
+    )
+    for name, result in report["results"].items():
+        sql = result["sql_per_request"]
+        peak = result.get("peak_kb_max")
+        print(
+            f"{name:<10} {result['throughput']:>9.1f} {result['p50_ms']:>9.2f} "
+            f"{result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+            f"{sql if sql is not None else '-':>8} "
+            f"{f'{peak:.0f}' if peak is not None else '-':>9}"
+        )
+        if "background_requests" in result:
+            print(
+                f"{'':<10} background: {result['background_requests']} requests, "
+                f"{result['background_errors']} errors"
+            )
+    print(f"peak RSS: {report['peak_rss_mb']:.1f} MB")
+
+
+def compare(
+    previous: dict[str, Any], current: dict[str, Any], max_regression: float
+) -> bool:
+    """Print p95 changes, return False if any scenario regressed too much."""
+    ok = True
+    for name, result in current["results"].items():
+        old = previous["results"].get(name)
+        if old is None or not old["p95_ms"] or result["p95_ms"] is None:
+            continue
+        change = result["p95_ms"] / old["p95_ms"] - 1
+        regressed = change > max_regression
+        ok = ok and not regressed
+        print(f"[{'FAIL' if regressed else 'OK'}] {name}: p95 {change:+.1%}")
+    return ok
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Application startup time profile.
+
+Imports the app package and calls create_app() in fresh interpreters,
+reports the median import and create_app times and the slowest imports
+(from python -X importtime). The budget is checked by tests/test_startup.py:
+
+    python -m benchmarks.startup
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Any
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app()
+created = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000,
+                  "create_app_ms": (created - imported) * 1000}))
+"""
+
+
+def run_probe(env: dict[str, str], importtime: bool) -> tuple[dict[str, Any], str]:
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c"]
+    result = subprocess.run(
+        [*command, PROBE],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings: dict[str, Any] = json.loads(result.stdout.strip().splitlines()[-1])
+    return timings, result.stderr
+
+
+def slowest_imports(importtime_output: str, count: int) -> list[tuple[str, float]]:
+    """Get imports made directly by top-level imports, sorted by cumulative time."""
+    imports = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # Direct imports are indented by two spaces
+        if name.startswith("   ") and not name.startswith("    "):
+            imports.append((name.strip(), int(cumulative) / 1000))
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:count]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Application startup time profile.")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(
+        os.environ,
+        INSTANCE_PATH=tempfile.mkdtemp(prefix="scribbly-startup-"),
+        SECRET_KEY=os.environ.get("SECRET_KEY", "startup"),
+    )
+
+    # First run warms up the bytecode cache and is not measured
+    run_probe(env, importtime=False)
+    runs = [run_probe(env, importtime=False)[0] for _ in range(args.runs)]
+    _, importtime_output = run_probe(env, importtime=True)
+
+    import_ms = statistics.median(run["import_ms"] for run in runs)
+    create_app_ms = statistics.median(run["create_app_ms"] for run in runs)
+
+    print(f"import app:   {import_ms:8.1f} ms")
+    print(f"create_app(): {create_app_ms:8.1f} ms")
+    print(f"total:        {import_ms + create_app_ms:8.1f} ms")
+    print("slowest imports (cumulative):")
+    for name, ms in slowest_imports(importtime_output, 10):
+        print(f"  {name:<40} {ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
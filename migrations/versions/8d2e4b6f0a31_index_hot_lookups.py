@@ -0,0 +1,95 @@
+"""
+Index hot lookup columns and add project search index.
+
+Revision ID: 8d2e4b6f0a31
+Revises: 3f1c9a2b7d10
+Create Date: 2026-10-18 12:30:00.000000+00:00
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8d2e4b6f0a31"
+down_revision = "3f1c9a2b7d10"
+branch_labels = None
+depends_on = None
+
+
+PROJECT_FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER project_fts_insert AFTER INSERT ON project BEGIN
+        INSERT INTO project_fts(rowid, name, description)
+        VALUES (new.rowid, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER project_fts_delete AFTER DELETE ON project BEGIN
+        INSERT INTO project_fts(project_fts, rowid, name, description)
+        VALUES ('delete', old.rowid, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER project_fts_update AFTER UPDATE ON project BEGIN
+        INSERT INTO project_fts(project_fts, rowid, name, description)
+        VALUES ('delete', old.rowid, old.name, old.description);
+        INSERT INTO project_fts(rowid, name, description)
+        VALUES (new.rowid, new.name, new.description);
+    END
+    """,
+]
+
+
+def upgrade() -> None:
+    op.create_index("ix_project_owner_id", "project", ["owner_id"])
+
+    # Rebuild association table with composite primary key, dropping duplicates
+    op.create_table(
+        "user_project_new",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("project_id", sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(["project_id"], ["project.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("user_id", "project_id"),
+    )
+    op.execute(
+        "INSERT OR IGNORE INTO user_project_new (user_id, project_id) "
+        "SELECT user_id, project_id FROM user_project "
+        "WHERE user_id IS NOT NULL AND project_id IS NOT NULL"
+    )
+    op.drop_table("user_project")
+    op.rename_table("user_project_new", "user_project")
+    op.create_index("ix_user_project_project_id", "user_project", ["project_id"])
+
+    # Full-text search index over projects, filled with existing rows
+    op.execute(
+        "CREATE VIRTUAL TABLE project_fts USING fts5("
+        "name, description, content='project', content_rowid='rowid')"
+    )
+    for trigger in PROJECT_FTS_TRIGGERS:
+        op.execute(trigger)
+    op.execute("INSERT INTO project_fts(project_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER project_fts_update")
+    op.execute("DROP TRIGGER project_fts_delete")
+    op.execute("DROP TRIGGER project_fts_insert")
+    op.execute("DROP TABLE project_fts")
+
+    op.drop_index("ix_user_project_project_id", table_name="user_project")
+    op.create_table(
+        "user_project_old",
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("project_id", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(["project_id"], ["project.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+    )
+    op.execute(
+        "INSERT INTO user_project_old (user_id, project_id) "
+        "SELECT user_id, project_id FROM user_project"
+    )
+    op.drop_table("user_project")
+    op.rename_table("user_project_old", "user_project")
+
+    op.drop_index("ix_project_owner_id", table_name="project")
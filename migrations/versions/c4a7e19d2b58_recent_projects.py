@@ -0,0 +1,38 @@
+"""
+Store recently visited projects.
+
+Revision ID: c4a7e19d2b58
+Revises: 8d2e4b6f0a31
+Create Date: 2026-10-18 15:00:00.000000+00:00
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c4a7e19d2b58"
+down_revision = "8d2e4b6f0a31"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "recent_project",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("project_id", sa.String(length=22), nullable=False),
+        sa.Column("visited_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["project_id"], ["project.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("user_id", "project_id"),
+    )
+    op.create_index(
+        "ix_recent_project_user_id_visited_at",
+        "recent_project",
+        ["user_id", "visited_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_recent_project_user_id_visited_at", table_name="recent_project")
+    op.drop_table("recent_project")
@@ -0,0 +1,98 @@
+"""
+Add user project summary read model.
+
+Revision ID: e5b2d8a41c73
+Revises: c4a7e19d2b58
+Create Date: 2026-10-18 18:30:00.000000+00:00
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e5b2d8a41c73"
+down_revision = "c4a7e19d2b58"
+branch_labels = None
+depends_on = None
+
+
+USER_PROJECT_SUMMARY_TRIGGERS = [
+    """
+    CREATE TRIGGER user_project_summary_insert
+    AFTER INSERT ON user_project BEGIN
+        INSERT OR REPLACE INTO user_project_summary
+            (user_id, created_at, project_id, name, description, is_owner)
+        SELECT new.user_id, p.created_at, p.id, p.name,
+               substr(p.description, 1, 256),
+               p.owner_id = new.user_id
+        FROM project AS p WHERE p.id = new.project_id;
+    END
+    """,
+    """
+    CREATE TRIGGER user_project_summary_delete
+    AFTER DELETE ON user_project BEGIN
+        DELETE FROM user_project_summary
+        WHERE project_id = old.project_id AND user_id = old.user_id;
+    END
+    """,
+    """
+    CREATE TRIGGER user_project_summary_project_update
+    AFTER UPDATE OF name, description, created_at, owner_id ON project BEGIN
+        UPDATE user_project_summary
+        SET name = new.name,
+            description = substr(new.description, 1, 256),
+            created_at = new.created_at,
+            is_owner = user_id = new.owner_id
+        WHERE project_id = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER user_project_summary_project_delete
+    AFTER DELETE ON project BEGIN
+        DELETE FROM user_project_summary WHERE project_id = old.id;
+    END
+    """,
+]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_project_summary",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("project_id", sa.String(length=22), nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("description", sa.String(length=256), nullable=True),
+        sa.Column("is_owner", sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(["project_id"], ["project.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("user_id", "created_at", "project_id"),
+        sqlite_with_rowid=False,
+    )
+    op.create_index(
+        "ix_user_project_summary_project_id",
+        "user_project_summary",
+        ["project_id", "user_id"],
+    )
+
+    for trigger in USER_PROJECT_SUMMARY_TRIGGERS:
+        op.execute(trigger)
+
+    op.execute(
+        "INSERT INTO user_project_summary "
+        "(user_id, created_at, project_id, name, description, is_owner) "
+        "SELECT member.user_id, p.created_at, p.id, p.name, "
+        "substr(p.description, 1, 256), p.owner_id = member.user_id "
+        "FROM user_project AS member JOIN project AS p ON p.id = member.project_id"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER user_project_summary_project_delete")
+    op.execute("DROP TRIGGER user_project_summary_project_update")
+    op.execute("DROP TRIGGER user_project_summary_delete")
+    op.execute("DROP TRIGGER user_project_summary_insert")
+    op.drop_index(
+        "ix_user_project_summary_project_id", table_name="user_project_summary"
+    )
+    op.drop_table("user_project_summary")
@@ -0,0 +1,300 @@
+"""
+Integer project keys with public slugs.
+
+Revision ID: f1a6c3d9e2b4
+Revises: e5b2d8a41c73
+Create Date: 2026-10-18 20:00:00.000000+00:00
+
+Project ids become integers, the previous string ids are kept as slugs
+so existing project URLs keep working. Tables referring to projects
+are rewritten, the search index and the summary are rebuilt.
+"""
+from typing import Callable
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "f1a6c3d9e2b4"
+down_revision = "e5b2d8a41c73"
+branch_labels = None
+depends_on = None
+
+
+PROJECT_FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER project_fts_insert AFTER INSERT ON project BEGIN
+        INSERT INTO project_fts(rowid, name, description)
+        VALUES (new.rowid, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER project_fts_delete AFTER DELETE ON project BEGIN
+        INSERT INTO project_fts(project_fts, rowid, name, description)
+        VALUES ('delete', old.rowid, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER project_fts_update AFTER UPDATE ON project BEGIN
+        INSERT INTO project_fts(project_fts, rowid, name, description)
+        VALUES ('delete', old.rowid, old.name, old.description);
+        INSERT INTO project_fts(rowid, name, description)
+        VALUES (new.rowid, new.name, new.description);
+    END
+    """,
+]
+
+USER_PROJECT_SUMMARY_TRIGGERS = [
+    """
+    CREATE TRIGGER user_project_summary_insert
+    AFTER INSERT ON user_project BEGIN
+        INSERT OR REPLACE INTO user_project_summary
+            (user_id, created_at, project_id, slug, name, description, is_owner)
+        SELECT new.user_id, p.created_at, p.id, p.slug, p.name,
+               substr(p.description, 1, 256),
+               p.owner_id = new.user_id
+        FROM project AS p WHERE p.id = new.project_id;
+    END
+    """,
+    """
+    CREATE TRIGGER user_project_summary_delete
+    AFTER DELETE ON user_project BEGIN
+        DELETE FROM user_project_summary
+        WHERE project_id = old.project_id AND user_id = old.user_id;
+    END
+    """,
+    """
+    CREATE TRIGGER user_project_summary_project_update
+    AFTER UPDATE OF slug, name, description, created_at, owner_id ON project BEGIN
+        UPDATE user_project_summary
+        SET slug = new.slug,
+            name = new.name,
+            description = substr(new.description, 1, 256),
+            created_at = new.created_at,
+            is_owner = user_id = new.owner_id
+        WHERE project_id = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER user_project_summary_project_delete
+    AFTER DELETE ON project BEGIN
+        DELETE FROM user_project_summary WHERE project_id = old.id;
+    END
+    """,
+]
+
+OLD_USER_PROJECT_SUMMARY_TRIGGERS = [
+    """
+    CREATE TRIGGER user_project_summary_insert
+    AFTER INSERT ON user_project BEGIN
+        INSERT OR REPLACE INTO user_project_summary
+            (user_id, created_at, project_id, name, description, is_owner)
+        SELECT new.user_id, p.created_at, p.id, p.name,
+               substr(p.description, 1, 256),
+               p.owner_id = new.user_id
+        FROM project AS p WHERE p.id = new.project_id;
+    END
+    """,
+    USER_PROJECT_SUMMARY_TRIGGERS[1],
+    """
+    CREATE TRIGGER user_project_summary_project_update
+    AFTER UPDATE OF name, description, created_at, owner_id ON project BEGIN
+        UPDATE user_project_summary
+        SET name = new.name,
+            description = substr(new.description, 1, 256),
+            created_at = new.created_at,
+            is_owner = user_id = new.owner_id
+        WHERE project_id = new.id;
+    END
+    """,
+    USER_PROJECT_SUMMARY_TRIGGERS[3],
+]
+
+
+def drop_derived_tables() -> None:
+    """Drop search index, summary and their triggers, they are rebuilt."""
+    for trigger in [
+        "user_project_summary_project_delete",
+        "user_project_summary_project_update",
+        "user_project_summary_delete",
+        "user_project_summary_insert",
+        "project_fts_update",
+        "project_fts_delete",
+        "project_fts_insert",
+    ]:
+        op.execute(f"DROP TRIGGER {trigger}")
+    op.execute("DROP TABLE project_fts")
+    op.drop_index(
+        "ix_user_project_summary_project_id", table_name="user_project_summary"
+    )
+    op.drop_table("user_project_summary")
+
+
+def create_derived_tables(
+    project_id_type: sa.types.TypeEngine, with_slug: bool
+) -> None:
+    """Create and fill search index and summary of the current project table."""
+    op.execute(
+        "CREATE VIRTUAL TABLE project_fts USING fts5("
+        "name, description, content='project', content_rowid='rowid')"
+    )
+    for trigger in PROJECT_FTS_TRIGGERS:
+        op.execute(trigger)
+    op.execute("INSERT INTO project_fts(project_fts) VALUES ('rebuild')")
+
+    slug_columns = [sa.Column("slug", sa.String(length=26), nullable=False)]
+    op.create_table(
+        "user_project_summary",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("project_id", project_id_type, nullable=False),
+        *(slug_columns if with_slug else []),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("description", sa.String(length=256), nullable=True),
+        sa.Column("is_owner", sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(["project_id"], ["project.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("user_id", "created_at", "project_id"),
+        sqlite_with_rowid=False,
+    )
+    op.create_index(
+        "ix_user_project_summary_project_id",
+        "user_project_summary",
+        ["project_id", "user_id"],
+    )
+    triggers = (
+        USER_PROJECT_SUMMARY_TRIGGERS
+        if with_slug
+        else OLD_USER_PROJECT_SUMMARY_TRIGGERS
+    )
+    for trigger in triggers:
+        op.execute(trigger)
+
+    slug, p_slug = ("slug, ", "p.slug, ") if with_slug else ("", "")
+    op.execute(
+        "INSERT INTO user_project_summary "
+        f"(user_id, created_at, project_id, {slug}name, description, is_owner) "
+        f"SELECT member.user_id, p.created_at, p.id, {p_slug}p.name, "
+        "substr(p.description, 1, 256), p.owner_id = member.user_id "
+        "FROM user_project AS member JOIN project AS p ON p.id = member.project_id"
+    )
+
+
+def replace_project_tables(
+    project_columns: list[sa.Column],
+    project_select: str,
+    reference_select: Callable[[str], str],
+) -> sa.types.TypeEngine:
+    """
+    Rewrite project and the tables referring to it.
+
+    project_select fills the new project table from the old one ("p"),
+    reference_select gives the new project id of a row "ref" referring
+    to the old project, joined with the new project table ("new").
+    """
+    project_id_type = project_columns[0].type
+    op.create_table(
+        "project_new",
+        *project_columns,
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("description", sa.String(length=2048), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=True,
+        ),
+        sa.Column("owner_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["owner_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sqlite_autoincrement=isinstance(project_id_type, sa.Integer),
+    )
+    columns = ", ".join(column.name for column in project_columns)
+    op.execute(
+        f"INSERT INTO project_new ({columns}, name, description, created_at, owner_id) "
+        f"{project_select}"
+    )
+
+    op.create_table(
+        "user_project_new",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("project_id", project_id_type, nullable=False),
+        sa.ForeignKeyConstraint(["project_id"], ["project.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("user_id", "project_id"),
+    )
+    op.execute(
+        "INSERT INTO user_project_new (user_id, project_id) "
+        f"SELECT ref.user_id, {reference_select('user_project')}"
+    )
+
+    op.create_table(
+        "recent_project_new",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("project_id", project_id_type, nullable=False),
+        sa.Column("visited_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["project_id"], ["project.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("user_id", "project_id"),
+    )
+    op.execute(
+        "INSERT INTO recent_project_new (user_id, visited_at, project_id) "
+        f"SELECT ref.user_id, ref.visited_at, {reference_select('recent_project')}"
+    )
+
+    # Foreign keys refer to tables by name, they point to the new tables
+    # once these are renamed
+    op.drop_table("recent_project")
+    op.drop_table("user_project")
+    op.drop_table("project")
+    op.rename_table("project_new", "project")
+    op.rename_table("user_project_new", "user_project")
+    op.rename_table("recent_project_new", "recent_project")
+
+    op.create_index("ix_project_owner_id", "project", ["owner_id"])
+    op.create_index("ix_user_project_project_id", "user_project", ["project_id"])
+    op.create_index(
+        "ix_recent_project_user_id_visited_at",
+        "recent_project",
+        ["user_id", "visited_at"],
+    )
+
+    return project_id_type
+
+
+def upgrade() -> None:
+    drop_derived_tables()
+
+    # Old ids become slugs, integer ids follow the order of creation
+    project_id_type = replace_project_tables(
+        [
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("slug", sa.String(length=26), nullable=False),
+        ],
+        "SELECT NULL, p.id, p.name, p.description, p.created_at, p.owner_id "
+        "FROM project AS p ORDER BY p.created_at, p.rowid",
+        lambda table: (
+            f"new.id FROM {table} AS ref JOIN project_new AS new "
+            "ON new.slug = ref.project_id"
+        ),
+    )
+    op.create_index("ix_project_slug", "project", ["slug"], unique=True)
+
+    create_derived_tables(project_id_type, with_slug=True)
+
+
+def downgrade() -> None:
+    drop_derived_tables()
+    op.drop_index("ix_project_slug", table_name="project")
+
+    # Slugs become ids again
+    project_id_type = replace_project_tables(
+        [sa.Column("id", sa.String(length=26), nullable=False)],
+        "SELECT p.slug, p.name, p.description, p.created_at, p.owner_id "
+        "FROM project AS p",
+        lambda table: (
+            f"p.slug FROM {table} AS ref JOIN project AS p ON p.id = ref.project_id"
+        ),
+    )
+
+    create_derived_tables(project_id_type, with_slug=False)
@@ -0,0 +1,75 @@
+"""Application fixtures, every test gets its own instance folder and database."""
+
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+import pytest
+import sqlalchemy as sa
+from flask import Flask
+from flask.testing import FlaskClient
+
+from app import create_app
+from app.models import User, db
+from app.recent import recent_projects
+
+PASSWORD = "test-password"
+
+
+@pytest.fixture
+def app(tmp_path: Any, monkeypatch: pytest.MonkeyPatch) -> Iterator[Flask]:
+    monkeypatch.setenv("INSTANCE_PATH", str(tmp_path))
+    monkeypatch.setenv("SECRET_KEY", "test")
+    monkeypatch.setenv("RATE_LIMITS", "false")
+    # Hashing is slow on purpose
+    monkeypatch.setenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        db.create_all()
+
+    yield app
+
+    # Visits of this test must not be written to the next test's database
+    recent_projects.flush(app)
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def add_user(app: Flask, name: str) -> int:
+    with app.app_context():
+        user: User = User.add(f"{name}@example.com", name, PASSWORD)
+        return int(user.id)
+
+
+def login(app: Flask, name: str) -> FlaskClient:
+    client = app.test_client()
+    response = client.post(
+        "/auth/login",
+        data={"email-address": f"{name}@example.com", "password": PASSWORD},
+    )
+    assert response.status_code == 302
+    return client
+
+
+@contextmanager
+def count_statements() -> Iterator[list[str]]:
+    """Collect SQL statements executed by any engine within the block."""
+    statements: list[str] = []
+
+    def before_cursor_execute(
+        conn: Any, cursor: Any, statement: str, *args: Any
+    ) -> None:
+        statements.append(statement)
+
+    sa.event.listen(sa.engine.Engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        sa.event.remove(
+            sa.engine.Engine, "before_cursor_execute", before_cursor_execute
+        )
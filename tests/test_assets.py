@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import gzip
+import os
+from typing import Any
+
+from flask import Flask, url_for
+
+from app.assets import (
+    BUILD_DIR,
+    KEEP_GENERATIONS,
+    build,
+    load_manifest,
+    register_assets,
+)
+
+
+def write(static: Any, name: str, content: str) -> None:
+    path = static / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+def built_files(static: Any) -> set[str]:
+    folder = static / BUILD_DIR
+    return {
+        os.path.relpath(os.path.join(root, name), folder)
+        for root, _, files in os.walk(folder)
+        for name in files
+    }
+
+
+def test_rebuild_keeps_files_of_previous_builds(tmp_path: Any) -> None:
+    write(tmp_path, "css/base.css", "body { color: red; }")
+    first = build(str(tmp_path))["css/base.css"]
+
+    write(tmp_path, "css/base.css", "body { color: blue; }")
+    second = build(str(tmp_path))["css/base.css"]
+
+    assert first != second
+    assert {first, second} <= built_files(tmp_path)
+    assert load_manifest(str(tmp_path)) == {"css/base.css": second}
+
+
+def test_rebuild_prunes_old_generations(tmp_path: Any) -> None:
+    names = []
+    for i in range(KEEP_GENERATIONS + 1):
+        write(tmp_path, "css/base.css", f"body {{ z-index: {i}; }}")
+        names.append(build(str(tmp_path))["css/base.css"])
+
+    files = built_files(tmp_path)
+    assert names[0] not in files
+    assert set(names[1:]) <= files
+    assert not [name for name in files if ".tmp-" in name]
+
+
+def test_css_references_fingerprinted_files(tmp_path: Any) -> None:
+    write(tmp_path, "img/logo.svg", "<svg></svg>")
+    write(tmp_path, "css/base.css", "body { background: url('../img/logo.svg'); }")
+
+    manifest = build(str(tmp_path))
+
+    css = (tmp_path / BUILD_DIR / manifest["css/base.css"]).read_text()
+    assert f"url(../{manifest['img/logo.svg']})" in css
+
+
+def test_built_assets_served_immutable(tmp_path: Any) -> None:
+    write(tmp_path, "css/base.css", "body { color: red; }\n" * 100)
+    old = build(str(tmp_path))["css/base.css"]
+    write(tmp_path, "css/base.css", "body { color: blue; }\n" * 100)
+    build(str(tmp_path))
+    write(tmp_path, "css/new.css", "body { color: green; }")
+
+    app = Flask(__name__, static_folder=str(tmp_path), static_url_path="/static")
+    register_assets(app, use_manifest=True)
+    client = app.test_client()
+
+    with app.test_request_context():
+        url = url_for("static", filename="css/base.css")
+        # Files added after the build are served as they are
+        assert url_for("static", filename="css/new.css") == "/static/css/new.css"
+    assert url != "/static/css/base.css"
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.cache_control.immutable
+    assert "blue" in gzip.decompress(response.data).decode()
+
+    # Pages rendered with the previous manifest still get their files
+    response = client.get(f"/static/{BUILD_DIR}/{old}")
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+    assert client.get("/static/css/new.css").status_code == 200
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import time
+from typing import Any
+
+import pytest
+import sqlalchemy as sa
+from flask import Flask
+
+from app.models import User, db, taken_names
+from tests.conftest import PASSWORD, add_user
+
+
+def register(app: Flask, name: str) -> str:
+    response = app.test_client().post(
+        "/auth/register",
+        data={
+            "email-address": f"{name}@example.com",
+            "username": name,
+            "password": PASSWORD,
+            "confirmation": PASSWORD,
+        },
+    )
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def test_registration_checks_database_not_filter(app: Flask) -> None:
+    with app.test_request_context():
+        taken_names.might_contain("username:other")
+    deadline = time.monotonic() + 5
+    while taken_names._filter is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert taken_names._filter is not None
+
+    # Added by another worker, this worker's filter does not know the user
+    with app.app_context():
+        db.session.execute(
+            sa.insert(User.__table__),
+            {"email": "other@example.com", "username": "other", "password": "-"},
+        )
+        db.session.commit()
+
+    page = register(app, "other")
+    assert "Email address already taken." in page
+    assert "Username already taken." in page
+
+
+def test_concurrent_registration_is_a_form_error(
+    app: Flask, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    add_user(app, "twice")
+    find_taken = User.find_taken
+    calls = []
+
+    def taken_after_validation(*args: Any, **kwargs: Any) -> tuple[bool, bool]:
+        # The other registration commits between validation and insert
+        calls.append(args)
+        return (False, False) if len(calls) == 1 else find_taken(*args, **kwargs)
+
+    monkeypatch.setattr(User, "find_taken", taken_after_validation)
+
+    page = register(app, "twice")
+    assert "Username already taken." in page
+
+
+def test_registration_strips_email_before_checking(app: Flask) -> None:
+    add_user(app, "spaces")
+    response = app.test_client().post(
+        "/auth/register",
+        data={
+            "email-address": " spaces@example.com ",
+            "username": "spaces2",
+            "password": PASSWORD,
+            "confirmation": PASSWORD,
+        },
+    )
+    assert response.status_code == 200
+    assert "Email address already taken." in response.get_data(as_text=True)
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from typing import Any
+
+from flask import Flask
+
+from app.cache import SQLiteVersionStore
+from app.models import Project
+from tests.conftest import add_user, login
+
+
+def test_browser_answers_not_modified(app: Flask) -> None:
+    add_user(app, "etag")
+    client = login(app, "etag")
+
+    etag = client.get("/projects").headers["ETag"]
+    response = client.get("/projects", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_project_page_revalidated_after_change(app: Flask) -> None:
+    alice = add_user(app, "alice")
+    bob = add_user(app, "bob")
+    with app.app_context():
+        [(project_id, slug)] = Project.add_many([("Project", None, alice)])
+    client = login(app, "alice")
+
+    response = client.get(f"/project/{slug}")
+    etag = response.headers["ETag"]
+    assert response.cache_control.private
+    assert response.cache_control.no_cache
+    assert (
+        client.get(f"/project/{slug}", headers={"If-None-Match": etag}).status_code
+        == 304
+    )
+
+    # Another participant changes the page
+    with app.app_context():
+        Project.add_participants([(project_id, bob)])
+    response = client.get(f"/project/{slug}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "bob" in response.get_data(as_text=True)
+
+    # Validators are specific to the user
+    other = login(app, "bob").get(
+        f"/project/{slug}", headers={"If-None-Match": response.headers["ETag"]}
+    )
+    assert other.status_code == 200
+
+
+def test_new_release_invalidates_etags(app: Flask) -> None:
+    add_user(app, "release")
+    client = login(app, "release")
+    etag = client.get("/projects").headers["ETag"]
+
+    app.config["DEPLOY_ID"] = "next-release"
+    response = client.get("/projects", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_versions_of_new_stores_differ(tmp_path: Any) -> None:
+    first = SQLiteVersionStore(str(tmp_path / "first.sqlite3"))
+    second = SQLiteVersionStore(str(tmp_path / "second.sqlite3"))
+    assert first.get("user:1")[0] != second.get("user:1")[0]
+
+    version = first.get("user:1")[0]
+    first.bump("user:1")
+    assert first.get("user:1")[0] == version + 1
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import gzip
+import zlib
+from typing import Iterator
+
+import pytest
+from flask import Flask, Response
+
+from app.compression import CompressionMiddleware
+
+PAGE = "<p>Compressible page.</p>\n" * 100
+
+
+@pytest.fixture
+def compressed() -> Flask:
+    """Small application behind the middleware, gzip only."""
+    app = Flask(__name__)
+    closed: list[str] = []
+    app.config["closed"] = closed
+
+    @app.route("/page")
+    def page() -> Response:
+        response = Response(PAGE)
+        response.set_etag("page")
+        response.call_on_close(lambda: closed.append("page"))
+        return response
+
+    @app.route("/small")
+    def small() -> str:
+        return "<p>Small.</p>"
+
+    @app.route("/stream")
+    def stream() -> Response:
+        def chunks() -> Iterator[str]:
+            for i in range(3):
+                yield f"<p>Chunk {i}.</p>\n"
+
+        return Response(chunks(), mimetype="text/html")
+
+    @app.route("/events")
+    def events() -> Response:
+        return Response(iter([PAGE]), mimetype="text/event-stream")
+
+    @app.route("/image")
+    def image() -> Response:
+        return Response(PAGE, mimetype="image/png")
+
+    app.wsgi_app = CompressionMiddleware(  # type: ignore[method-assign]
+        app.wsgi_app, brotli=False
+    )
+    return app
+
+
+def test_page_compressed(compressed: Flask) -> None:
+    response = compressed.test_client().get(
+        "/page", headers={"Accept-Encoding": "br;q=1.0, gzip;q=0.8"}
+    )
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.headers["ETag"] == 'W/"page"'
+    assert int(response.headers["Content-Length"]) == len(response.data)
+    assert gzip.decompress(response.data).decode() == PAGE
+
+    # Callbacks run after the compressed body was sent
+    response.close()
+    assert compressed.config["closed"] == ["page"]
+
+
+@pytest.mark.parametrize(
+    "path, headers",
+    [
+        ("/page", {}),
+        ("/page", {"Accept-Encoding": "identity"}),
+        ("/small", {"Accept-Encoding": "gzip"}),
+        ("/events", {"Accept-Encoding": "gzip"}),
+        ("/image", {"Accept-Encoding": "gzip"}),
+    ],
+)
+def test_left_uncompressed(
+    compressed: Flask, path: str, headers: dict[str, str]
+) -> None:
+    response = compressed.test_client().get(path, headers=headers)
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+
+
+def test_head_left_uncompressed(compressed: Flask) -> None:
+    response = compressed.test_client().head(
+        "/page", headers={"Accept-Encoding": "gzip"}
+    )
+    assert "Content-Encoding" not in response.headers
+    assert int(response.headers["Content-Length"]) == len(PAGE)
+
+
+def test_stream_chunks_flushed(compressed: Flask) -> None:
+    response = compressed.test_client().get(
+        "/stream", headers={"Accept-Encoding": "gzip"}, buffered=False
+    )
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+
+    # Every chunk decompresses on its own, nothing waits for the next one
+    decompressor = zlib.decompressobj(31)
+    chunks = [decompressor.decompress(chunk) for chunk in response.iter_encoded()]
+    assert chunks[:3] == [f"<p>Chunk {i}.</p>\n".encode() for i in range(3)]
+    assert decompressor.eof
+
+
+def test_range_response_is_not_compressed(app: Flask) -> None:
+    response = app.test_client().get(
+        "/static/css/base.css",
+        headers={"Accept-Encoding": "gzip", "Range": "bytes=0-2047"},
+    )
+    assert response.status_code == 206
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Content-Range"].startswith("bytes 0-2047/")
+    assert len(response.data) == 2048
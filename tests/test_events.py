@@ -0,0 +1,135 @@
+"""Live project updates over Server-Sent Events."""
+
+
+from __future__ import annotations
+
+import json
+import queue
+from typing import Any, Iterator
+
+import pytest
+from flask import Flask
+
+from app import create_app
+from app.events import Event, Fanout, LocalFanout, SQLiteFanout, broker
+from app.models import Project, User, db
+from tests.conftest import add_user, login
+
+
+def open_stream(app: Flask, name: str, slug: str) -> Iterator[str]:
+    response = login(app, name).get(f"/project/{slug}/events", buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    return (chunk.decode() for chunk in response.iter_encoded())
+
+
+def parse(message: str) -> dict[str, Any]:
+    kind, data = message.strip().split("\n")
+    event: dict[str, Any] = json.loads(data[len("data: ") :])
+    assert kind == f"event: {event['type']}"
+    return event
+
+
+def test_stream_follows_participants(app: Flask) -> None:
+    alice = add_user(app, "alice")
+    bob = add_user(app, "bob")
+    with app.app_context():
+        [(project_id, slug)] = Project.add_many([("Project", None, alice)])
+    app.config["EVENTS_HEARTBEAT"] = 0.05
+
+    stream = open_stream(app, "alice", slug)
+    assert next(stream).startswith("retry: ")
+    assert next(stream) == ": keep-alive\n\n"
+
+    with app.app_context():
+        project = db.session.get(Project, project_id)
+        project.participants.append(db.session.get(User, bob))
+        project.name = "Renamed"
+        db.session.commit()
+
+    assert parse(next(stream)) == {
+        "type": "participant_added",
+        "user": {"id": bob, "username": "bob"},
+    }
+    assert parse(next(stream)) == {"type": "project_updated", "name": "Renamed"}
+
+
+def test_stream_ends_when_access_is_lost(app: Flask) -> None:
+    alice = add_user(app, "alice")
+    bob = add_user(app, "bob")
+    with app.app_context():
+        [(project_id, slug)] = Project.add_many([("Project", None, alice)])
+        Project.add_participants([(project_id, bob)])
+
+    subscribers = broker.stats()["subscribers"]
+    stream = open_stream(app, "bob", slug)
+    next(stream)
+    assert broker.stats()["subscribers"] == subscribers + 1
+    with app.app_context():
+        project = db.session.get(Project, project_id)
+        project.participants.remove(db.session.get(User, bob))
+        db.session.commit()
+
+    assert parse(next(stream))["type"] == "participant_removed"
+    assert list(stream) == []
+    assert broker.stats()["subscribers"] == subscribers
+
+    # Not a participant anymore
+    response = login(app, "bob").get(f"/project/{slug}/events")
+    assert response.status_code == 404
+
+
+def test_slow_stream_asked_to_reload(app: Flask) -> None:
+    alice = add_user(app, "alice")
+    with app.app_context():
+        [(project_id, slug)] = Project.add_many([("Project", None, alice)])
+    app.config["EVENTS_HEARTBEAT"] = 0.05
+    broker.configure(queue_size=2)
+
+    stream = open_stream(app, "alice", slug)
+    next(stream)
+    for i in range(3):
+        broker.publish(f"project:{project_id}", {"type": "project_updated", "i": i})
+
+    assert [parse(next(stream))["i"] for _ in range(2)] == [0, 1]
+    assert parse(next(stream)) == {"type": "reload"}
+    assert list(stream) == []
+
+
+def start_collecting(fanout: Fanout) -> queue.Queue[tuple[str, Event]]:
+    events: queue.Queue[tuple[str, Event]] = queue.Queue()
+
+    def deliver(channel: str, event: Event) -> None:
+        events.put((channel, event))
+
+    fanout.start(deliver)
+    return events
+
+
+def test_sqlite_fanout_reaches_other_workers(tmp_path: Any) -> None:
+    path = str(tmp_path / "events.sqlite3")
+    # Published before any worker started, not delivered
+    SQLiteFanout(path).publish("project:1", {"type": "project_deleted"})
+
+    workers = [SQLiteFanout(path, poll_interval=0.01) for _ in range(2)]
+    received = [start_collecting(fanout) for fanout in workers]
+
+    workers[0].publish("project:2", {"type": "project_updated", "name": "Renamed"})
+    for events in received:
+        assert events.get(timeout=5) == (
+            "project:2",
+            {"type": "project_updated", "name": "Renamed"},
+        )
+        assert events.empty()
+
+
+@pytest.mark.parametrize("workers, fanout", [("1", LocalFanout), ("4", SQLiteFanout)])
+def test_fanout_shared_by_workers(
+    tmp_path: Any, monkeypatch: pytest.MonkeyPatch, workers: str, fanout: type
+) -> None:
+    monkeypatch.setenv("INSTANCE_PATH", str(tmp_path))
+    monkeypatch.setenv("WORKERS", workers)
+    monkeypatch.delenv("EVENTS_BACKEND", raising=False)
+
+    create_app()
+    assert type(broker.fanout) is fanout
@@ -0,0 +1,183 @@
+"""Durable job queue and its worker."""
+
+
+from __future__ import annotations
+
+import signal
+import threading
+import time
+from typing import Iterator
+
+import pytest
+from flask import Flask
+
+from app import create_app
+from app.jobs import SQLiteJobQueue, Worker, _job_types, job, jobs, retry_delay
+from app.models import RecentProject, db
+from app.recent import recent_projects
+from tests.conftest import add_user, login
+
+calls: list[int] = []
+
+
+@job(max_attempts=3)
+def flaky(fail: int) -> None:
+    """Fail the first fail attempts."""
+    calls.append(fail)
+    if len(calls) <= fail:
+        raise RuntimeError("Flaky job failed.")
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    now = [time.time()]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def queue(tmp_path: str) -> Iterator[SQLiteJobQueue]:
+    calls.clear()
+    yield SQLiteJobQueue(f"{tmp_path}/jobs.sqlite3")
+
+
+def test_claim_takes_job_once(queue: SQLiteJobQueue, clock: list[float]) -> None:
+    queue.push(_job_types["flaky"], {"fail": 0})
+
+    claimed = queue.claim(lease=60)
+    assert claimed is not None
+    assert (claimed.name, claimed.payload, claimed.attempts) == (
+        "flaky",
+        {"fail": 0},
+        1,
+    )
+    assert queue.claim(lease=60) is None
+
+    queue.complete(claimed)
+    clock[0] += 120
+    assert queue.claim(lease=60) is None
+    assert queue.stats()["depth"] == 0
+
+
+def test_expired_lease_is_claimed_again(
+    queue: SQLiteJobQueue, clock: list[float]
+) -> None:
+    queue.push(_job_types["flaky"], {"fail": 0})
+    first = queue.claim(lease=60)
+    assert first is not None
+
+    # The worker holding the job crashed
+    clock[0] += 59
+    assert queue.claim(lease=60) is None
+    clock[0] += 2
+    second = queue.claim(lease=60)
+    assert second is not None
+    assert second.id == first.id
+    assert second.attempts == 2
+
+
+def test_retry_delay_backs_off() -> None:
+    for attempts, delay in [(1, 5), (2, 10), (3, 20), (8, 600)]:
+        assert delay / 2 <= retry_delay(attempts, base=5, limit=600) <= delay
+
+
+def test_failed_job_is_retried_with_backoff(
+    app: Flask, queue: SQLiteJobQueue, clock: list[float]
+) -> None:
+    worker = Worker(app, queue, processes=0, retry_base=10, retry_limit=600)
+    queue.push(_job_types["flaky"], {"fail": 1})
+
+    first = queue.claim(lease=60)
+    assert first is not None
+    worker.execute(first)
+    assert calls == [1]
+    assert queue.claim(lease=60) is None
+
+    clock[0] += 10
+    second = queue.claim(lease=60)
+    assert second is not None
+    worker.execute(second)
+    assert calls == [1, 1]
+
+    stats = queue.stats()
+    assert (stats["depth"], stats["failed"]) == (0, 0)
+    outcomes = {outcome: count for _, outcome, _, count, _ in stats["finished"]}
+    assert outcomes == {"retried": 1, "completed": 1}
+
+
+def test_job_fails_after_max_attempts(
+    app: Flask, queue: SQLiteJobQueue, clock: list[float]
+) -> None:
+    worker = Worker(app, queue, processes=0, retry_base=10, retry_limit=600)
+    queue.push(_job_types["flaky"], {"fail": 10})
+
+    for _ in range(3):
+        clock[0] += 600
+        claimed = queue.claim(lease=60)
+        assert claimed is not None
+        worker.execute(claimed)
+
+    clock[0] += 600
+    assert queue.claim(lease=60) is None
+    assert len(calls) == 3
+    assert queue.stats()["failed"] == 1
+
+    # Failed jobs are kept until queued again
+    assert queue.requeue_failed() == 1
+    claimed = queue.claim(lease=60)
+    assert claimed is not None
+    assert claimed.attempts == 1
+
+
+def test_worker_stops_without_waiting_for_stuck_jobs(
+    app: Flask, queue: SQLiteJobQueue, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Keep the handlers of the test runner
+    monkeypatch.setattr(signal, "signal", lambda *args: None)
+    release = threading.Event()
+
+    @job()
+    def stuck() -> None:
+        release.wait(30)
+
+    queue.push(_job_types["stuck"], {})
+    worker = Worker(app, queue, processes=0, poll_interval=0.01)
+    threading.Timer(0.2, worker.stopping.set).start()
+    try:
+        start = time.monotonic()
+        worker.run(graceful_timeout=0.1)
+        assert time.monotonic() - start < 5
+        # Left for another worker once the lease expires
+        assert queue.stats()["depth"] == 1
+    finally:
+        release.set()
+
+
+def test_project_visits_are_saved_by_job(
+    app: Flask, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("JOBS_BACKEND", "sqlite")
+    queued = create_app()
+    queued.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    add_user(queued, "alice")
+    client = login(queued, "alice")
+    response = client.post("/create-project", data={"name": "Project"})
+    client.get(response.headers["Location"])
+    recent_projects.flush(queued)
+
+    queue = jobs.queue
+    assert queue is not None
+    try:
+        with queued.app_context():
+            assert RecentProject.load(1, 5) == []
+
+        claimed = queue.claim(lease=60)
+        assert claimed is not None
+        assert claimed.name == "save_recent_projects"
+        Worker(queued, queue, processes=0).execute(claimed)
+
+        with queued.app_context():
+            assert [project_id for project_id, _ in RecentProject.load(1, 5)] == [1]
+            db.session.remove()
+    finally:
+        jobs.configure(queue=None)
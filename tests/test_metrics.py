@@ -0,0 +1,73 @@
+"""Per-request instrumentation and the /metrics endpoint."""
+
+
+from __future__ import annotations
+
+import logging
+import os
+
+import pytest
+from flask import Flask
+
+from app.metrics import registry
+from tests.conftest import add_user, login
+
+
+def test_metrics_need_token(app: Flask) -> None:
+    client = app.test_client()
+    assert client.get("/metrics").status_code == 404
+
+    app.config["METRICS_TOKEN"] = "secret"
+    assert client.get("/metrics").status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+
+
+def test_requests_counted_per_endpoint(app: Flask) -> None:
+    app.config["METRICS_TOKEN"] = "secret"
+    add_user(app, "alice")
+    client = login(app, "alice")
+    registry.clear()
+
+    client.get("/projects")
+    client.get("/projects")
+    client.get("/project/missing")
+
+    metrics = app.test_client().get(
+        "/metrics", headers={"Authorization": "Bearer secret"}
+    )
+    lines = metrics.get_data(as_text=True).splitlines()
+    worker = f'worker="{os.getpid()}"'
+    labels = f'endpoint="project.browser",status="200",{worker}'
+    assert f"scribbly_requests_total{{{labels}}} 2" in lines
+    assert any(
+        line.startswith(f'scribbly_sql_statements_total{{endpoint="project.project"')
+        for line in lines
+    )
+    count = f'scribbly_request_duration_seconds_count{{endpoint="project.browser",{worker}}}'
+    assert f"{count} 2" in lines
+
+
+def test_server_timing_header(app: Flask) -> None:
+    add_user(app, "alice")
+    client = login(app, "alice")
+    assert "Server-Timing" not in client.get("/projects").headers
+
+    app.config["SERVER_TIMING"] = True
+    timing = client.get("/projects").headers["Server-Timing"]
+    assert timing.startswith("db;dur=")
+    assert "queries" in timing
+    assert "total;dur=" in timing
+
+
+def test_slow_queries_logged(app: Flask, caplog: pytest.LogCaptureFixture) -> None:
+    add_user(app, "alice")
+    client = login(app, "alice")
+    app.config["SLOW_QUERY_MS"] = 0
+
+    with caplog.at_level(logging.WARNING):
+        client.get("/projects")
+
+    assert any("Slow query" in record.message for record in caplog.records)
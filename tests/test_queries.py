@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from flask import Flask
+
+from app.models import Project
+from tests.conftest import add_user, count_statements, login
+
+
+def browse_statements(app: Flask, name: str, projects: int) -> list[str]:
+    """Statements of the browser page of a user with that many recent projects."""
+    user_id = add_user(app, name)
+    with app.app_context():
+        keys = Project.add_many(
+            [(f"{name} {i}", "Description.", user_id) for i in range(projects)]
+        )
+
+    client = login(app, name)
+    for _, slug in keys[-5:]:
+        assert client.get(f"/project/{slug}").status_code == 200
+
+    with count_statements() as statements:
+        response = client.get("/projects")
+    assert response.status_code == 200
+    return statements
+
+
+def test_browser_statements_do_not_grow_with_projects(app: Flask) -> None:
+    few = browse_statements(app, "few", 1)
+    many = browse_statements(app, "many", 100)
+    assert len(few) == len(many)
@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+from flask import Flask
+
+from app.models import hot_lookup_queries, query_plan
+
+
+def test_hot_lookups_do_not_scan_tables(app: Flask) -> None:
+    with app.app_context():
+        plans = {
+            name: query_plan(query) for name, query in hot_lookup_queries().items()
+        }
+
+    scans = {
+        name: details
+        for name, details in plans.items()
+        if any(detail.startswith("SCAN") for detail in details)
+    }
+    assert not scans
@@ -0,0 +1,134 @@
+"""Token bucket rate limits of the auth views."""
+
+
+from __future__ import annotations
+
+import time
+from typing import Iterator
+
+import pytest
+from flask import Flask
+
+from app import create_app, ratelimit
+from app.ratelimit import Limit, MemoryBucketStore, SQLiteBucketStore, limiter
+from tests.conftest import PASSWORD, add_user
+
+
+@pytest.fixture
+def limits() -> Iterator[dict[str, Limit]]:
+    """Enable limiting with empty buckets, the test sets the limits."""
+    limits: dict[str, Limit] = {}
+    limiter.configure(store=MemoryBucketStore(), limits=limits, enabled=True)
+    yield limits
+    limiter.configure(enabled=False)
+
+
+def attempt(app: Flask, email: str, ip: str = "10.0.0.1") -> int:
+    response = app.test_client().post(
+        "/auth/login",
+        data={"email-address": email, "password": "wrong"},
+        environ_base={"REMOTE_ADDR": ip},
+    )
+    return response.status_code
+
+
+def test_rejected_with_retry_after(app: Flask, limits: dict[str, Limit]) -> None:
+    limits["login_ip"] = Limit.parse("2/60")
+
+    assert attempt(app, "a@example.com") == 200
+    assert attempt(app, "b@example.com") == 200
+    response = app.test_client().post(
+        "/auth/login",
+        data={"email-address": "c@example.com", "password": "wrong"},
+        environ_base={"REMOTE_ADDR": "10.0.0.1"},
+    )
+    assert response.status_code == 429
+    # One token is refilled every 30 seconds
+    assert 0 < int(response.headers["Retry-After"]) <= 30
+
+
+def test_login_limited_per_ip(app: Flask, limits: dict[str, Limit]) -> None:
+    limits["login_ip"] = Limit.parse("1/60")
+
+    assert attempt(app, "a@example.com", ip="10.0.0.1") == 200
+    assert attempt(app, "b@example.com", ip="10.0.0.1") == 429
+    assert attempt(app, "a@example.com", ip="10.0.0.2") == 200
+
+
+def test_login_limited_per_account(app: Flask, limits: dict[str, Limit]) -> None:
+    add_user(app, "alice")
+    limits["login_account"] = Limit.parse("2/60")
+
+    assert attempt(app, "alice@example.com", ip="10.0.0.1") == 200
+    assert attempt(app, " Alice@example.com", ip="10.0.0.2") == 200
+    assert attempt(app, "alice@example.com", ip="10.0.0.3") == 429
+    assert attempt(app, "bob@example.com", ip="10.0.0.3") == 200
+
+    # Also the right password, the account is locked for everyone
+    response = app.test_client().post(
+        "/auth/login",
+        data={"email-address": "alice@example.com", "password": PASSWORD},
+        environ_base={"REMOTE_ADDR": "10.0.0.4"},
+    )
+    assert response.status_code == 429
+
+
+def test_forwarded_client_behind_trusted_proxy(
+    app: Flask, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("TRUSTED_PROXIES", "1")
+    proxied = create_app()
+    proxied.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    limiter.configure(
+        store=MemoryBucketStore(), limits={"login_ip": Limit(1, 60)}, enabled=True
+    )
+    try:
+
+        def forwarded(client: str, spoofed: str = "10.0.0.9") -> int:
+            response = proxied.test_client().post(
+                "/auth/login",
+                data={"email-address": "a@example.com", "password": "wrong"},
+                headers={"X-Forwarded-For": f"{spoofed}, {client}"},
+                environ_base={"REMOTE_ADDR": "192.168.0.1"},
+            )
+            return response.status_code
+
+        # The proxy appends the address it received the request from,
+        # values sent by the client are not trusted
+        assert forwarded("10.0.0.1") == 200
+        assert forwarded("10.0.0.2") == 200
+        assert forwarded("10.0.0.2", spoofed="10.0.0.3") == 429
+    finally:
+        limiter.configure(enabled=False)
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_bucket_refill(
+    backend: str, tmp_path: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    store: ratelimit.BucketStore
+    if backend == "memory":
+        store = MemoryBucketStore()
+    else:
+        store = SQLiteBucketStore(f"{tmp_path}/ratelimit.sqlite3")
+    limit = Limit.parse("2/10")
+
+    assert store.take("key", limit) == 0
+    assert store.take("key", limit) == 0
+    assert store.take("key", limit) == pytest.approx(5)
+    assert store.take("other", limit) == 0
+
+    now[0] += 2.5
+    assert store.take("key", limit) == pytest.approx(2.5)
+    now[0] += 2.5
+    assert store.take("key", limit) == 0
+    assert store.take("key", limit) == pytest.approx(5)
+
+    # Never more than count tokens
+    now[0] += 1000
+    assert store.take("key", limit) == 0
+    assert store.take("key", limit) == 0
+    assert store.take("key", limit) > 0
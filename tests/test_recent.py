@@ -0,0 +1,63 @@
+"""Server-side store of recently visited projects."""
+
+
+from __future__ import annotations
+
+from flask import Flask
+
+from app.models import Project, User, db
+from app.recent import RecentProjectsStore, recent_projects
+from tests.conftest import add_user, login
+
+
+def add_projects(app: Flask, user_id: int, count: int) -> list[tuple[int, str]]:
+    with app.app_context():
+        return Project.add_many([(f"Project {i}", None, user_id) for i in range(count)])
+
+
+def test_latest_visits_first(app: Flask) -> None:
+    user_id = add_user(app, "alice")
+    keys = add_projects(app, user_id, 7)
+    client = login(app, "alice")
+
+    for project_id, slug in keys + keys[:1]:
+        client.get(f"/project/{slug}")
+
+    ids = [project_id for project_id, _ in keys]
+    with app.app_context():
+        assert recent_projects.get(user_id) == [ids[0], ids[6], ids[5], ids[4], ids[3]]
+    assert client.cookie_jar is not None
+    assert [cookie.name for cookie in client.cookie_jar] == ["session"]
+
+
+def test_visits_written_behind(app: Flask) -> None:
+    user_id = add_user(app, "alice")
+    keys = add_projects(app, user_id, 2)
+    client = login(app, "alice")
+    for _, slug in keys:
+        client.get(f"/project/{slug}")
+
+    # Another worker reads the table
+    other = RecentProjectsStore()
+    recent_projects.flush(app)
+    with app.app_context():
+        assert other.get(user_id) == [keys[1][0], keys[0][0]]
+
+
+def test_removed_project_forgotten(app: Flask) -> None:
+    alice = add_user(app, "alice")
+    bob = add_user(app, "bob")
+    keys = add_projects(app, alice, 2)
+    with app.app_context():
+        Project.add_participants([(project_id, bob) for project_id, _ in keys])
+    client = login(app, "bob")
+    for _, slug in keys:
+        client.get(f"/project/{slug}")
+    recent_projects.flush(app)
+
+    with app.app_context():
+        project = db.session.get(Project, keys[1][0])
+        project.participants.remove(db.session.get(User, bob))
+        db.session.commit()
+
+        assert recent_projects.get(bob) == [keys[0][0]]
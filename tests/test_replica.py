@@ -0,0 +1,64 @@
+"""Reads of browse views from a replica database."""
+
+
+from __future__ import annotations
+
+import os
+import shutil
+import sqlite3
+from typing import Any
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from app import create_app
+from app.database import PRIMARY_UNTIL_KEY
+from app.models import Project, db
+from tests.conftest import add_user, login
+
+
+def project_names(client: FlaskClient) -> list[str]:
+    result = client.get("/projects/search").get_json()
+    assert result is not None
+    return [project["name"] for project in result["projects"]]
+
+
+@pytest.fixture
+def replica_app(app: Flask, tmp_path: Any, monkeypatch: pytest.MonkeyPatch) -> Flask:
+    """Application reading from a copy of the database, renamed to tell them apart."""
+    user_id = add_user(app, "alice")
+    with app.app_context():
+        [(project_id, _)] = Project.add_many([("Primary", None, user_id)])
+        db.engine.dispose()
+
+    replica = str(tmp_path / "replica.sqlite3")
+    shutil.copy(os.path.join(app.instance_path, "app.sqlite3"), replica)
+    with sqlite3.connect(replica) as connection:
+        connection.execute(
+            "UPDATE project SET name = 'Replica' WHERE id = ?", (project_id,)
+        )
+
+    monkeypatch.setenv("DATABASE_READ_URI", f"sqlite:///{replica}")
+    replica_app = create_app()
+    replica_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    return replica_app
+
+
+def test_browse_views_read_replica(replica_app: Flask) -> None:
+    # Logging in does not change the database, reads stay on the replica
+    client = login(replica_app, "alice")
+
+    assert project_names(client) == ["Replica"]
+
+
+def test_user_reads_own_writes(replica_app: Flask) -> None:
+    client = login(replica_app, "alice")
+    client.post("/create-project", data={"name": "Second"})
+
+    # The replica does not have the new project yet
+    assert project_names(client) == ["Second", "Primary"]
+
+    with client.session_transaction() as session:
+        session[PRIMARY_UNTIL_KEY] = 0
+    assert project_names(client) == ["Replica"]
@@ -0,0 +1,77 @@
+"""Paginated project search of the browser."""
+
+
+from __future__ import annotations
+
+from typing import Any, Optional
+
+from flask import Flask
+from flask.testing import FlaskClient
+
+from app.models import Project
+from app.routes.project import PROJECTS_PAGE_SIZE
+from tests.conftest import add_user, login
+
+
+def search(client: FlaskClient, **args: Any) -> dict[str, Any]:
+    response = client.get("/projects/search", query_string=args)
+    assert response.status_code == 200
+    result = response.get_json()
+    assert isinstance(result, dict)
+    return result
+
+
+def test_pages_of_all_projects(app: Flask) -> None:
+    user_id = add_user(app, "alice")
+    count = 2 * PROJECTS_PAGE_SIZE + 3
+    with app.app_context():
+        keys = Project.add_many([(f"Project {i}", None, user_id) for i in range(count)])
+    client = login(app, "alice")
+
+    urls: list[str] = []
+    page: Optional[int] = 1
+    while page is not None:
+        result = search(client, page=page)
+        urls.extend(project["url"] for project in result["projects"])
+        page = result["next_page"]
+
+    # All projects once, the newest first
+    assert urls == [f"/project/{slug}" for _, slug in reversed(keys)]
+    assert len(search(client, page=3)["projects"]) == 3
+    assert search(client, page=4) == {"projects": [], "next_page": None}
+
+
+def test_search_matches_word_prefixes(app: Flask) -> None:
+    user_id = add_user(app, "alice")
+    with app.app_context():
+        Project.add_many(
+            [
+                ("Garden planning", "Seeds and tools.", user_id),
+                ("Kitchen", "Plan the new garden shed.", user_id),
+                ("Holidays", None, user_id),
+            ]
+        )
+    client = login(app, "alice")
+
+    def names(query: str) -> list[str]:
+        return [project["name"] for project in search(client, q=query)["projects"]]
+
+    assert names("gard") == ["Kitchen", "Garden planning"]
+    assert names("gard plan") == ["Kitchen", "Garden planning"]
+    assert names("seeds") == ["Garden planning"]
+    assert names("tools OR holidays") == []
+    assert names('"unbalanced') == []
+    assert names("") == ["Holidays", "Kitchen", "Garden planning"]
+
+
+def test_search_returns_only_accessible_projects(app: Flask) -> None:
+    alice = add_user(app, "alice")
+    bob = add_user(app, "bob")
+    with app.app_context():
+        Project.add_many([("Shared name", None, alice), ("Shared name", None, bob)])
+    client = login(app, "bob")
+
+    result = search(client, q="shared")
+
+    assert len(result["projects"]) == 1
+    assert result["next_page"] is None
@@ -0,0 +1,138 @@
+"""Server side session stores."""
+
+
+from __future__ import annotations
+
+import fnmatch
+import sys
+import time
+import types
+from typing import Any, Iterator, Optional
+
+import pytest
+from flask import Flask
+
+from app import create_app
+from app.sessions import (
+    MemorySessionStore,
+    RedisSessionStore,
+    SessionStore,
+    SQLiteSessionStore,
+)
+from tests.conftest import add_user, login
+
+BACKENDS = ["memory", "sqlite", "redis"]
+
+
+class FakeRedis:
+    """Local stand-in for the few Redis commands used by the session store."""
+
+    def __init__(self) -> None:
+        self.data: dict[str, tuple[bytes, Optional[float]]] = {}
+
+    @classmethod
+    def from_url(cls, url: str) -> FakeRedis:
+        return cls()
+
+    def get(self, key: str) -> Optional[bytes]:
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and expires <= time.time():
+            del self.data[key]
+            return None
+        return value
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> None:
+        self.data[key] = (value, None if ex is None else time.time() + ex)
+
+    def delete(self, key: str) -> None:
+        self.data.pop(key, None)
+
+    def scan_iter(self, match: str) -> Iterator[str]:
+        return iter([key for key in self.data if fnmatch.fnmatch(key, match)])
+
+
+@pytest.fixture
+def fake_redis(monkeypatch: pytest.MonkeyPatch) -> None:
+    module = types.ModuleType("redis")
+    module.Redis = FakeRedis  # type: ignore[attr-defined]
+    monkeypatch.setitem(sys.modules, "redis", module)
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    """Frozen time.time and time.monotonic, moved by changing the value."""
+    now = [time.time()]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def create_store(backend: str, path: str) -> SessionStore:
+    if backend == "memory":
+        return MemorySessionStore(maxsize=100, ttl=60)
+    if backend == "sqlite":
+        return SQLiteSessionStore(f"{path}/sessions.sqlite3")
+    return RedisSessionStore("redis://localhost:6379/0")
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_store_round_trip(
+    backend: str, tmp_path: str, clock: list[float], fake_redis: None
+) -> None:
+    store = create_store(backend, tmp_path)
+    data: dict[str, Any] = {"_user_id": "1", "messages": ["hello"]}
+
+    store.set("sid", (clock[0] + 60, data), 60)
+
+    assert store.get("sid") == (clock[0] + 60, data)
+    assert store.get("other") is None
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_store_expiry(
+    backend: str, tmp_path: str, clock: list[float], fake_redis: None
+) -> None:
+    store = create_store(backend, tmp_path)
+    store.set("sid", (clock[0] + 60, {"key": "value"}), 60)
+
+    clock[0] += 59
+    assert store.get("sid") is not None
+    clock[0] += 2
+    store.sweep()
+    assert store.get("sid") is None
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_store_delete(
+    backend: str, tmp_path: str, clock: list[float], fake_redis: None
+) -> None:
+    store = create_store(backend, tmp_path)
+    store.set("first", (clock[0] + 60, {"key": 1}), 60)
+    store.set("second", (clock[0] + 60, {"key": 2}), 60)
+
+    store.delete("first")
+    assert store.get("first") is None
+    assert store.get("second") is not None
+
+    store.clear()
+    assert store.get("second") is None
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_login_session(
+    app: Flask, backend: str, monkeypatch: pytest.MonkeyPatch, fake_redis: None
+) -> None:
+    monkeypatch.setenv("SESSION_BACKEND", backend)
+    monkeypatch.setenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+    session_app = create_app()
+    session_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    add_user(session_app, "alice")
+
+    client = login(session_app, "alice")
+    assert client.get("/auth/profile").status_code == 200
+
+    # Read-only requests do not write the session again
+    assert "Set-Cookie" not in client.get("/auth/profile").headers
+
+    client.get("/auth/logout")
+    assert client.get("/auth/profile").status_code == 302
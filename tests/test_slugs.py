@@ -0,0 +1,67 @@
+"""Time-ordered project slugs."""
+
+
+from __future__ import annotations
+
+import os
+import time
+
+import pytest
+from flask import Flask
+
+from app.models import SLUG_ALPHABET, SLUG_LENGTH, Project, SlugGenerator
+from tests.conftest import add_user, login
+
+
+def test_slug_format() -> None:
+    slug = SlugGenerator()()
+    assert len(slug) == SLUG_LENGTH
+    assert set(slug) <= set(SLUG_ALPHABET)
+
+
+def test_slugs_sort_by_time(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = [1_700_000_000_000_000_000]
+    monkeypatch.setattr(time, "time_ns", lambda: now[0])
+    generate = SlugGenerator()
+
+    # Within a millisecond the counter keeps them unique and ordered
+    same_time = [generate() for _ in range(1000)]
+    assert len(set(same_time)) == len(same_time)
+
+    now[0] += 1_000_000
+    later = generate()
+    assert all(slug < later for slug in same_time)
+
+
+def test_slugs_of_processes_differ(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(time, "time_ns", lambda: 1_700_000_000_000_000_000)
+    first = SlugGenerator()
+    second = SlugGenerator()
+    second._counter = first._counter
+
+    pid = os.getpid()
+    slug = first()
+    monkeypatch.setattr(os, "getpid", lambda: pid + 1)
+    assert second() != slug
+
+
+def test_counter_wraps_around() -> None:
+    generate = SlugGenerator()
+    generate._counter = (1 << SlugGenerator.COUNTER_BITS) - 1
+    slug = generate()
+    assert generate._counter == 0
+    assert len(slug) == SLUG_LENGTH
+
+
+def test_projects_addressed_by_slug(app: Flask) -> None:
+    user_id = add_user(app, "alice")
+    with app.app_context():
+        keys = Project.add_many([("First", None, user_id), ("Second", None, user_id)])
+    client = login(app, "alice")
+
+    [(first_id, first), (second_id, second)] = keys
+    assert second_id > first_id
+    assert first < second
+    assert "First" in client.get(f"/project/{first}").get_data(as_text=True)
+    # Integer keys are not public
+    assert "First" not in client.get(f"/project/{first_id}").get_data(as_text=True)
@@ -0,0 +1,55 @@
+"""Application startup time budget."""
+
+
+from __future__ import annotations
+
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any
+
+from benchmarks.startup import run_probe
+
+# Median import + create_app() time in ms, machines differ so it can be overridden
+STARTUP_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS") or 1000)
+
+# Needed only by CLI commands and the eventlet server
+LAZY_MODULES = ("flask_migrate", "alembic", "eventlet", "app.server")
+
+
+def probe_env(tmp_path: Any) -> dict[str, str]:
+    return dict(os.environ, INSTANCE_PATH=str(tmp_path), SECRET_KEY="startup")
+
+
+def test_startup_within_budget(tmp_path: Any) -> None:
+    env = probe_env(tmp_path)
+
+    # First run warms up the bytecode cache and is not measured
+    run_probe(env, importtime=False)
+    runs = [run_probe(env, importtime=False)[0] for _ in range(3)]
+
+    total_ms = statistics.median(
+        run["import_ms"] + run["create_app_ms"] for run in runs
+    )
+    assert total_ms <= STARTUP_BUDGET_MS, (
+        f"Startup took {total_ms:.1f} ms, budget {STARTUP_BUDGET_MS:.0f} ms, "
+        "see python -m benchmarks.startup for the slowest imports."
+    )
+
+
+def test_cli_and_server_modules_not_imported(tmp_path: Any) -> None:
+    probe = (
+        "import sys\n"
+        "from app import create_app\n"
+        "create_app()\n"
+        f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", probe],
+        env=probe_env(tmp_path),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == ""
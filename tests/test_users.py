@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import os
+
+import sqlalchemy as sa
+from flask import Flask
+
+from app.cache import SQLiteVersionStore
+from app.models import User, db, user_cache
+from tests.conftest import add_user, count_statements, login
+
+
+def test_identity_changed_by_another_worker_is_not_stale(app: Flask) -> None:
+    user_id = add_user(app, "before")
+    client = login(app, "before")
+    page = client.get("/auth/profile").get_data(as_text=True)
+    assert 'value="before"' in page
+
+    # Another worker updates the user and bumps the shared version
+    with app.app_context():
+        db.session.execute(
+            sa.update(User.__table__).where(User.id == user_id).values(username="after")
+        )
+        db.session.commit()
+    SQLiteVersionStore(os.path.join(app.instance_path, "versions.sqlite3")).bump(
+        f"user:{user_id}"
+    )
+
+    page = client.get("/auth/profile").get_data(as_text=True)
+    assert 'value="after"' in page
+
+
+def test_identity_is_loaded_once(app: Flask) -> None:
+    add_user(app, "alice")
+    client = login(app, "alice")
+    user_cache.clear()
+
+    with count_statements() as statements:
+        assert client.get("/auth/profile").status_code == 200
+    assert len([s for s in statements if "FROM user" in s]) == 1
+
+    # Later requests of any session use the cached identity
+    other = login(app, "alice")
+    with count_statements() as statements:
+        assert client.get("/auth/profile").status_code == 200
+        assert other.get("/auth/profile").status_code == 200
+    assert [s for s in statements if "FROM user" in s] == []
+
+
+def test_identity_updated_with_profile(app: Flask) -> None:
+    add_user(app, "alice")
+    client = login(app, "alice")
+    assert 'value="alice"' in client.get("/auth/profile").get_data(as_text=True)
+
+    response = client.post(
+        "/auth/profile",
+        data={"email-address": "alice@example.com", "username": "alicia"},
+    )
+    assert response.status_code == 200
+
+    page = client.get("/auth/profile").get_data(as_text=True)
+    assert 'value="alicia"' in page